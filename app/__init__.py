@@ -3,39 +3,61 @@ Flask application factory and configuration.
 Author: Llakterian
 """
 
-from flask import Flask, send_from_directory
+from flask import Flask
 from flask_cors import CORS
 from app.models import db
+from app.json_provider import FastJSONProvider
+from app.metrics import init_metrics
+from app.slow_queries import init_slow_query_log, slow_query_threshold_from_env, SLOW_QUERY_LOG_SIZE
+from app.static_assets import build_manifest, serve_asset
+from app.database import database_uri_from_env, engine_options, register_sqlite_pragmas, DEFAULT_SQLITE_PRAGMAS
 import os
 
 
 def create_app(config=None):
     """Create and configure Flask application."""
     app = Flask(__name__, static_folder='../frontend/dist', static_url_path='')
+    app.json = FastJSONProvider(app)
     
     # Enable CORS for React frontend (allow all origins in production since React is served by Flask)
     CORS(app, resources={
         r"/api/*": {
             "origins": "*",
             "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-            "allow_headers": ["Content-Type", "Authorization"]
+            "allow_headers": ["Content-Type", "Authorization", "If-None-Match", "If-Modified-Since"],
+            "expose_headers": ["ETag", "Last-Modified"]
         }
     })
     
-    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///bontez_suppliers.db'
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_uri_from_env()
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['SQLITE_PRAGMAS'] = dict(DEFAULT_SQLITE_PRAGMAS)
     app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024
     app.config['UPLOAD_FOLDER'] = 'uploads'
+    app.config['METRICS_ENABLED'] = True
+    app.config['SLOW_QUERY_THRESHOLD_MS'] = slow_query_threshold_from_env()
+    app.config['SLOW_QUERY_LOG_SIZE'] = SLOW_QUERY_LOG_SIZE
+    app.config['ADMIN_TOKEN'] = os.environ.get('ADMIN_TOKEN')
     
     if config:
         app.config.update(config)
     
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options(app.config['SQLALCHEMY_DATABASE_URI']))
+    if app.config['METRICS_ENABLED']:
+        init_metrics(app)
+    
     db.init_app(app)
     
     with app.app_context():
+        register_sqlite_pragmas(db.engine, app.config['SQLITE_PRAGMAS'])
+        if app.config['SLOW_QUERY_THRESHOLD_MS'] is not None:
+            init_slow_query_log(app)
         db.create_all()
+        from app.migrations import apply_migrations
+        apply_migrations()
     
-    from app.routes import main_bp, clients_bp, suppliers_bp, sales_bp, reports_bp, products_bp, accessories_bp
+    from app.routes import (main_bp, clients_bp, suppliers_bp, sales_bp, reports_bp, products_bp, accessories_bp,
+                            export_bp, receivables_bp, import_bp, metrics_bp)
     app.register_blueprint(main_bp)
     app.register_blueprint(clients_bp)
     app.register_blueprint(suppliers_bp)
@@ -43,6 +65,20 @@ def create_app(config=None):
     app.register_blueprint(reports_bp)
     app.register_blueprint(products_bp)
     app.register_blueprint(accessories_bp)
+    app.register_blueprint(export_bp)
+    app.register_blueprint(receivables_bp)
+    app.register_blueprint(import_bp)
+    app.register_blueprint(metrics_bp)
+    
+    from app.commands import register_commands
+    register_commands(app)
+    
+    def asset_manifest():
+        """The React build, scanned on the first request so CLI commands never pay for it."""
+        manifest = app.extensions.get('asset_manifest')
+        if manifest is None:
+            manifest = app.extensions['asset_manifest'] = build_manifest(app.static_folder)
+        return manifest
     
     # Serve React App (catch-all route for React Router)
     @app.route('/', defaults={'path': ''})
@@ -54,16 +90,20 @@ def create_app(config=None):
             return {'error': 'Not found'}, 404
         
         # Check if the path is a static file
-        static_file_path = os.path.join(app.static_folder, path)
-        if path and os.path.exists(static_file_path):
-            return send_from_directory(app.static_folder, path)
+        manifest = asset_manifest()
+        asset = manifest.get(path) if path else None
+        if asset:
+            return serve_asset(asset)
         
         # Otherwise, serve index.html for React Router
-        index_path = os.path.join(app.static_folder, 'index.html')
-        if os.path.exists(index_path):
-            return send_from_directory(app.static_folder, 'index.html')
+        index = manifest.get('index.html')
+        if index:
+            return serve_asset(index)
         
         # Fallback if React build doesn't exist
         return {'message': 'React app not built. Run: cd frontend && npm run build'}, 404
     
+    # Flask's own static route matches the same URLs first; route it through the manifest too
+    app.view_functions['static'] = lambda filename: serve_react(filename)
+    
     return app
@@ -0,0 +1,196 @@
+"""
+Data versions and process-local caches invalidated by them.
+Author: Llakterian
+"""
+
+from app.models import db, DataVersion, Client, Supplier, Product
+from collections import OrderedDict, namedtuple
+from datetime import datetime
+from flask import request, make_response
+from functools import wraps
+from sqlalchemy import func, or_, update
+import hashlib
+
+
+def bump_version(*names):
+    """Mark data sets as changed; call inside the transaction doing the write."""
+    for name in names:
+        result = db.session.execute(
+            update(DataVersion).where(DataVersion.name == name).values(
+                version=DataVersion.version + 1,
+                updated_at=datetime.utcnow()
+            ).execution_options(synchronize_session=False)
+        )
+        if result.rowcount == 0:
+            db.session.add(DataVersion(name=name, version=1, updated_at=datetime.utcnow()))
+            db.session.flush()
+
+
+# Per-day versions ('sales_day:2026-10-18'); ISO dates sort, so a date range is a name range
+SALE_DAY_PREFIX = 'sales_day:'
+
+
+def bump_sale_days(*days):
+    """Mark the sales of the given dates as changed, for date-scoped report caches."""
+    bump_version(*sorted({SALE_DAY_PREFIX + day.isoformat() for day in days}))
+
+
+def ranges_version(ranges, scopes=()):
+    """One number that grows whenever a sale day in ``ranges`` or a scope changes.
+
+    ``ranges`` is a list of inclusive ``(date_from, date_to)`` pairs. Versions
+    only ever increase, so their sum does too; each range is a primary key
+    range scan however many days it spans.
+    """
+    conditions = [
+        DataVersion.name.between(SALE_DAY_PREFIX + date_from.isoformat(), SALE_DAY_PREFIX + date_to.isoformat())
+        for date_from, date_to in ranges
+    ]
+    if scopes:
+        conditions.append(DataVersion.name.in_(scopes))
+    return db.session.query(func.coalesce(func.sum(DataVersion.version), 0)).filter(or_(*conditions)).scalar()
+
+
+def current_versions(*names):
+    """Return the versions of the named data sets, in order, with one query."""
+    rows = dict(db.session.query(DataVersion.name, DataVersion.version).filter(
+        DataVersion.name.in_(names)
+    ).all())
+    return tuple(rows.get(name, 0) for name in names)
+
+
+def version_state(*names):
+    """Return ``(versions, last_modified)`` for the named data sets with one query."""
+    rows = db.session.query(DataVersion.name, DataVersion.version, DataVersion.updated_at).filter(
+        DataVersion.name.in_(names)
+    ).all()
+    versions = {name: version for name, version, _ in rows}
+    stamps = [updated_at for _, _, updated_at in rows if updated_at]
+    return tuple(versions.get(name, 0) for name in names), max(stamps) if stamps else None
+
+
+def conditional_get(*scopes):
+    """Answer GETs with 304 Not Modified while the given data versions are unchanged.
+
+    The ETag covers the URL, Accept header, today's date (reports default to
+    "last 30 days") and the versions, so the view only runs when something changed.
+    Only 200 responses get an ETag.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            versions, last_modified = version_state(*scopes)
+            key = '|'.join([request.full_path, request.headers.get('Accept', ''),
+                            datetime.utcnow().date().isoformat(), repr(versions)])
+            etag = hashlib.sha1(key.encode()).hexdigest()
+            if last_modified:
+                last_modified = last_modified.replace(microsecond=0)
+
+            not_modified = False
+            if request.if_none_match:
+                not_modified = request.if_none_match.contains(etag)
+            elif last_modified and request.if_modified_since:
+                not_modified = last_modified <= request.if_modified_since.replace(tzinfo=None)
+
+            if not_modified:
+                response = make_response('', 304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                # Errors and redirects carry no validators, so a 304 always stands for a 200
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag)
+            if last_modified:
+                response.last_modified = last_modified
+            response.headers['Cache-Control'] = 'no-cache'
+            response.vary.add('Accept')
+            return response
+        return wrapper
+    return decorator
+
+
+class VersionedCache:
+    """Process-local cache whose entries stay valid while their data versions do.
+
+    Each gunicorn worker keeps its own entries; the versions live in the
+    database, so a write in one worker invalidates the others on their next read.
+    """
+
+    def __init__(self):
+        self._entries = {}
+
+    def get_or_compute(self, key, scopes, compute):
+        """Return the cached value for key, recomputing it when any scope changed."""
+        versions = current_versions(*scopes)
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] == versions:
+            return entry[1]
+
+        value = compute()
+        self._entries[key] = (versions, value)
+        return value
+
+    def clear(self):
+        self._entries.clear()
+
+
+class ReportCache:
+    """Size-bounded LRU of report results scoped to the sale dates they cover.
+
+    An entry stays valid until a sale on one of its dates is written (or a
+    scope changes), so reports over closed periods are computed once per worker.
+    """
+
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+
+    def get_or_compute(self, key, ranges, compute, scopes=('suppliers', 'rollups')):
+        """Return the cached value for key, recomputing it when its dates or scopes changed."""
+        version = ranges_version(ranges, scopes)
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] == version:
+            self._entries.move_to_end(key)
+            return entry[1]
+
+        value = compute()
+        self._entries[key] = (version, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+        return value
+
+    def clear(self):
+        self._entries.clear()
+
+
+dashboard_cache = VersionedCache()
+catalog_cache = VersionedCache()
+report_cache = ReportCache()
+
+CatalogProduct = namedtuple('CatalogProduct', ['id', 'name', 'supplier_id', 'category', 'price'])
+CatalogSupplier = namedtuple('CatalogSupplier', ['id', 'name', 'color'])
+ClientOption = namedtuple('ClientOption', ['id', 'name', 'phone'])
+Catalog = namedtuple('Catalog', ['products', 'suppliers', 'products_by_id'])
+
+
+def _load_catalog():
+    products = [CatalogProduct(*row) for row in db.session.query(
+        Product.id, Product.name, Product.supplier_id, Product.category, Product.price
+    ).order_by(Product.id)]
+    suppliers = [CatalogSupplier(*row) for row in db.session.query(
+        Supplier.id, Supplier.name, Supplier.color
+    ).order_by(Supplier.id)]
+    return Catalog(products, suppliers, {p.id: p for p in products})
+
+
+def get_catalog():
+    """Products and suppliers, reloaded only after either changes."""
+    return catalog_cache.get_or_compute('catalog', ('products', 'suppliers'), _load_catalog)
+
+
+def get_client_options():
+    """(id, name, phone) for every client, reloaded only after a client write."""
+    return catalog_cache.get_or_compute('clients', ('clients',), lambda: [
+        ClientOption(*row) for row in db.session.query(Client.id, Client.name, Client.phone).order_by(Client.id)
+    ])
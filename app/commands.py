@@ -0,0 +1,112 @@
+"""
+Flask CLI commands for Bontez Suppliers.
+Author: Llakterian
+"""
+
+import click
+from app.importer import import_csv, IMPORT_CHUNK_SIZE, IMPORT_KINDS
+from app.jobs import run_worker, WORKER_POLL_INTERVAL
+from app.receivables import iter_due_installments
+from app.rollups import rebuild_rollups
+from app.static_assets import precompress_assets
+from app.synthetic import generate_dataset, DATASET_SIZES
+from app.sync import compact_change_log
+
+
+def register_commands(app):
+    """Attach maintenance commands to the Flask CLI."""
+
+    @app.cli.command('rebuild-rollups')
+    def rebuild_rollups_command():
+        """Backfill the daily report rollups from raw sales."""
+        sales_rows, product_rows = rebuild_rollups()
+        click.echo(f'Rebuilt {sales_rows} sales rollups and {product_rows} product rollups')
+
+    @app.cli.command('due-installments')
+    @click.option('--within', default=0, show_default=True, help='Also include installments due in the next N days.')
+    def due_installments_command(within):
+        """List open installments that are due, oldest first; run daily from cron."""
+        total = 0
+        for batch in iter_due_installments(within_days=within):
+            for item in batch:
+                client = item['client']
+                days = item['days_overdue']
+                status = f'{days} days overdue' if days > 0 else 'due today' if days == 0 else f'due in {-days} days'
+                click.echo(f"{item['due_date']:%Y-%m-%d}\tsale {item['sale_id']}\t{client['name']}\t"
+                           f"{client['phone']}\t{item['outstanding']:.2f}\t{status}")
+            total += len(batch)
+        click.echo(f'{total} installments due')
+
+    @app.cli.command('report-worker')
+    @click.option('--once', is_flag=True, help='Process the queued jobs, then exit.')
+    @click.option('--poll-interval', default=WORKER_POLL_INTERVAL, show_default=True,
+                  help='Seconds to wait when the queue is empty.')
+    def report_worker_command(once, poll_interval):
+        """Run queued report jobs off the web workers."""
+        processed = run_worker(poll_interval=poll_interval, once=once)
+        click.echo(f'Processed {processed} report jobs')
+
+    @app.cli.command('generate-data')
+    @click.option('--size', type=click.Choice(list(DATASET_SIZES)), default='small', show_default=True)
+    @click.option('--clients', type=int, help='Override the preset client count.')
+    @click.option('--days', type=int, help='Override the preset number of days of history.')
+    @click.option('--sales-per-day', type=int, help='Override the preset average sales per day.')
+    @click.option('--seed', default=1, show_default=True, help='Random seed, for repeatable datasets.')
+    def generate_data_command(size, clients, days, sales_per_day, seed):
+        """Add a synthetic sales history for load testing; never run against production."""
+        preset = DATASET_SIZES[size]
+        counts = generate_dataset(
+            clients=clients or preset.clients,
+            days=days or preset.days,
+            sales_per_day=sales_per_day or preset.sales_per_day,
+            seed=seed,
+        )
+        click.echo(', '.join(f'{count} {name}' for name, count in counts.items()))
+
+    @app.cli.command('import-csv')
+    @click.option('--clients', 'clients_file', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--sales', 'sales_file', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--items', 'items_file', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--installments', 'installments_file', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--chunk-size', default=IMPORT_CHUNK_SIZE, show_default=True, help='Rows per transaction.')
+    @click.option('--restart', is_flag=True,
+                  help='Import from the first row even if a file was imported before; duplicates items and installments.')
+    def import_csv_command(clients_file, sales_file, items_file, installments_file, chunk_size, restart):
+        """Load historical records from CSV files, resuming interrupted imports.
+
+        Files use the column names of the CSV exports and are imported in the
+        order clients, sales, items, installments.
+        """
+        files = dict(zip(IMPORT_KINDS, (clients_file, sales_file, items_file, installments_file)))
+        if not any(files.values()):
+            raise click.UsageError('Give at least one file to import.')
+
+        rebuild = False
+        for kind, path in files.items():
+            if not path:
+                continue
+            try:
+                summary = import_csv(kind, path, chunk_size=chunk_size, restart=restart, rebuild=False)
+            except ValueError as e:
+                raise click.ClickException(f'{path}: {e}')
+            rebuild = rebuild or (kind in ('sales', 'items') and summary['imported'])
+            resumed = f' (resumed at row {summary["resumed_from"]})' if summary['resumed_from'] else ''
+            click.echo(f'{kind}: {summary["imported"]} imported, {summary["duplicates"]} duplicates, '
+                       f'{summary["errors"]} errors in {summary["rows"]} rows{resumed}')
+            for sample in summary['error_samples']:
+                click.echo(f'  line {sample["line"]}: {sample["error"]}')
+
+        if rebuild:
+            sales_rows, product_rows = rebuild_rollups()
+            click.echo(f'Rebuilt {sales_rows} sales rollups and {product_rows} product rollups')
+
+    @app.cli.command('precompress-assets')
+    def precompress_assets_command():
+        """Write .br/.gz siblings of the React build at maximum compression; run after npm run build."""
+        written = precompress_assets(app.static_folder)
+        click.echo(f'Wrote {written} compressed files')
+
+    @app.cli.command('compact-change-log')
+    def compact_change_log_command():
+        """Remove change log entries superseded by a later write to the same row."""
+        click.echo(f'Removed {compact_change_log()} superseded change log entries')
@@ -0,0 +1,58 @@
+"""
+Database engine configuration.
+Author: Llakterian
+"""
+
+from sqlalchemy import event
+import os
+
+
+DEFAULT_DATABASE_URI = 'sqlite:///bontez_suppliers.db'
+
+# Applied to every new SQLite connection. WAL lets readers run alongside the
+# single writer, and busy_timeout makes a second gunicorn worker wait for the
+# write lock instead of failing with "database is locked".
+DEFAULT_SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64000,
+    'temp_store': 'MEMORY',
+}
+
+
+def database_uri_from_env():
+    """Database URL from the environment, falling back to the local SQLite file."""
+    uri = os.environ.get('DATABASE_URL', DEFAULT_DATABASE_URI)
+    # Hosting providers still hand out the scheme SQLAlchemy 1.4 dropped
+    if uri.startswith('postgres://'):
+        uri = 'postgresql://' + uri[len('postgres://'):]
+    return uri
+
+
+def engine_options(uri):
+    """Pool settings suited to the database behind ``uri``."""
+    if uri.startswith('sqlite'):
+        # pysqlite's own lock timeout, in seconds, matching busy_timeout
+        return {'connect_args': {'timeout': DEFAULT_SQLITE_PRAGMAS['busy_timeout'] / 1000}}
+
+    return {
+        'pool_pre_ping': True,
+        'pool_recycle': 280,
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', 5)),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 5)),
+    }
+
+
+def register_sqlite_pragmas(engine, pragmas):
+    """Run the PRAGMA statements on each new connection of a SQLite engine."""
+    if engine.dialect.name != 'sqlite' or not pragmas:
+        return
+
+    @event.listens_for(engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name}={value}')
+        cursor.close()
@@ -0,0 +1,137 @@
+"""
+Streaming CSV / NDJSON exports of sales data.
+Author: Llakterian
+"""
+
+from app.models import db, Client, Supplier, Product, Sale, SaleItem, Installment
+from app.reports import day_bounds
+from datetime import date, datetime
+from sqlalchemy import select
+import csv
+import io
+import json
+
+
+EXPORT_BATCH_SIZE = 1000
+EXPORT_FORMATS = ('csv', 'ndjson')
+
+SALE_COLUMNS = [
+    ('sale_id', Sale.id),
+    ('sale_date', Sale.sale_date),
+    ('client_id', Sale.client_id),
+    ('client_name', Client.name),
+    ('client_phone', Client.phone),
+    ('supplier_id', Sale.supplier_id),
+    ('supplier_name', Supplier.name),
+    ('payment_method', Sale.payment_method),
+    ('mpesa_code', Sale.mpesa_code),
+    ('total_amount', Sale.total_amount),
+    ('amount_paid', Sale.amount_paid),
+    ('notes', Sale.notes),
+]
+
+ITEM_COLUMNS = [
+    ('item_id', SaleItem.id),
+    ('sale_id', Sale.id),
+    ('sale_date', Sale.sale_date),
+    ('client_name', Client.name),
+    ('supplier_name', Supplier.name),
+    ('product_id', Product.id),
+    ('product_name', Product.name),
+    ('category', Product.category),
+    ('quantity', SaleItem.quantity),
+    ('unit_price', SaleItem.unit_price),
+    ('subtotal', SaleItem.subtotal),
+]
+
+INSTALLMENT_COLUMNS = [
+    ('installment_id', Installment.id),
+    ('sale_id', Sale.id),
+    ('sale_date', Sale.sale_date),
+    ('client_name', Client.name),
+    ('client_phone', Client.phone),
+    ('amount', Installment.amount),
+    ('due_date', Installment.due_date),
+    ('paid_date', Installment.paid_date),
+    ('is_paid', Installment.is_paid),
+]
+
+
+def _sales_select(columns):
+    return select(*columns).select_from(Sale).join(
+        Client, Sale.client_id == Client.id
+    ).outerjoin(Supplier, Sale.supplier_id == Supplier.id).order_by(Sale.sale_date, Sale.id)
+
+
+def _items_select(columns):
+    return select(*columns).select_from(SaleItem).join(
+        Sale, SaleItem.sale_id == Sale.id
+    ).join(Client, Sale.client_id == Client.id).outerjoin(
+        Supplier, Sale.supplier_id == Supplier.id
+    ).join(Product, SaleItem.product_id == Product.id).order_by(Sale.sale_date, SaleItem.id)
+
+
+def _installments_select(columns):
+    return select(*columns).select_from(Installment).join(
+        Sale, Installment.sale_id == Sale.id
+    ).join(Client, Sale.client_id == Client.id).order_by(Sale.sale_date, Installment.id)
+
+
+# kind -> (columns, statement builder)
+EXPORTS = {
+    'sales': (SALE_COLUMNS, _sales_select),
+    'items': (ITEM_COLUMNS, _items_select),
+    'installments': (INSTALLMENT_COLUMNS, _installments_select),
+}
+
+
+def _plain(value):
+    """Convert a column value into something csv/json can write."""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def iter_export_rows(kind, date_from=None, date_to=None, supplier_id=None):
+    """Return ``(headers, batches)`` for an export, read in server-side batches.
+
+    Only EXPORT_BATCH_SIZE rows are held in memory at a time.
+    """
+    columns, build = EXPORTS[kind]
+    headers = [name for name, _ in columns]
+    stmt = build([column for _, column in columns])
+
+    # Open-ended on either side; same half-open day range as the reports
+    if date_from:
+        stmt = stmt.where(Sale.sale_date >= day_bounds(date_from, date_from)[0])
+    if date_to:
+        stmt = stmt.where(Sale.sale_date < day_bounds(date_to, date_to)[1])
+    if supplier_id:
+        stmt = stmt.where(Sale.supplier_id == supplier_id)
+
+    result = db.session.execute(stmt.execution_options(yield_per=EXPORT_BATCH_SIZE))
+
+    def batches():
+        for partition in result.partitions():
+            yield [[_plain(value) for value in row] for row in partition]
+
+    return headers, batches()
+
+
+def stream_csv(headers, batches):
+    """Yield CSV text one batch at a time."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(headers)
+    for rows in batches:
+        writer.writerows(rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+    yield buffer.getvalue()
+
+
+def stream_ndjson(headers, batches):
+    """Yield newline-delimited JSON objects one batch at a time."""
+    for rows in batches:
+        yield ''.join(json.dumps(dict(zip(headers, row))) + '\n' for row in rows)
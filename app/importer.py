@@ -0,0 +1,417 @@
+"""
+Bulk import of historical clients, sales, items and installments from CSV.
+Author: Llakterian
+"""
+
+from app.models import db, Client, Supplier, Product, Sale, SaleItem, Installment, SaleSyncKey, ImportCheckpoint
+from app.cache import bump_version
+from app.ingest import PAYMENT_METHODS
+from app.rollups import rebuild_rollups
+from datetime import datetime
+from itertools import islice
+from sqlalchemy import insert, select
+import csv
+import hashlib
+import os
+
+
+IMPORT_CHUNK_SIZE = 5000
+MAX_IMPORT_ERRORS = 100
+
+# Import order: each kind refers to rows of the kinds before it
+IMPORT_KINDS = ('clients', 'sales', 'items', 'installments')
+
+# Columns every file of a kind must have; the names match the CSV exports
+REQUIRED_COLUMNS = {
+    'clients': ('name', 'phone'),
+    'sales': ('sale_id', 'sale_date', 'client_phone', 'payment_method', 'total_amount'),
+    'items': ('sale_id', 'quantity'),
+    'installments': ('sale_id', 'amount', 'due_date'),
+}
+
+# Data sets whose cached views change when a kind is imported
+IMPORT_VERSIONS = {
+    'clients': ('clients',),
+    'sales': ('sales',),
+    'items': ('sales',),
+    'installments': ('sales',),
+}
+
+# Sale ids from the file are stored as SaleSyncKey 'import:<id>'
+IMPORT_KEY_PREFIX = 'import:'
+MAX_SALE_REF_LENGTH = 64 - len(IMPORT_KEY_PREFIX)
+
+# Besides ISO 8601, the day-first formats spreadsheets write
+DATE_FORMATS = ('%d/%m/%Y %H:%M:%S', '%d/%m/%Y %H:%M', '%d/%m/%Y')
+
+
+def _text(row, name):
+    """Stripped cell value, or None when the column is missing or blank."""
+    value = row.get(name)
+    if value is None:
+        return None
+    return value.strip() or None
+
+
+def _required(row, name):
+    value = _text(row, name)
+    if value is None:
+        raise ValueError(f'{name} is required')
+    return value
+
+
+def _number(row, name, default=None):
+    value = _text(row, name)
+    if value is None:
+        if default is None:
+            raise ValueError(f'{name} is required')
+        return default
+    try:
+        number = float(value.replace(',', ''))
+    except ValueError:
+        raise ValueError(f'{name} must be a number')
+    if number < 0:
+        raise ValueError(f'{name} must not be negative')
+    return number
+
+
+def _datetime(row, name, required=True):
+    value = _text(row, name)
+    if value is None:
+        if required:
+            raise ValueError(f'{name} is required')
+        return None
+    try:
+        return datetime.fromisoformat(value).replace(tzinfo=None)
+    except ValueError:
+        pass
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, date_format)
+        except ValueError:
+            continue
+    raise ValueError(f'{name} must be a date (YYYY-MM-DD or DD/MM/YYYY)')
+
+
+def _flag(row, name):
+    return (_text(row, name) or '').lower() in ('1', 'true', 'yes', 'y', 'paid')
+
+
+def _sale_key(row):
+    ref = _required(row, 'sale_id')
+    if len(ref) > MAX_SALE_REF_LENGTH:
+        raise ValueError(f'sale_id must be at most {MAX_SALE_REF_LENGTH} characters')
+    return IMPORT_KEY_PREFIX + ref
+
+
+def _chunk_sale_keys(chunk):
+    return {IMPORT_KEY_PREFIX + row['sale_id'].strip() for _, row in chunk if row.get('sale_id')}
+
+
+class _Lookups:
+    """In-memory maps from the values in the files to row ids, loaded once per file."""
+
+    def __init__(self, kind):
+        self.clients = {}
+        self.suppliers = {}
+        self.products = {}
+        self.products_by_name = {}
+        self.sales = {}
+        if kind in ('clients', 'sales'):
+            self.clients = dict(db.session.execute(select(Client.phone, Client.id)).all())
+        if kind == 'sales':
+            self.suppliers = {name.lower(): supplier_id for supplier_id, name in
+                              db.session.execute(select(Supplier.id, Supplier.name))}
+        if kind == 'items':
+            for product_id, supplier_id, name, price in db.session.execute(
+                select(Product.id, Product.supplier_id, Product.name, Product.price)
+            ):
+                self.products[product_id] = price
+                self.products_by_name.setdefault(name.lower(), {})[supplier_id] = (product_id, price)
+
+    def load_sales(self, keys):
+        """Imported sales for one chunk, as key -> (sale_id, supplier_id); one query."""
+        self.sales = {key: (sale_id, supplier_id) for key, sale_id, supplier_id in db.session.execute(
+            select(SaleSyncKey.key, Sale.id, Sale.supplier_id).join(Sale, SaleSyncKey.sale_id == Sale.id).where(
+                SaleSyncKey.key.in_(keys)
+            )
+        )} if keys else {}
+
+    def sale(self, row):
+        sale = self.sales.get(_sale_key(row))
+        if sale is None:
+            raise ValueError('Unknown sale_id; import the sales file first')
+        return sale
+
+    def product(self, row, supplier_id):
+        """Product by id, or by name preferring the sale's supplier, then an accessory."""
+        product_id = _text(row, 'product_id')
+        if product_id is not None:
+            if not product_id.isdigit() or int(product_id) not in self.products:
+                raise ValueError('Unknown product_id')
+            return int(product_id), self.products[int(product_id)]
+
+        name = _required(row, 'product_name')
+        by_supplier = self.products_by_name.get(name.lower())
+        if not by_supplier:
+            raise ValueError('Unknown product_name')
+        for candidate in (supplier_id, None):
+            if candidate in by_supplier:
+                return by_supplier[candidate]
+        if len(by_supplier) == 1:
+            return next(iter(by_supplier.values()))
+        raise ValueError('product_name matches several suppliers; give product_id')
+
+
+def _import_clients(chunk, lookups):
+    rows, duplicates, errors = [], 0, []
+    for line, row in chunk:
+        try:
+            phone = _required(row, 'phone')
+            if len(phone) > 15:
+                raise ValueError('phone must be at most 15 characters')
+            client = {
+                'name': _required(row, 'name')[:100],
+                'phone': phone,
+                'email': (_text(row, 'email') or '')[:100] or None,
+                'address': (_text(row, 'address') or '')[:255] or None,
+                'created_at': _datetime(row, 'created_at', required=False) or datetime.utcnow(),
+            }
+        except ValueError as e:
+            errors.append((line, str(e)))
+            continue
+        if phone in lookups.clients:
+            duplicates += 1
+            continue
+        # Claimed until the insert returns its id, so repeats in this chunk count as duplicates
+        lookups.clients[phone] = None
+        rows.append(client)
+
+    if rows:
+        for client_id, phone in db.session.execute(
+            insert(Client).returning(Client.id, Client.phone), rows, execution_options={'render_nulls': True}
+        ):
+            lookups.clients[phone] = client_id
+    return len(rows), duplicates, errors
+
+
+def _import_sales(chunk, lookups):
+    lookups.load_sales(_chunk_sale_keys(chunk))
+    rows, keys, duplicates, errors = [], [], 0, []
+    for line, row in chunk:
+        try:
+            key = _sale_key(row)
+            client_id = lookups.clients.get(_required(row, 'client_phone'))
+            if client_id is None:
+                raise ValueError('Unknown client_phone; import the clients file first')
+            supplier_name = _text(row, 'supplier_name')
+            supplier_id = None
+            if supplier_name is not None:
+                supplier_id = lookups.suppliers.get(supplier_name.lower())
+                if supplier_id is None:
+                    raise ValueError('Unknown supplier_name')
+            payment_method = (_text(row, 'payment_method') or '').lower()
+            if payment_method not in PAYMENT_METHODS:
+                raise ValueError(f'payment_method must be one of {", ".join(sorted(PAYMENT_METHODS))}')
+            total_amount = _number(row, 'total_amount')
+            sale_date = _datetime(row, 'sale_date')
+            sale = {
+                'client_id': client_id,
+                'supplier_id': supplier_id,
+                'payment_method': payment_method,
+                'mpesa_code': (_text(row, 'mpesa_code') or '')[:50] or None,
+                'total_amount': total_amount,
+                'amount_paid': _number(row, 'amount_paid', 0.0 if payment_method == 'installment' else total_amount),
+                'notes': (_text(row, 'notes') or '')[:255] or None,
+                'created_at': sale_date,
+                'sale_date': sale_date,
+            }
+        except ValueError as e:
+            errors.append((line, str(e)))
+            continue
+        if key in lookups.sales:
+            duplicates += 1
+            continue
+        lookups.sales[key] = None
+        rows.append(sale)
+        keys.append(key)
+
+    if rows:
+        # Ascending ids in VALUES order, as in ingest_pending_sales()
+        sale_ids = sorted(db.session.execute(
+            insert(Sale).returning(Sale.id), rows, execution_options={'render_nulls': True}
+        ).scalars().all())
+        db.session.execute(insert(SaleSyncKey), [
+            {'key': key, 'sale_id': sale_id} for key, sale_id in zip(keys, sale_ids)
+        ])
+    return len(rows), duplicates, errors
+
+
+def _import_items(chunk, lookups):
+    lookups.load_sales(_chunk_sale_keys(chunk))
+    rows, errors = [], []
+    for line, row in chunk:
+        try:
+            sale_id, supplier_id = lookups.sale(row)
+            product_id, price = lookups.product(row, supplier_id)
+            quantity = _number(row, 'quantity')
+            if quantity != int(quantity) or quantity <= 0:
+                raise ValueError('quantity must be a positive whole number')
+            unit_price = _number(row, 'unit_price', price)
+            rows.append({
+                'sale_id': sale_id,
+                'product_id': product_id,
+                'quantity': int(quantity),
+                'unit_price': unit_price,
+                'subtotal': _number(row, 'subtotal', unit_price * quantity),
+            })
+        except ValueError as e:
+            errors.append((line, str(e)))
+
+    if rows:
+        db.session.execute(insert(SaleItem), rows)
+    return len(rows), 0, errors
+
+
+def _import_installments(chunk, lookups):
+    lookups.load_sales(_chunk_sale_keys(chunk))
+    rows, errors = [], []
+    for line, row in chunk:
+        try:
+            sale_id, _ = lookups.sale(row)
+            amount = _number(row, 'amount')
+            paid_date = _datetime(row, 'paid_date', required=False)
+            is_paid = _flag(row, 'is_paid') or (paid_date is not None and _text(row, 'is_paid') is None)
+            rows.append({
+                'sale_id': sale_id,
+                'amount': amount,
+                'amount_paid': min(amount, _number(row, 'amount_paid', amount if is_paid else 0.0)),
+                'due_date': _datetime(row, 'due_date'),
+                'paid_date': paid_date if is_paid else None,
+                'is_paid': is_paid,
+            })
+        except ValueError as e:
+            errors.append((line, str(e)))
+
+    if rows:
+        db.session.execute(insert(Installment), rows)
+    return len(rows), 0, errors
+
+
+IMPORTERS = {
+    'clients': _import_clients,
+    'sales': _import_sales,
+    'items': _import_items,
+    'installments': _import_installments,
+}
+
+
+def _check_columns(kind, fieldnames):
+    fieldnames = set(fieldnames or ())
+    missing = [name for name in REQUIRED_COLUMNS[kind] if name not in fieldnames]
+    if kind == 'items' and not {'product_id', 'product_name'} & fieldnames:
+        missing.append('product_id or product_name')
+    if missing:
+        raise ValueError(f'Missing columns: {", ".join(missing)}')
+
+
+def check_csv_file(kind, path):
+    """Raise ValueError unless ``path`` is a readable CSV with the columns ``kind`` needs."""
+    if kind not in IMPORTERS:
+        raise ValueError(f'kind must be one of {", ".join(IMPORT_KINDS)}')
+    try:
+        with open(path, newline='', encoding='utf-8-sig') as f:
+            _check_columns(kind, next(csv.reader(f), None))
+    except (OSError, UnicodeDecodeError, csv.Error):
+        raise ValueError('File is not a readable UTF-8 CSV file')
+
+
+def file_digest(path):
+    """SHA-256 of a file, read in 1 MB blocks; identifies the file for its checkpoint."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _summary(checkpoint, resumed_from, error_samples):
+    return {
+        'kind': checkpoint.kind,
+        'filename': checkpoint.filename,
+        'status': checkpoint.status,
+        'rows': checkpoint.rows_done,
+        'resumed_from': resumed_from,
+        'imported': checkpoint.imported,
+        'duplicates': checkpoint.duplicates,
+        'errors': checkpoint.errors,
+        'error_samples': [{'line': line, 'error': error} for line, error in error_samples],
+    }
+
+
+def import_csv(kind, path, chunk_size=IMPORT_CHUNK_SIZE, restart=False, rebuild=True, on_chunk=None):
+    """Import one CSV file of ``kind``, resuming from its checkpoint.
+
+    Rows are validated and bulk inserted ``chunk_size`` at a time, each chunk
+    in its own transaction together with the checkpoint, so an interrupted
+    import picks up after the last committed chunk when run again. A file
+    that finished before is skipped unless ``restart`` is set; sales are keyed
+    by their sale_id and never imported twice, items and installments would be.
+    Invalid rows are skipped and counted; the first MAX_IMPORT_ERRORS are
+    returned with their line numbers. With ``rebuild``, the report rollups are
+    rebuilt once sales or items were added. ``on_chunk`` is called inside each
+    chunk's transaction, e.g. to refresh a job heartbeat.
+
+    Raises ValueError for an unknown kind or a file missing required columns.
+    """
+    if kind not in IMPORTERS:
+        raise ValueError(f'kind must be one of {", ".join(IMPORT_KINDS)}')
+
+    digest = file_digest(path)
+    checkpoint = ImportCheckpoint.query.filter_by(kind=kind, digest=digest).first()
+    if checkpoint is None:
+        checkpoint = ImportCheckpoint(kind=kind, digest=digest, rows_done=0, imported=0, duplicates=0, errors=0)
+        db.session.add(checkpoint)
+    elif restart:
+        checkpoint.rows_done = checkpoint.imported = checkpoint.duplicates = checkpoint.errors = 0
+        checkpoint.status = 'running'
+    elif checkpoint.status == 'done':
+        return _summary(checkpoint, checkpoint.rows_done, [])
+    checkpoint.filename = os.path.basename(path)[:255]
+    checkpoint.updated_at = datetime.utcnow()
+    db.session.commit()
+
+    resumed_from = checkpoint.rows_done
+    imported_before = checkpoint.imported
+    error_samples = []
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        reader = csv.DictReader(f)
+        _check_columns(kind, reader.fieldnames)
+
+        rows = islice(((reader.line_num, row) for row in reader), resumed_from, None)
+        lookups = _Lookups(kind)
+        try:
+            while True:
+                chunk = list(islice(rows, chunk_size))
+                if not chunk:
+                    break
+                imported, duplicates, errors = IMPORTERS[kind](chunk, lookups)
+                checkpoint.rows_done += len(chunk)
+                checkpoint.imported += imported
+                checkpoint.duplicates += duplicates
+                checkpoint.errors += len(errors)
+                checkpoint.updated_at = datetime.utcnow()
+                bump_version(*IMPORT_VERSIONS[kind])
+                if on_chunk is not None:
+                    on_chunk()
+                db.session.commit()
+                error_samples += errors[:MAX_IMPORT_ERRORS - len(error_samples)]
+        except Exception:
+            db.session.rollback()
+            raise
+
+    checkpoint.status = 'done'
+    db.session.commit()
+    if rebuild and kind in ('sales', 'items') and checkpoint.imported > imported_before:
+        rebuild_rollups()
+    return _summary(checkpoint, resumed_from, error_samples)
@@ -0,0 +1,201 @@
+"""
+Bulk ingestion of sales replayed from the offline PWA.
+Author: Llakterian
+"""
+
+from app.models import db, Client, Supplier, Product, Sale, SaleItem, Installment, SaleSyncKey, PaymentMethod
+from app.cache import bump_version
+from app.rollups import record_sales
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import insert
+
+
+MAX_BULK_SALES = 500
+PAYMENT_METHODS = {method.value for method in PaymentMethod}
+
+_Accepted = namedtuple('_Accepted', ['index', 'key', 'sale', 'items', 'installments'])
+
+
+def _is_id(value):
+    """True for a JSON integer (booleans excluded)."""
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _ids(values):
+    """Integer ids from a list of raw JSON values, ignoring anything else."""
+    return {v for v in values if _is_id(v)}
+
+
+def _parse_pending_sale(entry, products, clients, suppliers):
+    """Validate one PendingSale payload and turn it into insert rows.
+
+    Returns ``(sale_row, item_rows, num_installments)``; raises ValueError with
+    a message for the client when the sale is rejected.
+    """
+    client_id = entry.get('clientId')
+    if not _is_id(client_id) or client_id not in clients:
+        raise ValueError('Unknown client')
+
+    supplier_id = entry.get('supplierId')
+    if supplier_id is not None and (not _is_id(supplier_id) or supplier_id not in suppliers):
+        raise ValueError('Unknown supplier')
+
+    payment_method = entry.get('paymentMethod')
+    if payment_method not in PAYMENT_METHODS:
+        raise ValueError('Invalid payment method')
+
+    items = entry.get('items')
+    if not isinstance(items, list) or not items:
+        raise ValueError('Sale must have at least one item')
+
+    item_rows = []
+    total_amount = 0.0
+    for item in items:
+        if not isinstance(item, dict):
+            raise ValueError('Invalid item')
+        product_id = item.get('productId')
+        product = products.get(product_id) if _is_id(product_id) else None
+        if product is None:
+            raise ValueError('Unknown product')
+        quantity = item.get('quantity')
+        if not _is_id(quantity) or quantity <= 0:
+            raise ValueError('Invalid quantity')
+        # Prices come from the catalog, as in create_sale(), not from the device
+        subtotal = product.price * quantity
+        total_amount += subtotal
+        item_rows.append({
+            'product_id': product.id,
+            'quantity': quantity,
+            'unit_price': product.price,
+            'subtotal': subtotal,
+            'category': product.category,
+        })
+
+    timestamp = entry.get('timestamp')
+    if isinstance(timestamp, (int, float)) and not isinstance(timestamp, bool):
+        sale_date = datetime.fromtimestamp(timestamp / 1000, timezone.utc).replace(tzinfo=None)
+    else:
+        sale_date = datetime.utcnow()
+
+    num_installments = 0
+    if payment_method == 'installment':
+        num_installments = entry.get('numInstallments', 3)
+        if not _is_id(num_installments) or num_installments <= 0:
+            raise ValueError('Invalid number of installments')
+
+    sale_row = {
+        'client_id': client_id,
+        'supplier_id': supplier_id,
+        'payment_method': payment_method,
+        'mpesa_code': entry.get('mpesaCode') if payment_method == 'mpesa' else None,
+        'total_amount': total_amount,
+        'amount_paid': 0.0 if payment_method == 'installment' else total_amount,
+        'notes': entry.get('notes'),
+        'sale_date': sale_date,
+    }
+    return sale_row, item_rows, num_installments
+
+
+def ingest_pending_sales(pending):
+    """Insert a batch of offline sales in one transaction, skipping replays.
+
+    ``pending`` is a list of PendingSale payloads (see frontend/src/utils/offlineDB.ts).
+    Sales whose ``id`` was already ingested are reported as duplicates, so a
+    retried sync is safe. Returns one result dict per input, in order.
+    """
+    entries = [entry if isinstance(entry, dict) else {} for entry in pending]
+    keys = [entry.get('id') for entry in entries]
+
+    # One lookup per table for the whole batch
+    wanted_keys = {key for key in keys if isinstance(key, str)}
+    existing = dict(db.session.query(SaleSyncKey.key, SaleSyncKey.sale_id).filter(
+        SaleSyncKey.key.in_(wanted_keys)
+    ).all()) if wanted_keys else {}
+
+    product_ids = _ids(item.get('productId') for entry in entries
+                       for item in (entry.get('items') if isinstance(entry.get('items'), list) else [])
+                       if isinstance(item, dict))
+    products = {row.id: row for row in db.session.query(
+        Product.id, Product.price, Product.category
+    ).filter(Product.id.in_(product_ids)).all()} if product_ids else {}
+
+    client_ids = _ids(entry.get('clientId') for entry in entries)
+    clients = {row[0] for row in db.session.query(Client.id).filter(Client.id.in_(client_ids))} if client_ids else set()
+
+    supplier_ids = _ids(entry.get('supplierId') for entry in entries)
+    suppliers = {row[0] for row in db.session.query(Supplier.id).filter(
+        Supplier.id.in_(supplier_ids)
+    )} if supplier_ids else set()
+
+    results = [None] * len(entries)
+    accepted = []
+    first_index = {}
+    for index, (entry, key) in enumerate(zip(entries, keys)):
+        if not isinstance(key, str) or not key or len(key) > 64:
+            results[index] = {'id': key, 'status': 'error', 'error': 'Missing or invalid id'}
+            continue
+        if key in existing:
+            results[index] = {'id': key, 'status': 'duplicate', 'sale_id': existing[key]}
+            continue
+        if key in first_index:
+            # Repeated inside this batch; filled in once the first copy is inserted
+            results[index] = {'id': key, 'status': 'duplicate', 'sale_id': None}
+            continue
+        try:
+            sale_row, item_rows, num_installments = _parse_pending_sale(entry, products, clients, suppliers)
+        except ValueError as exc:
+            results[index] = {'id': key, 'status': 'error', 'error': str(exc)}
+            continue
+        first_index[key] = index
+        accepted.append(_Accepted(index, key, sale_row, item_rows, num_installments))
+
+    if accepted:
+        # A multi-row INSERT hands out ascending ids in VALUES order, so sorting the
+        # returned ids lines them up with ``accepted``. Asking SQLAlchemy to sort them
+        # (sort_by_parameter_order) makes SQLite fall back to one INSERT per row;
+        # render_nulls keeps every row on the same column set so they share one batch.
+        sale_ids = sorted(db.session.execute(
+            insert(Sale).returning(Sale.id),
+            [a.sale for a in accepted],
+            execution_options={'render_nulls': True}
+        ).scalars().all())
+
+        item_rows = []
+        installment_rows = []
+        key_rows = []
+        for a, sale_id in zip(accepted, sale_ids):
+            for item in a.items:
+                item_rows.append({
+                    'sale_id': sale_id,
+                    'product_id': item['product_id'],
+                    'quantity': item['quantity'],
+                    'unit_price': item['unit_price'],
+                    'subtotal': item['subtotal'],
+                })
+            for i in range(a.installments):
+                installment_rows.append({
+                    'sale_id': sale_id,
+                    'amount': a.sale['total_amount'] / a.installments,
+                    'due_date': a.sale['sale_date'] + timedelta(days=30 * (i + 1)),
+                })
+            key_rows.append({'key': a.key, 'sale_id': sale_id})
+            results[a.index] = {'id': a.key, 'status': 'created', 'sale_id': sale_id}
+
+        db.session.execute(insert(SaleItem), item_rows)
+        if installment_rows:
+            db.session.execute(insert(Installment), installment_rows)
+        db.session.execute(insert(SaleSyncKey), key_rows)
+
+        record_sales([
+            (Sale(**a.sale), [(item['category'], item['quantity'], item['subtotal']) for item in a.items])
+            for a in accepted
+        ])
+        bump_version('sales')
+
+    db.session.commit()
+
+    for result in results:
+        if result['status'] == 'duplicate' and result['sale_id'] is None:
+            result['sale_id'] = results[first_index[result['id']]]['sale_id']
+    return results
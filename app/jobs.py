@@ -0,0 +1,237 @@
+"""
+Database-backed queue for reports computed outside the web workers.
+Author: Llakterian
+"""
+
+from app.models import db, ReportJob
+from app.reports import build_sales_report, accessory_sales_report, ACCESSORY_INTERVALS
+from app.receivables import receivables_aging
+from app.importer import import_csv, check_csv_file
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import delete, func, select, update
+import json
+import os
+import time
+
+
+JOB_RESULT_TTL = timedelta(hours=24)
+# A running job whose heartbeat is older than this is presumed dead and requeued
+JOB_TIMEOUT = timedelta(minutes=15)
+MAX_JOB_ATTEMPTS = 3
+WORKER_POLL_INTERVAL = 1.0
+
+
+def _date(params, name, default=None):
+    value = params.get(name)
+    if not value:
+        if default is None:
+            raise ValueError(f'{name} is required')
+        return default
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        raise ValueError(f'{name} must be YYYY-MM-DD')
+
+
+def _range(params):
+    date_to = _date(params, 'date_to', datetime.utcnow().date())
+    date_from = _date(params, 'date_from', date_to - timedelta(days=30))
+    if date_from > date_to:
+        raise ValueError('date_from must not be after date_to')
+    return date_from, date_to
+
+
+def _sales_job(params):
+    supplier_id = params.get('supplier_id')
+    if supplier_id is not None and not isinstance(supplier_id, int):
+        raise ValueError('supplier_id must be an integer')
+    date_from, date_to = _range(params)
+    return lambda heartbeat: build_sales_report(date_from, date_to, supplier_id)
+
+
+def _accessories_job(params):
+    interval = params.get('interval', 'day')
+    if interval not in ACCESSORY_INTERVALS:
+        raise ValueError(f'interval must be one of {", ".join(ACCESSORY_INTERVALS)}')
+    date_from, date_to = _range(params)
+    return lambda heartbeat: accessory_sales_report(date_from, date_to, interval)
+
+
+def _aging_job(params):
+    return lambda heartbeat: receivables_aging()
+
+
+def _import_job(params):
+    upload = params.get('upload')
+    # Only files saved by the import endpoint, never an arbitrary path
+    if not isinstance(upload, str) or os.path.basename(upload) != upload:
+        raise ValueError('upload must be the name of an uploaded file')
+    path = os.path.join(current_app.config['UPLOAD_FOLDER'], upload)
+    kind = params.get('kind')
+    check_csv_file(kind, path)
+
+    def run(heartbeat):
+        summary = import_csv(kind, path, on_chunk=heartbeat)
+        os.remove(path)
+        return summary
+    return run
+
+
+# kind -> function validating params and returning the computation; long
+# computations call the heartbeat they are given to show they are still alive
+JOB_KINDS = {
+    'sales': _sales_job,
+    'accessories': _accessories_job,
+    'aging': _aging_job,
+    'import': _import_job,
+}
+
+
+def enqueue_job(kind, params, priority=0):
+    """Validate and queue a report job; raises ValueError for bad input.
+
+    The caller commits.
+    """
+    if kind not in JOB_KINDS:
+        raise ValueError(f'kind must be one of {", ".join(JOB_KINDS)}')
+    if not isinstance(params, dict):
+        raise ValueError('params must be an object')
+    if not isinstance(priority, int):
+        raise ValueError('priority must be an integer')
+    JOB_KINDS[kind](params)
+
+    job = ReportJob(kind=kind, params=json.dumps(params), priority=priority, status='queued')
+    db.session.add(job)
+    db.session.flush()
+    return job
+
+
+def claim_next_job():
+    """Mark the highest priority, oldest queued job as running and return it.
+
+    The conditional UPDATE makes the claim safe with several workers: only
+    one of them changes the row from 'queued'.
+    """
+    while True:
+        job_id = db.session.execute(
+            select(ReportJob.id).where(ReportJob.status == 'queued').order_by(
+                ReportJob.priority.desc(), ReportJob.id
+            ).limit(1)
+        ).scalar()
+        if job_id is None:
+            return None
+
+        claimed = db.session.execute(
+            update(ReportJob).where(ReportJob.id == job_id, ReportJob.status == 'queued').values(
+                status='running', started_at=datetime.utcnow(), heartbeat_at=datetime.utcnow(),
+                attempts=ReportJob.attempts + 1
+            ).execution_options(synchronize_session=False)
+        ).rowcount
+        db.session.commit()
+        if claimed:
+            return db.session.get(ReportJob, job_id)
+
+
+def heartbeat(job_id):
+    """Mark a running job as alive; the caller commits."""
+    db.session.execute(
+        update(ReportJob).where(ReportJob.id == job_id).values(heartbeat_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
+
+
+def run_job(job):
+    """Compute a claimed job and store its result or error."""
+    job_id = job.id
+    try:
+        result = JOB_KINDS[job.kind](json.loads(job.params))(lambda: heartbeat(job_id))
+        job.result = current_app.json.dumps(result)
+        job.status = 'done'
+    except Exception as e:
+        db.session.rollback()
+        job = db.session.get(ReportJob, job.id)
+        job.error = str(e)[:255]
+        job.status = 'failed'
+        current_app.logger.exception('Report job %s failed', job.id)
+
+    job.finished_at = datetime.utcnow()
+    job.expires_at = job.finished_at + JOB_RESULT_TTL
+    db.session.commit()
+    return job
+
+
+def requeue_stale_jobs(timeout=JOB_TIMEOUT):
+    """Requeue jobs whose worker died mid-run; fail them after MAX_JOB_ATTEMPTS.
+
+    A job counts as dead once its last heartbeat (or its start, for jobs
+    claimed before heartbeats existed) is older than ``timeout``.
+    """
+    cutoff = datetime.utcnow() - timeout
+    stale = (ReportJob.status == 'running', func.coalesce(ReportJob.heartbeat_at, ReportJob.started_at) < cutoff)
+    db.session.execute(
+        update(ReportJob).where(*stale, ReportJob.attempts >= MAX_JOB_ATTEMPTS).values(
+            status='failed', error='Worker stopped while running the job', finished_at=datetime.utcnow(),
+            expires_at=datetime.utcnow() + JOB_RESULT_TTL
+        ).execution_options(synchronize_session=False)
+    )
+    requeued = db.session.execute(
+        update(ReportJob).where(*stale).values(status='queued', started_at=None, heartbeat_at=None).execution_options(
+            synchronize_session=False
+        )
+    ).rowcount
+    db.session.commit()
+    return requeued
+
+
+def purge_expired_jobs(now=None):
+    """Delete finished jobs past their expiry; returns how many were removed."""
+    removed = db.session.execute(
+        delete(ReportJob).where(ReportJob.expires_at < (now or datetime.utcnow()))
+    ).rowcount
+    db.session.commit()
+    return removed
+
+
+def run_worker(poll_interval=WORKER_POLL_INTERVAL, once=False):
+    """Process queued jobs until stopped; with ``once``, drain the queue and return.
+
+    Housekeeping (stale requeue, expiry) runs whenever the queue is empty.
+    Returns the number of jobs processed.
+    """
+    processed = 0
+    while True:
+        job = claim_next_job()
+        if job is not None:
+            run_job(job)
+            processed += 1
+            db.session.remove()
+            continue
+
+        requeue_stale_jobs()
+        purge_expired_jobs()
+        db.session.remove()
+        if once:
+            return processed
+        time.sleep(poll_interval)
+
+
+def job_payload(job):
+    """JSON view of a job; includes the result once it is done."""
+    data = {
+        'id': job.id,
+        'kind': job.kind,
+        'params': json.loads(job.params),
+        'priority': job.priority,
+        'status': job.status,
+        'created_at': job.created_at,
+        'started_at': job.started_at,
+        'heartbeat_at': job.heartbeat_at,
+        'finished_at': job.finished_at,
+        'expires_at': job.expires_at,
+    }
+    if job.status == 'done':
+        data['result'] = json.loads(job.result)
+    elif job.status == 'failed':
+        data['error'] = job.error
+    return data
@@ -0,0 +1,55 @@
+"""
+Fast JSON provider for API responses.
+Author: Llakterian
+"""
+
+from datetime import date
+from decimal import Decimal
+from flask.json.provider import DefaultJSONProvider
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _default(value):
+    """Dates as ISO 8601 (the API format), Decimals as floats."""
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    return DefaultJSONProvider.default(value)
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Encode with orjson when it is installed, the stdlib json module otherwise.
+
+    Column-projected endpoints hand raw datetimes straight to jsonify(), so
+    both backends write them as ISO 8601 rather than Flask's HTTP date format.
+    Keys are sorted, as with Flask's default provider.
+    """
+
+    def dumps(self, obj, **kwargs):
+        if orjson is not None and not kwargs:
+            option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_SORT_KEYS if self.sort_keys else 0)
+            return orjson.dumps(obj, default=_default, option=option).decode()
+        kwargs.setdefault('default', _default)
+        kwargs.setdefault('ensure_ascii', self.ensure_ascii)
+        kwargs.setdefault('sort_keys', self.sort_keys)
+        if 'indent' not in kwargs:
+            kwargs.setdefault('separators', (',', ':'))
+        return json.dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        if orjson is not None and not kwargs:
+            return orjson.loads(s)
+        return json.loads(s, **kwargs)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        if self.compact or (self.compact is None and not self._app.debug):
+            return self._app.response_class(f'{self.dumps(obj)}\n', mimetype=self.mimetype)
+        # Pretty-printed in debug mode, like the default provider
+        return self._app.response_class(f'{self.dumps(obj, indent=2)}\n', mimetype=self.mimetype)
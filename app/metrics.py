@@ -0,0 +1,266 @@
+"""
+Per-request performance metrics, exported in the Prometheus text format.
+Author: Llakterian
+"""
+
+from bisect import bisect_left
+from collections import Counter
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from threading import Lock
+import sqlite3
+import time
+
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 500)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+# The same SELECT this many times in one request is reported as a likely N+1
+N_PLUS_ONE_THRESHOLD = 5
+
+
+class _Histogram:
+    """Prometheus histogram; counts are stored per bucket and summed on export."""
+
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class _EndpointMetrics:
+    __slots__ = ('statuses', 'duration', 'query_duration', 'queries', 'size', 'rows', 'n_plus_one')
+
+    def __init__(self):
+        self.statuses = Counter()
+        self.duration = _Histogram(LATENCY_BUCKETS)
+        self.query_duration = _Histogram(LATENCY_BUCKETS)
+        self.queries = _Histogram(QUERY_COUNT_BUCKETS)
+        self.size = _Histogram(SIZE_BUCKETS)
+        self.rows = 0
+        self.n_plus_one = 0
+
+
+class RequestStats:
+    """What one request did, collected by the engine events while it runs."""
+
+    __slots__ = ('started', 'queries', 'query_time', 'rows', 'selects')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.query_time = 0.0
+        self.rows = 0
+        self.selects = Counter()
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels):
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + '}'
+
+
+class MetricsRegistry:
+    """Metrics per (endpoint, method) for this process.
+
+    Each gunicorn worker keeps its own registry, so a scrape sees the worker
+    that answered it.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._endpoints = {}
+
+    def observe(self, endpoint, method, status, stats, duration, size, n_plus_one):
+        with self._lock:
+            metrics = self._endpoints.get((endpoint, method))
+            if metrics is None:
+                metrics = self._endpoints[(endpoint, method)] = _EndpointMetrics()
+            metrics.statuses[status] += 1
+            metrics.duration.observe(duration)
+            metrics.query_duration.observe(stats.query_time)
+            metrics.queries.observe(stats.queries)
+            if size is not None:
+                metrics.size.observe(size)
+            metrics.rows += stats.rows
+            metrics.n_plus_one += n_plus_one
+
+    def render(self):
+        """The registry in the Prometheus text exposition format."""
+        with self._lock:
+            endpoints = sorted(self._endpoints.items())
+            lines = []
+
+            def histogram(name, help_text, attribute):
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} histogram')
+                for (endpoint, method), metrics in endpoints:
+                    hist = getattr(metrics, attribute)
+                    cumulative = 0
+                    for bound, count in zip(hist.buckets + ('+Inf',), hist.counts):
+                        cumulative += count
+                        lines.append(f'{name}_bucket{_labels(endpoint=endpoint, method=method, le=bound)} {cumulative}')
+                    lines.append(f'{name}_sum{_labels(endpoint=endpoint, method=method)} {hist.sum}')
+                    lines.append(f'{name}_count{_labels(endpoint=endpoint, method=method)} {hist.count}')
+
+            def counter(name, help_text, values):
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} counter')
+                for labels, value in values:
+                    lines.append(f'{name}{_labels(**labels)} {value}')
+
+            counter('bontez_http_requests_total', 'Requests handled, by status code.', [
+                ({'endpoint': endpoint, 'method': method, 'status': status}, count)
+                for (endpoint, method), metrics in endpoints for status, count in sorted(metrics.statuses.items())
+            ])
+            histogram('bontez_http_request_duration_seconds', 'Request wall time.', 'duration')
+            histogram('bontez_http_request_query_duration_seconds', 'Time spent in SQL per request.', 'query_duration')
+            histogram('bontez_http_request_queries', 'SQL statements per request.', 'queries')
+            histogram('bontez_http_response_size_bytes', 'Response body size; streamed responses are left out.', 'size')
+            counter('bontez_http_rows_fetched_total', 'Rows fetched from SQLite.', [
+                ({'endpoint': endpoint, 'method': method}, metrics.rows) for (endpoint, method), metrics in endpoints
+            ])
+            counter('bontez_http_n_plus_one_total', f'Requests running one SELECT {N_PLUS_ONE_THRESHOLD}+ times.', [
+                ({'endpoint': endpoint, 'method': method}, metrics.n_plus_one) for (endpoint, method), metrics in endpoints
+            ])
+        return '\n'.join(lines) + '\n'
+
+
+def _current_stats():
+    return g.get('request_stats') if has_request_context() else None
+
+
+class _CountingCursor(sqlite3.Cursor):
+    """sqlite3 cursor that adds the rows it returns to the current request's stats."""
+
+    def _count(self, rows):
+        stats = _current_stats()
+        if stats is not None:
+            stats.rows += rows
+
+    def fetchone(self):
+        row = super().fetchone()
+        if row is not None:
+            self._count(1)
+        return row
+
+    def fetchmany(self, *args, **kwargs):
+        rows = super().fetchmany(*args, **kwargs)
+        self._count(len(rows))
+        return rows
+
+    def fetchall(self):
+        rows = super().fetchall()
+        self._count(len(rows))
+        return rows
+
+
+class _CountingConnection(sqlite3.Connection):
+    def cursor(self, factory=_CountingCursor):
+        return super().cursor(factory)
+
+
+_listeners_installed = False
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current_stats() is not None:
+        conn.info.setdefault('metrics_started', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current_stats()
+    started = conn.info.get('metrics_started')
+    if stats is None or not started:
+        return
+    stats.queries += 1
+    stats.query_time += time.perf_counter() - started.pop()
+    if not executemany and statement.lstrip()[:6].upper() == 'SELECT':
+        stats.selects[statement] += 1
+
+
+def _handle_error(exception_context):
+    """A failed statement skips after_cursor_execute; count it and drop its start time."""
+    conn = exception_context.connection
+    started = conn.info.get('metrics_started') if conn is not None else None
+    if not started:
+        return
+    elapsed = time.perf_counter() - started.pop()
+    stats = _current_stats()
+    if stats is not None:
+        stats.queries += 1
+        stats.query_time += elapsed
+
+
+def _install_listeners():
+    """Listen on every Engine once per process; stats go to whichever request is running."""
+    global _listeners_installed
+    if not _listeners_installed:
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        event.listen(Engine, 'handle_error', _handle_error)
+        _listeners_installed = True
+
+
+def _start_request():
+    g.request_stats = RequestStats()
+
+
+def _record(stats, status, size):
+    duration = time.perf_counter() - stats.started
+    endpoint = request.endpoint or 'unmatched'
+
+    repeated = [(count, statement) for statement, count in stats.selects.items() if count >= N_PLUS_ONE_THRESHOLD]
+    for count, statement in repeated:
+        current_app.logger.warning('Possible N+1 query in %s: %d x %s', endpoint, count, ' '.join(statement.split()))
+
+    current_app.extensions['metrics'].observe(
+        endpoint, request.method, status, stats, duration, size, 1 if repeated else 0
+    )
+
+
+def _finish_request(response):
+    stats = g.pop('request_stats', None)
+    if stats is not None:
+        _record(stats, response.status_code, None if response.is_streamed else response.content_length)
+    return response
+
+
+def _teardown_request(exception):
+    """Record requests that never reached after_request as 500s.
+
+    That happens when an exception propagates (PROPAGATE_EXCEPTIONS, debug
+    mode) or an earlier after_request function fails. Requests already
+    recorded popped their stats, so nothing is counted twice.
+    """
+    stats = g.pop('request_stats', None)
+    if stats is not None:
+        _record(stats, 500, None)
+
+
+def init_metrics(app):
+    """Collect per-request metrics for ``app``; call before db.init_app().
+
+    On SQLite the connections use a cursor that counts fetched rows; other
+    databases report the other metrics without row counts.
+    """
+    if app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite'):
+        options = app.config['SQLALCHEMY_ENGINE_OPTIONS']
+        options['connect_args'] = {**options.get('connect_args', {}), 'factory': _CountingConnection}
+    _install_listeners()
+    app.extensions['metrics'] = MetricsRegistry()
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    app.teardown_request(_teardown_request)
@@ -0,0 +1,199 @@
+"""
+Schema migrations for databases created before a model change.
+Author: Llakterian
+"""
+
+from app.models import db, SchemaMigration
+from app.search import phone_digits_sql
+from sqlalchemy import select, insert, inspect, text
+from sqlalchemy.exc import IntegrityError, OperationalError
+from sqlalchemy.schema import CreateIndex
+
+
+# (id, function) pairs, applied in order; never reorder or rename an id
+MIGRATIONS = []
+
+
+def migration(migration_id):
+    """Register a function taking a connection as the next migration.
+
+    A migration that returns False could not apply on this database yet; it
+    is left unrecorded and tried again at the next startup.
+    """
+    def decorator(func):
+        MIGRATIONS.append((migration_id, func))
+        return func
+    return decorator
+
+
+def _create_indexes(connection, *table_names):
+    """Create every index declared on the given tables that is still missing."""
+    for name in table_names:
+        for index in db.metadata.tables[name].indexes:
+            connection.execute(CreateIndex(index, if_not_exists=True))
+
+
+@migration('0001_report_indexes')
+def report_indexes(connection):
+    """Indexes for report date ranges, listings and foreign key lookups."""
+    _create_indexes(connection, 'products', 'sales', 'sale_items', 'installments',
+                    'daily_sales_rollups', 'daily_product_rollups')
+
+
+@migration('0002_data_version_timestamps')
+def data_version_timestamps(connection):
+    """Last change time per data set, used for Last-Modified headers."""
+    columns = {column['name'] for column in inspect(connection).get_columns('data_versions')}
+    if 'updated_at' not in columns:
+        connection.execute(text('ALTER TABLE data_versions ADD COLUMN updated_at DATETIME'))
+
+
+@migration('0003_installment_allocation')
+def installment_allocation(connection):
+    """Partial payments per installment, and the open-installments index."""
+    columns = {column['name'] for column in inspect(connection).get_columns('installments')}
+    if 'amount_paid' not in columns:
+        connection.execute(text('ALTER TABLE installments ADD COLUMN amount_paid FLOAT DEFAULT 0'))
+        # Spread what each sale has been paid so far over its installments, oldest due first
+        connection.execute(text('''
+            UPDATE installments SET amount_paid = CASE WHEN is_paid THEN amount ELSE MAX(0, MIN(amount,
+                (SELECT COALESCE(s.amount_paid, 0) FROM sales s WHERE s.id = installments.sale_id)
+                - (SELECT COALESCE(SUM(p.amount), 0) FROM installments p
+                   WHERE p.sale_id = installments.sale_id
+                     AND (p.due_date < installments.due_date
+                          OR (p.due_date = installments.due_date AND p.id < installments.id)))
+            )) END
+        '''))
+        connection.execute(text('''
+            UPDATE installments SET is_paid = 1, paid_date = COALESCE(paid_date, CURRENT_TIMESTAMP)
+            WHERE NOT is_paid AND amount - amount_paid < 0.005
+        '''))
+    _create_indexes(connection, 'installments')
+
+
+def _trigram_fts_available(connection):
+    """True when SQLite has FTS5 with the trigram tokenizer (3.34+, FTS5 compiled in).
+
+    Probed on a throwaway in-memory database, so a failure leaves the
+    migration's transaction alone.
+    """
+    if connection.dialect.name != 'sqlite':
+        return False
+    dbapi = connection.dialect.dbapi
+    probe = dbapi.connect(':memory:')
+    try:
+        probe.execute("CREATE VIRTUAL TABLE trigram_probe USING fts5(x, tokenize='trigram')")
+    except dbapi.OperationalError:
+        return False
+    finally:
+        probe.close()
+    return True
+
+
+@migration('0004_client_search')
+def client_search_index(connection):
+    """FTS5 trigram index over client names, addresses and normalized phones, kept current by triggers.
+
+    Left pending without FTS5 trigram support (other databases, SQLite before
+    3.34), so the index is built once SQLite is upgraded; client search falls
+    back to LIKE until then.
+    """
+    if not _trigram_fts_available(connection):
+        return False
+    connection.execute(text(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS client_search USING fts5(name, phone, address, tokenize='trigram')"
+    ))
+    for name in ('clients_search_insert', 'clients_search_update', 'clients_search_delete'):
+        connection.execute(text(f'DROP TRIGGER IF EXISTS {name}'))
+    insert_new = (f"INSERT INTO client_search (rowid, name, phone, address) "
+                  f"VALUES (new.id, new.name, {phone_digits_sql('new.phone')}, COALESCE(new.address, ''));")
+    connection.execute(text(f'CREATE TRIGGER clients_search_insert AFTER INSERT ON clients BEGIN {insert_new} END'))
+    connection.execute(text(
+        'CREATE TRIGGER clients_search_update AFTER UPDATE OF name, phone, address ON clients BEGIN '
+        f'DELETE FROM client_search WHERE rowid = old.id; {insert_new} END'
+    ))
+    connection.execute(text(
+        'CREATE TRIGGER clients_search_delete AFTER DELETE ON clients BEGIN '
+        'DELETE FROM client_search WHERE rowid = old.id; END'
+    ))
+    # Rebuilt from scratch, so rerunning after the clients table was recreated leaves no stale rows
+    connection.execute(text('DELETE FROM client_search'))
+    connection.execute(text(
+        f"INSERT INTO client_search (rowid, name, phone, address) "
+        f"SELECT id, name, {phone_digits_sql('phone')}, COALESCE(address, '') FROM clients"
+    ))
+
+
+def _change_log_triggers(connection, table_names):
+    """Triggers recording every write to ``table_names`` in change_log, plus an entry per existing row."""
+    for table_name in table_names:
+        for event, op, row in (('insert', 'upsert', 'new'), ('update', 'upsert', 'new'), ('delete', 'delete', 'old')):
+            trigger = f'{table_name}_change_log_{event}'
+            connection.execute(text(f'DROP TRIGGER IF EXISTS {trigger}'))
+            connection.execute(text(
+                f'CREATE TRIGGER {trigger} AFTER {event.upper()} ON {table_name} BEGIN '
+                f"INSERT INTO change_log (table_name, row_id, op, changed_at) "
+                f"VALUES ('{table_name}', {row}.id, '{op}', CURRENT_TIMESTAMP); END"
+            ))
+        # Rows written before the log existed, so syncing from the start returns everything
+        connection.execute(text(
+            f"INSERT INTO change_log (table_name, row_id, op, changed_at) "
+            f"SELECT '{table_name}', id, 'upsert', CURRENT_TIMESTAMP FROM {table_name} t WHERE NOT EXISTS "
+            f"(SELECT 1 FROM change_log c WHERE c.table_name = '{table_name}' AND c.row_id = t.id) ORDER BY id"
+        ))
+
+
+@migration('0005_change_log')
+def change_log_triggers(connection):
+    """Change log triggers on the synced tables of the first sync release.
+
+    SQLite only: it has a single writer, so ids commit in order and a reader
+    never skips an entry committed later with a smaller id.
+    """
+    if connection.dialect.name != 'sqlite':
+        return
+    _create_indexes(connection, 'change_log')
+    _change_log_triggers(connection, ('suppliers', 'products', 'clients', 'sales', 'installments'))
+
+
+@migration('0006_report_job_heartbeat')
+def report_job_heartbeat(connection):
+    """Heartbeat time of running jobs, so long imports are not requeued as stale."""
+    columns = {column['name'] for column in inspect(connection).get_columns('report_jobs')}
+    if 'heartbeat_at' not in columns:
+        connection.execute(text('ALTER TABLE report_jobs ADD COLUMN heartbeat_at DATETIME'))
+
+
+@migration('0007_sale_items_change_log')
+def sale_items_change_log(connection):
+    """Sync sale lines too, so the PWA can rebuild a sale's items."""
+    if connection.dialect.name != 'sqlite':
+        return
+    _change_log_triggers(connection, ('sale_items',))
+
+
+def apply_migrations():
+    """Apply pending migrations; safe to run from several workers at once.
+
+    db.create_all() only creates missing tables, so anything added to an
+    existing table (indexes, triggers, columns) needs a migration here.
+    """
+    applied = set(db.session.execute(select(SchemaMigration.id)).scalars())
+    db.session.remove()
+
+    for migration_id, func in MIGRATIONS:
+        if migration_id in applied:
+            continue
+        try:
+            with db.engine.begin() as connection:
+                if func(connection) is False:
+                    continue
+                connection.execute(insert(SchemaMigration).values(id=migration_id))
+        except (IntegrityError, OperationalError):
+            # Fine if another worker applied it while we waited for the write lock
+            with db.engine.connect() as connection:
+                recorded = connection.execute(
+                    select(SchemaMigration.id).where(SchemaMigration.id == migration_id)
+                ).first()
+            if recorded is None:
+                raise
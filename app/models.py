@@ -29,6 +29,9 @@ class Supplier(db.Model):
 class Product(db.Model):
     """Represents a product (gas cylinder or accessory)."""
     __tablename__ = 'products'
+    __table_args__ = (
+        db.Index('ix_products_supplier_id', 'supplier_id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
@@ -71,6 +74,12 @@ class Client(db.Model):
 class Sale(db.Model):
     """Represents a sale transaction."""
     __tablename__ = 'sales'
+    __table_args__ = (
+        db.Index('ix_sales_sale_date_id', 'sale_date', 'id'),
+        db.Index('ix_sales_supplier_id_sale_date', 'supplier_id', 'sale_date'),
+        db.Index('ix_sales_client_id_created_at', 'client_id', 'created_at'),
+        db.Index('ix_sales_created_at', 'created_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     client_id = db.Column(db.Integer, db.ForeignKey('clients.id'), nullable=False)
@@ -97,6 +106,10 @@ class Sale(db.Model):
 class SaleItem(db.Model):
     """Represents individual items in a sale."""
     __tablename__ = 'sale_items'
+    __table_args__ = (
+        db.Index('ix_sale_items_sale_id', 'sale_id'),
+        db.Index('ix_sale_items_product_id', 'product_id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     sale_id = db.Column(db.Integer, db.ForeignKey('sales.id'), nullable=False)
@@ -112,10 +125,17 @@ class SaleItem(db.Model):
 class Installment(db.Model):
     """Represents installment payments for a sale."""
     __tablename__ = 'installments'
+    __table_args__ = (
+        db.Index('ix_installments_sale_id', 'sale_id'),
+        db.Index('ix_installments_due_date', 'due_date'),
+        # Open installments in due order, for aging and the due scan
+        db.Index('ix_installments_open_due', 'is_paid', 'due_date'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     sale_id = db.Column(db.Integer, db.ForeignKey('sales.id'), nullable=False)
     amount = db.Column(db.Float, nullable=False)
+    amount_paid = db.Column(db.Float, default=0.0)
     due_date = db.Column(db.DateTime, nullable=False)
     paid_date = db.Column(db.DateTime)
     is_paid = db.Column(db.Boolean, default=False)
@@ -123,6 +143,154 @@ class Installment(db.Model):
     
     def __repr__(self):
         return f'<Installment {self.id}>'
+    
+    def outstanding(self):
+        """Amount still owed on this installment."""
+        return self.amount - (self.amount_paid or 0)
+
+
+class SaleSyncKey(db.Model):
+    """Client-generated id of a sale replayed from the offline PWA queue.
+    
+    Sales loaded by the CSV importer are keyed 'import:<sale_id in the file>'.
+    """
+    __tablename__ = 'sale_sync_keys'
+    
+    key = db.Column(db.String(64), primary_key=True)
+    sale_id = db.Column(db.Integer, db.ForeignKey('sales.id'), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<SaleSyncKey {self.key}>'
+
+
+class DailySalesRollup(db.Model):
+    """Per-day sale totals by supplier and payment method, kept current by the write paths."""
+    __tablename__ = 'daily_sales_rollups'
+    __table_args__ = (
+        db.Index('ix_daily_sales_rollups_key', 'day', 'supplier_id', 'payment_method'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False)
+    supplier_id = db.Column(db.Integer, db.ForeignKey('suppliers.id'), nullable=True)
+    payment_method = db.Column(db.String(20), nullable=False)
+    sale_count = db.Column(db.Integer, default=0)
+    total_amount = db.Column(db.Float, default=0.0)
+    amount_paid = db.Column(db.Float, default=0.0)
+    
+    def __repr__(self):
+        return f'<DailySalesRollup {self.day} {self.supplier_id} {self.payment_method}>'
+
+
+class DailyProductRollup(db.Model):
+    """Per-day item totals by supplier and product category."""
+    __tablename__ = 'daily_product_rollups'
+    __table_args__ = (
+        db.Index('ix_daily_product_rollups_key', 'day', 'supplier_id', 'category'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False)
+    supplier_id = db.Column(db.Integer, db.ForeignKey('suppliers.id'), nullable=True)
+    category = db.Column(db.String(50), nullable=False)
+    quantity = db.Column(db.Integer, default=0)
+    total_amount = db.Column(db.Float, default=0.0)
+    
+    def __repr__(self):
+        return f'<DailyProductRollup {self.day} {self.supplier_id} {self.category}>'
+
+
+class DataVersion(db.Model):
+    """Change counter per data set, shared by every worker process."""
+    __tablename__ = 'data_versions'
+    
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<DataVersion {self.name}={self.version}>'
+
+
+class SchemaMigration(db.Model):
+    """Records which schema migrations have been applied to this database."""
+    __tablename__ = 'schema_migrations'
+    
+    id = db.Column(db.String(100), primary_key=True)
+    applied_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<SchemaMigration {self.id}>'
+
+
+class ReportJob(db.Model):
+    """A report computed by the background worker instead of a web request."""
+    __tablename__ = 'report_jobs'
+    __table_args__ = (
+        # The worker claims the next queued job: WHERE status = 'queued' ORDER BY priority DESC, id
+        db.Index('ix_report_jobs_status_priority', 'status', 'priority', 'id'),
+        db.Index('ix_report_jobs_expires_at', 'expires_at'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    params = db.Column(db.Text, nullable=False)  # JSON
+    priority = db.Column(db.Integer, default=0, nullable=False)  # higher runs first
+    status = db.Column(db.String(20), default='queued', nullable=False)  # 'queued', 'running', 'done', 'failed'
+    result = db.Column(db.Text)  # JSON, once done
+    error = db.Column(db.String(255))
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    heartbeat_at = db.Column(db.DateTime)  # refreshed while running; a stale one means the worker died
+    finished_at = db.Column(db.DateTime)
+    expires_at = db.Column(db.DateTime)
+    
+    def __repr__(self):
+        return f'<ReportJob {self.id} {self.kind} {self.status}>'
+
+
+class ImportCheckpoint(db.Model):
+    """Progress of one CSV file through the bulk importer, committed with each chunk."""
+    __tablename__ = 'import_checkpoints'
+    __table_args__ = (
+        db.UniqueConstraint('kind', 'digest', name='uq_import_checkpoints_kind_digest'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(20), nullable=False)  # 'clients', 'sales', 'items', 'installments'
+    digest = db.Column(db.String(64), nullable=False)  # SHA-256 of the file contents
+    filename = db.Column(db.String(255))
+    rows_done = db.Column(db.Integer, default=0, nullable=False)
+    imported = db.Column(db.Integer, default=0, nullable=False)
+    duplicates = db.Column(db.Integer, default=0, nullable=False)
+    errors = db.Column(db.Integer, default=0, nullable=False)
+    status = db.Column(db.String(20), default='running', nullable=False)  # 'running', 'done'
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<ImportCheckpoint {self.kind} {self.filename} {self.rows_done}>'
+
+
+class ChangeLog(db.Model):
+    """One write to a synced row, recorded by triggers; the id is the delta sync cursor."""
+    __tablename__ = 'change_log'
+    __table_args__ = (
+        db.Index('ix_change_log_row', 'table_name', 'row_id', 'id'),
+        # AUTOINCREMENT: ids only grow, so a cursor never sees a reused id
+        {'sqlite_autoincrement': True},
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    table_name = db.Column(db.String(30), nullable=False)
+    row_id = db.Column(db.Integer, nullable=False)
+    op = db.Column(db.String(10), nullable=False)  # 'upsert' or 'delete'
+    changed_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<ChangeLog {self.id} {self.op} {self.table_name} {self.row_id}>'
 
 
 class AccessorySale(db.Model):
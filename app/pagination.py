@@ -0,0 +1,102 @@
+"""
+Keyset (cursor) pagination helpers.
+Author: Llakterian
+"""
+
+from app.models import db
+from collections import namedtuple
+from datetime import datetime
+from sqlalchemy import and_, or_, func, select
+import base64
+import math
+import binascii
+import json
+
+
+KeysetPage = namedtuple('KeysetPage', ['items', 'next_cursor'])
+OffsetPage = namedtuple('OffsetPage', ['items', 'total', 'page', 'pages'])
+
+MAX_PAGE_SIZE = 500
+
+
+def encode_cursor(values):
+    """Pack the sort key of the last row into an opaque URL-safe token."""
+    payload = [v.isoformat() if isinstance(v, datetime) else v for v in values]
+    raw = json.dumps(payload, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor, columns):
+    """Unpack a cursor into values typed for the given columns.
+
+    Raises ValueError for anything that was not produced by encode_cursor().
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except (binascii.Error, UnicodeDecodeError, json.JSONDecodeError):
+        raise ValueError('Invalid cursor')
+
+    if not isinstance(values, list) or len(values) != len(columns):
+        raise ValueError('Invalid cursor')
+
+    decoded = []
+    for column, value in zip(columns, values):
+        if column.type.python_type is datetime:
+            if not isinstance(value, str):
+                raise ValueError('Invalid cursor')
+            value = datetime.fromisoformat(value)
+        elif not isinstance(value, column.type.python_type):
+            raise ValueError('Invalid cursor')
+        decoded.append(value)
+    return decoded
+
+
+def _seek(columns, values, descending):
+    """Rows strictly after ``values`` in (columns) order.
+
+    Written as ``a <= x AND (a < x OR (b < y ...))`` so the leading column stays
+    an index range predicate.
+    """
+    column, value = columns[0], values[0]
+    if len(columns) == 1:
+        return column < value if descending else column > value
+    rest = _seek(columns[1:], values[1:], descending)
+    if descending:
+        return and_(column <= value, or_(column < value, rest))
+    return and_(column >= value, or_(column > value, rest))
+
+
+def keyset_page(stmt, columns, limit, after=None, descending=False):
+    """Fetch one page of the ``stmt`` SELECT ordered by ``columns``, seeking past ``after``.
+
+    The last column must be unique (normally the primary key). The sort
+    columns are appended to the select, so rows carry them as trailing values
+    whether or not the caller projected them. No COUNT is run; the page
+    fetches one extra row to tell whether another page exists. ``limit`` is
+    clamped to 1..MAX_PAGE_SIZE.
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    if after:
+        stmt = stmt.where(_seek(columns, decode_cursor(after, columns), descending))
+
+    order = [c.desc() if descending else c.asc() for c in columns]
+    stmt = stmt.add_columns(*[c.label(f'_cursor_{i}') for i, c in enumerate(columns)])
+    rows = db.session.execute(stmt.order_by(*order).limit(limit + 1)).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(list(rows[-1][-len(columns):]))
+    return KeysetPage(rows, next_cursor)
+
+
+def offset_page(stmt, page, per_page):
+    """Page/limit pagination of a SELECT, with the same numbers Flask-SQLAlchemy's paginate() reports."""
+    page = max(page, 1)
+    per_page = max(per_page, 1)
+    total = db.session.execute(
+        select(func.count()).select_from(stmt.order_by(None).subquery())
+    ).scalar()
+    rows = db.session.execute(stmt.limit(per_page).offset((page - 1) * per_page)).all()
+    return OffsetPage(rows, total, page, math.ceil(total / per_page) if total else 0)
@@ -0,0 +1,120 @@
+"""
+Installment payment allocation, receivables aging and the due-installment scan.
+Author: Llakterian
+"""
+
+from app.models import db, Client, Sale, Installment
+from app.pagination import keyset_page
+from datetime import datetime, timedelta
+from sqlalchemy import case, distinct, func, select
+
+
+# (label, minimum days past due), most overdue first
+AGING_BUCKETS = (('90+', 90), ('60', 60), ('30', 30), ('current', None))
+DUE_BATCH_SIZE = 500
+
+# Installments are total / n, so payments can leave a fraction of a cent behind
+PAYMENT_TOLERANCE = 0.005
+
+
+def _open():
+    """Installments not yet fully paid; a prefix of ix_installments_open_due."""
+    return Installment.is_paid == False  # noqa: E712
+
+
+def _outstanding():
+    return Installment.amount - func.coalesce(Installment.amount_paid, 0)
+
+
+def allocate_payment(sale, amount, paid_at=None):
+    """Apply a payment to the sale's open installments, earliest due date first.
+
+    Partly covered installments keep the part paid in ``amount_paid``. Returns
+    the installments this payment settled; call inside the payment's transaction.
+    """
+    paid_at = paid_at or datetime.utcnow()
+    remaining = float(amount)
+    settled = []
+
+    installments = Installment.query.filter(Installment.sale_id == sale.id, _open()).order_by(
+        Installment.due_date, Installment.id
+    ).all()
+    for installment in installments:
+        if remaining < PAYMENT_TOLERANCE:
+            break
+        applied = min(remaining, installment.outstanding())
+        installment.amount_paid = (installment.amount_paid or 0) + applied
+        remaining -= applied
+        if installment.outstanding() < PAYMENT_TOLERANCE:
+            installment.is_paid = True
+            installment.paid_date = paid_at
+            settled.append(installment)
+    return settled
+
+
+def receivables_aging(as_of=None):
+    """Outstanding installment balances by days past due, with one grouped query.
+
+    Buckets are 'current' (under 30 days past due, including not yet due),
+    '30', '60' and '90+'.
+    """
+    as_of = as_of or datetime.utcnow()
+    bucket = case(*[
+        (Installment.due_date <= as_of - timedelta(days=days), label)
+        for label, days in AGING_BUCKETS if days is not None
+    ], else_='current').label('bucket')
+
+    rows = db.session.query(
+        bucket, func.count(Installment.id), func.count(distinct(Installment.sale_id)), func.sum(_outstanding())
+    ).filter(_open()).group_by(bucket).all()
+
+    buckets = {label: {'count': 0, 'sales': 0, 'amount': 0.0} for label, _ in reversed(AGING_BUCKETS)}
+    for label, count, sales, amount in rows:
+        buckets[label] = {'count': count, 'sales': sales, 'amount': float(amount or 0)}
+
+    return {
+        'as_of': as_of.isoformat(),
+        'buckets': buckets,
+        'total_count': sum(b['count'] for b in buckets.values()),
+        'total_outstanding': sum(b['amount'] for b in buckets.values()),
+    }
+
+
+def due_installments_page(as_of=None, within_days=0, limit=DUE_BATCH_SIZE, after=None):
+    """One keyset page of open installments due by ``as_of + within_days``, oldest first.
+
+    Each page is a range scan of ix_installments_open_due from the cursor on.
+    Raises ValueError for an invalid cursor.
+    """
+    as_of = as_of or datetime.utcnow()
+    cutoff = as_of + timedelta(days=within_days)
+    stmt = select(
+        Installment.id, Installment.sale_id, Installment.due_date, Installment.amount,
+        _outstanding(), Client.id, Client.name, Client.phone
+    ).select_from(Installment).join(Sale, Installment.sale_id == Sale.id).join(
+        Client, Sale.client_id == Client.id
+    ).where(_open(), Installment.due_date <= cutoff)
+
+    page = keyset_page(stmt, (Installment.due_date, Installment.id), limit, after)
+    items = [{
+        'id': installment_id,
+        'sale_id': sale_id,
+        'due_date': due_date,
+        'amount': amount,
+        'outstanding': outstanding,
+        'days_overdue': (as_of.date() - due_date.date()).days,
+        'client': {'id': client_id, 'name': name, 'phone': phone},
+    } for installment_id, sale_id, due_date, amount, outstanding, client_id, name, phone, *_ in page.items]
+    return items, page.next_cursor
+
+
+def iter_due_installments(as_of=None, within_days=0, batch_size=DUE_BATCH_SIZE):
+    """Yield every due installment in batches, for scheduled reminder runs."""
+    as_of = as_of or datetime.utcnow()
+    after = None
+    while True:
+        items, after = due_installments_page(as_of, within_days, batch_size, after)
+        if items:
+            yield items
+        if after is None:
+            return
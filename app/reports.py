@@ -0,0 +1,391 @@
+"""
+SQL aggregation engine for sales reports.
+Author: Llakterian
+"""
+
+from app.models import db, Client, Supplier, Sale, AccessorySale, DailySalesRollup, DailyProductRollup
+from app.serializers import serialize_sale, with_sale_relationships, RECENT_SALE_FIELDS
+from datetime import datetime, time, timedelta
+from functools import lru_cache
+from sqlalchemy import func, case, and_, or_
+
+
+PRODUCT_TYPES = ['6Kg New', '6Kg Refill', '12Kg New', '12Kg Refill', 'Accessories']
+
+# Column prefixes of the <item>_quantity / <item>_total pairs on AccessorySale
+ACCESSORY_ITEMS = ('grill', 'burner_300', 'burner_350', 'burner_450', 'burner_600',
+                   'regulator_6kg', 'regulator_13kg', 'hose')
+ACCESSORY_INTERVALS = ('day', 'week')
+COMPARISONS = ('previous', 'last_year')
+
+
+def day_bounds(date_from, date_to):
+    """Return a half-open datetime range covering both dates inclusively."""
+    start = datetime.combine(date_from, time.min)
+    end = datetime.combine(date_to + timedelta(days=1), time.min)
+    return start, end
+
+
+def sale_filters(date_from, date_to, supplier_id=None):
+    """Build the WHERE clauses shared by every report query."""
+    start, end = day_bounds(date_from, date_to)
+    filters = [Sale.sale_date >= start, Sale.sale_date < end]
+    if supplier_id:
+        filters.append(Sale.supplier_id == supplier_id)
+    return filters
+
+
+def rollup_filters(date_from, date_to, supplier_id=None):
+    """Build the WHERE clauses for queries against the daily sales rollup."""
+    filters = [DailySalesRollup.day >= date_from, DailySalesRollup.day <= date_to]
+    if supplier_id:
+        filters.append(DailySalesRollup.supplier_id == supplier_id)
+    return filters
+
+
+def product_rollup_filters(date_from, date_to, supplier_id=None):
+    """Build the WHERE clauses for queries against the daily product rollup."""
+    filters = [DailyProductRollup.day >= date_from, DailyProductRollup.day <= date_to]
+    if supplier_id:
+        filters.append(DailyProductRollup.supplier_id == supplier_id)
+    return filters
+
+
+@lru_cache(maxsize=None)
+def product_type(category):
+    """Report product type for a Product.category such as 'cylinder_13kg_refill'.
+
+    Categories are ``cylinder_<size>[_refill]`` or ``accessory_<kind>``. The
+    large 12/13Kg cylinders share the '12Kg' types; anything else is an accessory.
+    """
+    parts = (category or '').lower().split('_')
+    if parts[0] != 'cylinder' or len(parts) < 2:
+        return 'Accessories'
+    size = {'6kg': '6Kg', '12kg': '12Kg', '13kg': '12Kg'}.get(parts[1])
+    if size is None:
+        return 'Accessories'
+    return f'{size} Refill' if 'refill' in parts[2:] else f'{size} New'
+
+
+def sales_totals(filters):
+    """Return (count, revenue) from the daily sales rollup."""
+    count, revenue = db.session.query(
+        func.coalesce(func.sum(DailySalesRollup.sale_count), 0),
+        func.coalesce(func.sum(DailySalesRollup.total_amount), 0)
+    ).filter(*filters).one()
+    return int(count), float(revenue)
+
+
+def sales_by_supplier(filters):
+    """Revenue per supplier name; sales without a supplier are skipped."""
+    rows = db.session.query(
+        Supplier.name, func.sum(DailySalesRollup.total_amount)
+    ).join(DailySalesRollup, DailySalesRollup.supplier_id == Supplier.id).filter(
+        *filters
+    ).group_by(Supplier.name).having(func.sum(DailySalesRollup.sale_count) > 0).all()
+    return {name: float(total) for name, total in rows}
+
+
+def sales_by_payment_method(filters):
+    """Revenue per payment method."""
+    rows = db.session.query(
+        DailySalesRollup.payment_method, func.sum(DailySalesRollup.total_amount)
+    ).filter(*filters).group_by(
+        DailySalesRollup.payment_method
+    ).having(func.sum(DailySalesRollup.sale_count) > 0).all()
+    return {method: float(total) for method, total in rows}
+
+
+def supplier_breakdown(date_from, date_to):
+    """Return (name, color, total) per supplier; name is None for sales without one."""
+    rows = db.session.query(
+        Supplier.name, Supplier.color, func.sum(DailySalesRollup.total_amount)
+    ).select_from(DailySalesRollup).outerjoin(
+        Supplier, DailySalesRollup.supplier_id == Supplier.id
+    ).filter(*rollup_filters(date_from, date_to)).group_by(
+        DailySalesRollup.supplier_id, Supplier.name, Supplier.color
+    ).having(func.sum(DailySalesRollup.sale_count) > 0).order_by(DailySalesRollup.supplier_id).all()
+    return [(name, color, float(total)) for name, color, total in rows]
+
+
+def sales_by_product_type(filters):
+    """Item subtotals per product type from the product rollup, always including every type.
+
+    Grouped by category in SQL; the handful of categories is then mapped onto types.
+    """
+    rows = db.session.query(
+        DailyProductRollup.category, func.sum(DailyProductRollup.total_amount)
+    ).filter(*filters).group_by(DailyProductRollup.category).all()
+
+    totals = {name: 0 for name in PRODUCT_TYPES}
+    for category, total in rows:
+        totals[product_type(category)] += float(total or 0)
+    return totals
+
+
+def daily_sales_trend(filters):
+    """Revenue and sale count per calendar day, oldest first."""
+    rows = db.session.query(
+        DailySalesRollup.day,
+        func.sum(DailySalesRollup.total_amount),
+        func.sum(DailySalesRollup.sale_count)
+    ).filter(*filters).group_by(DailySalesRollup.day).having(
+        func.sum(DailySalesRollup.sale_count) > 0
+    ).order_by(DailySalesRollup.day).all()
+    return [{'date': day.isoformat(), 'amount': float(amount), 'count': int(count)} for day, amount, count in rows]
+
+
+def top_clients(filters, limit=10):
+    """Highest spending clients for the filtered sales."""
+    total = func.sum(Sale.total_amount).label('total')
+    rows = db.session.query(
+        Client.name, total
+    ).join(Sale, Sale.client_id == Client.id).filter(*filters).group_by(
+        Client.name
+    ).order_by(total.desc()).limit(limit).all()
+    return [{'name': name, 'total': float(amount)} for name, amount in rows]
+
+
+def last_year_range(date_from, date_to):
+    """The same range one year earlier, or None when it starts or ends on 29 February."""
+    try:
+        return date_from.replace(year=date_from.year - 1), date_to.replace(year=date_to.year - 1)
+    except ValueError:
+        return None
+
+
+def sales_report_ranges(date_from, date_to):
+    """Every date range build_sales_report() reads, for date-scoped caching."""
+    last_year = last_year_range(date_from, date_to)
+    return [(date_from, date_to)] + ([last_year] if last_year else [])
+
+
+def yoy_growth(date_from, date_to, revenue):
+    """Percentage growth against the same range one year earlier."""
+    last_year = last_year_range(date_from, date_to)
+    if last_year is None:
+        # 29 February has no counterpart in the previous year
+        return 0
+
+    _, last_year_revenue = sales_totals(rollup_filters(*last_year))
+    if last_year_revenue <= 0:
+        return 0
+    return (revenue - last_year_revenue) / last_year_revenue * 100
+
+
+def build_sales_report(date_from, date_to, supplier_id=None):
+    """Compute the full /api/reports/sales payload with grouped queries."""
+    filters = sale_filters(date_from, date_to, supplier_id)
+    rollups = rollup_filters(date_from, date_to, supplier_id)
+
+    total_sales, total_revenue = sales_totals(rollups)
+    average_sale = total_revenue / total_sales if total_sales > 0 else 0
+
+    return {
+        'total_sales': total_sales,
+        'total_revenue': total_revenue,
+        'average_sale': average_sale,
+        'yoy_growth': yoy_growth(date_from, date_to, total_revenue),
+        'sales_by_supplier': sales_by_supplier(rollups),
+        'sales_by_payment_method': sales_by_payment_method(rollups),
+        'sales_by_product_type': sales_by_product_type(product_rollup_filters(date_from, date_to, supplier_id)),
+        'daily_sales': daily_sales_trend(rollups),
+        'top_clients': top_clients(filters),
+    }
+
+
+def comparison_range(date_from, date_to, against):
+    """The range a report is compared with; raises ValueError when there is none.
+
+    'previous' is the equally long range just before, 'last_year' the same
+    dates one year earlier. The two ranges may not overlap.
+    """
+    if against == 'previous':
+        days = (date_to - date_from).days + 1
+        return date_from - timedelta(days=days), date_from - timedelta(days=1)
+    if against != 'last_year':
+        raise ValueError(f'against must be one of {", ".join(COMPARISONS)}')
+
+    last_year = last_year_range(date_from, date_to)
+    if last_year is None:
+        raise ValueError('29 February has no counterpart in the previous year')
+    if last_year[1] >= date_from:
+        raise ValueError('Ranges longer than a year overlap the same period last year')
+    return last_year
+
+
+def _change(current, comparison):
+    """Percentage change, or None when there is nothing to compare with."""
+    if not comparison:
+        return None
+    return (current - comparison) / comparison * 100
+
+
+def _compared(rows):
+    """{key: {current, comparison, change}} from (period, key, amount) rows."""
+    data = {}
+    for period, key, amount in rows:
+        data.setdefault(key, {'current': 0.0, 'comparison': 0.0})[period] += float(amount or 0)
+    for entry in data.values():
+        entry['change'] = _change(entry['current'], entry['comparison'])
+    return data
+
+
+def _grouped_by_period(model, current, comparison, supplier_id, *columns, dimension=None):
+    """One query grouping ``model`` rows of both ranges by period and an optional dimension."""
+    period = case((and_(model.day >= current[0], model.day <= current[1]), 'current'),
+                  else_='comparison').label('period')
+    keys = [period] + ([dimension] if dimension is not None else [])
+    query = db.session.query(*keys, *columns).filter(
+        or_(model.day.between(*current), model.day.between(*comparison))
+    )
+    if supplier_id:
+        query = query.filter(model.supplier_id == supplier_id)
+    return query, keys
+
+
+def build_comparison_report(date_from, date_to, against='previous', supplier_id=None):
+    """Current vs comparison period totals, breakdowns and aligned daily series.
+
+    Each dimension (day, supplier, payment method, product type) is one
+    grouped rollup query covering both periods, so a comparison costs about
+    as much as the base report. Raises ValueError from comparison_range().
+    """
+    current = (date_from, date_to)
+    comparison = comparison_range(date_from, date_to, against)
+
+    query, keys = _grouped_by_period(
+        DailySalesRollup, current, comparison, supplier_id,
+        func.sum(DailySalesRollup.total_amount), func.sum(DailySalesRollup.sale_count),
+        dimension=DailySalesRollup.day
+    )
+    daily = {}
+    totals = {'current': [0, 0.0], 'comparison': [0, 0.0]}
+    for period, day, amount, count in query.group_by(*keys).all():
+        start = current[0] if period == 'current' else comparison[0]
+        daily.setdefault((day - start).days, {})[period] = float(amount or 0)
+        totals[period][0] += int(count or 0)
+        totals[period][1] += float(amount or 0)
+
+    query, keys = _grouped_by_period(
+        DailySalesRollup, current, comparison, supplier_id,
+        func.sum(DailySalesRollup.total_amount), dimension=Supplier.name
+    )
+    by_supplier = _compared(query.join(Supplier, DailySalesRollup.supplier_id == Supplier.id).group_by(*keys).all())
+
+    query, keys = _grouped_by_period(
+        DailySalesRollup, current, comparison, supplier_id,
+        func.sum(DailySalesRollup.total_amount), dimension=DailySalesRollup.payment_method
+    )
+    by_payment_method = _compared(query.group_by(*keys).all())
+
+    query, keys = _grouped_by_period(
+        DailyProductRollup, current, comparison, supplier_id,
+        func.sum(DailyProductRollup.total_amount), dimension=DailyProductRollup.category
+    )
+    by_product_type = _compared(
+        (period, product_type(category), amount) for period, category, amount in query.group_by(*keys).all()
+    )
+    for name in PRODUCT_TYPES:
+        by_product_type.setdefault(name, {'current': 0.0, 'comparison': 0.0, 'change': None})
+
+    def summary(period):
+        count, revenue = totals[period]
+        return {'total_sales': count, 'total_revenue': revenue,
+                'average_sale': revenue / count if count > 0 else 0}
+
+    days = max((date_to - date_from).days, (comparison[1] - comparison[0]).days) + 1
+    return {
+        'against': against,
+        'current': {'date_from': date_from.isoformat(), 'date_to': date_to.isoformat(), **summary('current')},
+        'comparison': {'date_from': comparison[0].isoformat(), 'date_to': comparison[1].isoformat(),
+                       **summary('comparison')},
+        'revenue_change': _change(totals['current'][1], totals['comparison'][1]),
+        'sales_change': _change(totals['current'][0], totals['comparison'][0]),
+        'sales_by_supplier': by_supplier,
+        'sales_by_payment_method': by_payment_method,
+        'sales_by_product_type': {name: by_product_type[name] for name in PRODUCT_TYPES},
+        'daily_sales': [{
+            'offset': offset,
+            'current_date': (date_from + timedelta(days=offset)).isoformat(),
+            'comparison_date': (comparison[0] + timedelta(days=offset)).isoformat(),
+            'current': daily.get(offset, {}).get('current', 0.0),
+            'comparison': daily.get(offset, {}).get('comparison', 0.0),
+        } for offset in range(days)],
+    }
+
+
+def accessory_bucket(interval):
+    """SQL expression for the first day of the day/week a daily accessory entry falls in."""
+    if interval == 'week':
+        # Step back to the Monday on or before the entry
+        return func.date(AccessorySale.sale_date, '-6 days', 'weekday 1')
+    return func.date(AccessorySale.sale_date)
+
+
+def accessory_sales_report(date_from, date_to, interval='day'):
+    """Per-item quantity/amount totals and a per-day or per-week series.
+
+    A single grouped query sums all item columns per bucket; the range totals
+    are added up from the buckets.
+    """
+    bucket = accessory_bucket(interval).label('bucket')
+    sums = []
+    for item in ACCESSORY_ITEMS:
+        sums.append(func.coalesce(func.sum(getattr(AccessorySale, f'{item}_quantity')), 0))
+        sums.append(func.coalesce(func.sum(getattr(AccessorySale, f'{item}_total')), 0))
+
+    start, end = day_bounds(date_from, date_to)
+    rows = db.session.query(bucket, func.count(AccessorySale.id), *sums).filter(
+        AccessorySale.sale_date >= start, AccessorySale.sale_date < end
+    ).group_by(bucket).order_by(bucket).all()
+
+    totals = {item: {'qty': 0, 'amount': 0.0} for item in ACCESSORY_ITEMS}
+    series = []
+    record_count = 0
+    for day, count, *values in rows:
+        items = {}
+        for index, item in enumerate(ACCESSORY_ITEMS):
+            qty, amount = int(values[2 * index]), float(values[2 * index + 1])
+            items[item] = {'qty': qty, 'amount': amount}
+            totals[item]['qty'] += qty
+            totals[item]['amount'] += amount
+        record_count += count
+        series.append({
+            'date': day,
+            'records': count,
+            'quantity': sum(entry['qty'] for entry in items.values()),
+            'amount': sum(entry['amount'] for entry in items.values()),
+            'items': items,
+        })
+
+    return {
+        'date_from': date_from.isoformat(),
+        'date_to': date_to.isoformat(),
+        'interval': interval,
+        'record_count': record_count,
+        'total_quantity': sum(entry['qty'] for entry in totals.values()),
+        'total_amount': sum(entry['amount'] for entry in totals.values()),
+        'totals': totals,
+        'series': series,
+    }
+
+
+def build_dashboard():
+    """Dashboard totals and the ten most recent sales."""
+    total_sales, total_paid = db.session.query(
+        func.coalesce(func.sum(Sale.total_amount), 0),
+        func.coalesce(func.sum(Sale.amount_paid), 0)
+    ).one()
+    total_clients = db.session.query(func.count(Client.id)).scalar() or 0
+    recent_sales = with_sale_relationships(Sale.query).order_by(Sale.created_at.desc()).limit(10).all()
+
+    return {
+        'stats': {
+            'total_sales': float(total_sales),
+            'total_clients': total_clients,
+            'total_paid': float(total_paid),
+            'pending_balance': float(total_sales - total_paid)
+        },
+        'recent_sales': [serialize_sale(sale, RECENT_SALE_FIELDS) for sale in recent_sales]
+    }
@@ -0,0 +1,112 @@
+"""
+Incrementally maintained daily rollups for sales reports.
+Author: Llakterian
+"""
+
+from app.cache import bump_sale_days, bump_version
+from app.models import db, Product, Sale, SaleItem, DailySalesRollup, DailyProductRollup
+from datetime import datetime
+from sqlalchemy import func, select, insert, update, delete
+
+
+def _increment(model, keys, **deltas):
+    """Add deltas to the rollup row identified by keys, creating it when missing."""
+    conditions = [getattr(model, name) == value for name, value in keys.items()]
+    values = {getattr(model, name): getattr(model, name) + delta for name, delta in deltas.items()}
+    result = db.session.execute(
+        update(model).where(*conditions).values(values).execution_options(synchronize_session=False)
+    )
+    if result.rowcount == 0:
+        db.session.add(model(**keys, **deltas))
+        db.session.flush()
+
+
+def _sale_keys(sale):
+    """Rollup key for a sale's day, supplier and payment method."""
+    sale_date = sale.sale_date or datetime.utcnow()
+    return {
+        'day': sale_date.date(),
+        'supplier_id': sale.supplier_id,
+        'payment_method': sale.payment_method,
+    }
+
+
+def record_sale(sale, items):
+    """Add a new sale to the rollups.
+
+    ``items`` is an iterable of ``(category, quantity, subtotal)`` tuples.
+    Must be called inside the transaction that inserts the sale.
+    """
+    record_sales([(sale, items)])
+
+
+def record_sales(entries):
+    """Add a batch of new sales to the rollups with one write per rollup row.
+
+    ``entries`` is an iterable of ``(sale, items)`` pairs as for record_sale().
+    """
+    sales_deltas = {}
+    product_deltas = {}
+    for sale, items in entries:
+        keys = _sale_keys(sale)
+        sale_key = tuple(keys.items())
+        count, total, paid = sales_deltas.get(sale_key, (0, 0.0, 0.0))
+        sales_deltas[sale_key] = (
+            count + 1,
+            total + float(sale.total_amount),
+            paid + float(sale.amount_paid or 0)
+        )
+        for category, quantity, subtotal in items:
+            product_keys = (('day', keys['day']), ('supplier_id', sale.supplier_id), ('category', category))
+            qty, amount = product_deltas.get(product_keys, (0, 0.0))
+            product_deltas[product_keys] = (qty + quantity, amount + float(subtotal))
+
+    for keys, (count, total, paid) in sales_deltas.items():
+        _increment(DailySalesRollup, dict(keys), sale_count=count, total_amount=total, amount_paid=paid)
+    for keys, (quantity, amount) in product_deltas.items():
+        _increment(DailyProductRollup, dict(keys), quantity=quantity, total_amount=amount)
+    bump_sale_days(*{dict(keys)['day'] for keys in sales_deltas})
+
+
+def record_payment(sale, amount):
+    """Add a later payment against a sale to its day's rollup."""
+    keys = _sale_keys(sale)
+    _increment(DailySalesRollup, keys, amount_paid=float(amount))
+    bump_sale_days(keys['day'])
+
+
+def rebuild_rollups():
+    """Recompute every rollup row from the raw sales tables.
+
+    Returns the number of sales and product rollup rows written.
+    """
+    db.session.execute(delete(DailySalesRollup))
+    db.session.execute(delete(DailyProductRollup))
+
+    day = func.date(Sale.sale_date)
+    db.session.execute(insert(DailySalesRollup).from_select(
+        ['day', 'supplier_id', 'payment_method', 'sale_count', 'total_amount', 'amount_paid'],
+        select(
+            day, Sale.supplier_id, Sale.payment_method,
+            func.count(Sale.id),
+            func.sum(Sale.total_amount),
+            func.coalesce(func.sum(Sale.amount_paid), 0)
+        ).group_by(day, Sale.supplier_id, Sale.payment_method)
+    ))
+    db.session.execute(insert(DailyProductRollup).from_select(
+        ['day', 'supplier_id', 'category', 'quantity', 'total_amount'],
+        select(
+            day, Sale.supplier_id, Product.category,
+            func.coalesce(func.sum(SaleItem.quantity), 0),
+            func.sum(SaleItem.subtotal)
+        ).select_from(SaleItem).join(Sale, SaleItem.sale_id == Sale.id).join(
+            Product, SaleItem.product_id == Product.id
+        ).group_by(day, Sale.supplier_id, Product.category)
+    ))
+    # Every cached report may have changed
+    bump_version('rollups')
+    db.session.commit()
+
+    sales_rows = db.session.query(func.count(DailySalesRollup.id)).scalar()
+    product_rows = db.session.query(func.count(DailyProductRollup.id)).scalar()
+    return sales_rows, product_rows
@@ -3,10 +3,31 @@ Routes and views for Bontez Suppliers.
 Author: Llakterian
 """
 
-from flask import Blueprint, render_template, request, jsonify, redirect, url_for, flash
-from app.models import db, Client, Supplier, Product, Sale, SaleItem, Installment, AccessorySale
+from flask import (Blueprint, Response, abort, current_app, render_template, request, jsonify, redirect, url_for, flash,
+                   stream_with_context)
+from app.models import db, Client, Supplier, Product, Sale, SaleItem, Installment, AccessorySale, ReportJob
+from app.cache import bump_version, conditional_get, dashboard_cache, report_cache, get_catalog, get_client_options
+from app.export import iter_export_rows, stream_csv, stream_ndjson, EXPORTS, EXPORT_FORMATS
+from app.importer import IMPORT_KINDS
+from app.ingest import ingest_pending_sales, MAX_BULK_SALES
+from app.jobs import enqueue_job, job_payload
+from app.reports import (build_sales_report, build_dashboard, supplier_breakdown, sale_filters, day_bounds,
+                         sales_report_ranges, accessory_sales_report, ACCESSORY_INTERVALS,
+                         build_comparison_report, comparison_range)
+from app.receivables import allocate_payment, receivables_aging, due_installments_page
+from app.rollups import record_sale, record_payment
+from app.search import search_clients, SEARCH_LIMIT, MAX_SEARCH_LIMIT
+from app.sync import changes_since, SYNC_PAGE_SIZE, MAX_SYNC_PAGE_SIZE
+from app.pagination import keyset_page, offset_page
+from app.serializers import (parse_fields, select_fields, select_sales, rows_to_dicts, sale_rows_to_dicts,
+                             with_sale_relationships, CLIENT_FIELDS, SUPPLIER_FIELDS, PRODUCT_FIELDS,
+                             SALE_LIST_FIELDS)
 from datetime import datetime, timedelta
-from sqlalchemy import func, extract
+from sqlalchemy import func, extract, insert
+from sqlalchemy.exc import IntegrityError
+import hmac
+import os
+import uuid
 
 main_bp = Blueprint('main', __name__)
 clients_bp = Blueprint('clients', __name__, url_prefix='/api/clients')
@@ -15,64 +36,58 @@ sales_bp = Blueprint('sales', __name__, url_prefix='/api/sales')
 reports_bp = Blueprint('reports', __name__, url_prefix='/api/reports')
 products_bp = Blueprint('products', __name__, url_prefix='/api/products')
 accessories_bp = Blueprint('accessories', __name__, url_prefix='/accessories')
+export_bp = Blueprint('export', __name__, url_prefix='/api/export')
+receivables_bp = Blueprint('receivables', __name__, url_prefix='/api/receivables')
+import_bp = Blueprint('import', __name__, url_prefix='/api/import')
+metrics_bp = Blueprint('metrics', __name__, url_prefix='/api')
+
+
+DASHBOARD_SCOPES = ('sales', 'clients')
+
+
+def get_dashboard_data():
+    """Dashboard payload, recomputed only after a sale, client or payment write."""
+    return dashboard_cache.get_or_compute('dashboard', DASHBOARD_SCOPES, build_dashboard)
 
 
 @main_bp.route('/')
 def index():
-    """Dashboard homepage."""
-    total_sales = db.session.query(func.sum(Sale.total_amount)).scalar() or 0
-    total_clients = db.session.query(func.count(Client.id)).scalar() or 0
-    total_paid = db.session.query(func.sum(Sale.amount_paid)).scalar() or 0
-    pending_balance = total_sales - total_paid
-    
-    recent_sales = Sale.query.order_by(Sale.created_at.desc()).limit(10).all()
+    """Dashboard homepage, rendered from the cached dashboard payload."""
+    dashboard = get_dashboard_data()
+    stats = dashboard['stats']
+    # Cached sales are JSON ready; the template formats sale_date itself
+    recent_sales = [dict(sale, sale_date=datetime.fromisoformat(sale['sale_date']))
+                    for sale in dashboard['recent_sales']]
     
     return render_template('index.html', 
-                         total_sales=total_sales,
-                         total_clients=total_clients,
-                         total_paid=total_paid,
-                         pending_balance=pending_balance,
+                         total_sales=stats['total_sales'],
+                         total_clients=stats['total_clients'],
+                         total_paid=stats['total_paid'],
+                         pending_balance=stats['pending_balance'],
                          recent_sales=recent_sales)
 
 
 @main_bp.route('/api/dashboard')
+@conditional_get('sales', 'clients', 'suppliers', 'rollups')
 def dashboard_api():
     """API endpoint for dashboard data."""
-    total_sales = db.session.query(func.sum(Sale.total_amount)).scalar() or 0
-    total_clients = db.session.query(func.count(Client.id)).scalar() or 0
-    total_paid = db.session.query(func.sum(Sale.amount_paid)).scalar() or 0
-    pending_balance = total_sales - total_paid
-    
-    recent_sales = Sale.query.order_by(Sale.created_at.desc()).limit(10).all()
+    return jsonify(get_dashboard_data())
+
+
+@main_bp.route('/api/sync')
+def sync_changes():
+    """Suppliers, products, clients, sales, sale items and installments changed since ?since=<cursor>.
     
-    return jsonify({
-        'stats': {
-            'total_sales': float(total_sales),
-            'total_clients': total_clients,
-            'total_paid': float(total_paid),
-            'pending_balance': float(pending_balance)
-        },
-        'recent_sales': [{
-            'id': sale.id,
-            'client_id': sale.client_id,
-            'supplier_id': sale.supplier_id,
-            'payment_method': sale.payment_method,
-            'total_amount': float(sale.total_amount),
-            'amount_paid': float(sale.amount_paid),
-            'created_at': sale.created_at.isoformat() if sale.created_at else None,
-            'sale_date': sale.sale_date.isoformat() if sale.sale_date else None,
-            'client': {
-                'id': sale.client.id,
-                'name': sale.client.name,
-                'phone': sale.client.phone
-            } if sale.client else None,
-            'supplier': {
-                'id': sale.supplier.id,
-                'name': sale.supplier.name,
-                'color': sale.supplier.color
-            } if sale.supplier else None
-        } for sale in recent_sales]
-    })
+    Omit ``since`` on the first sync to get every row, then store
+    ``next_cursor`` and keep requesting while ``has_more`` is true.
+    """
+    if db.engine.dialect.name != 'sqlite':
+        return jsonify({'error': 'Delta sync needs the SQLite change log triggers'}), 501
+    limit = max(1, min(request.args.get('limit', SYNC_PAGE_SIZE, type=int), MAX_SYNC_PAGE_SIZE))
+    try:
+        return jsonify(changes_since(request.args.get('since'), limit))
+    except ValueError:
+        return jsonify({'error': 'Invalid cursor'}), 400
 
 
 @clients_bp.route('/')
@@ -83,16 +98,30 @@ def list_clients():
     
     # Check if request wants JSON
     if request.accept_mimetypes.accept_json and not request.accept_mimetypes.accept_html:
-        clients = Client.query.paginate(page=page, per_page=limit, error_out=False)
+        try:
+            fields = parse_fields(request.args.get('fields'), CLIENT_FIELDS)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        stmt = select_fields(Client, fields)
+        
+        # Cursor mode: ?after=<cursor> (empty for the first page) seeks by id
+        after = request.args.get('after')
+        if after is not None:
+            try:
+                result = keyset_page(stmt, (Client.id,), limit, after)
+            except ValueError:
+                return jsonify({'error': 'Invalid cursor'}), 400
+            payload = {
+                'clients': rows_to_dicts(result.items, fields),
+                'next_cursor': result.next_cursor
+            }
+            if request.args.get('total', 0, type=int):
+                payload['total'] = db.session.query(func.count(Client.id)).scalar()
+            return jsonify(payload)
+        
+        clients = offset_page(stmt.order_by(Client.id), page, limit)
         return jsonify({
-            'clients': [{
-                'id': c.id,
-                'name': c.name,
-                'phone': c.phone,
-                'email': c.email,
-                'address': c.address,
-                'created_at': c.created_at.isoformat() if c.created_at else None
-            } for c in clients.items],
+            'clients': rows_to_dicts(clients.items, fields),
             'total': clients.total,
             'page': clients.page,
             'pages': clients.pages
@@ -103,6 +132,22 @@ def list_clients():
     return render_template('clients/list.html', clients=clients)
 
 
+@clients_bp.route('/search')
+def search_clients_api():
+    """Typeahead lookup of clients by name, address or phone: ?q=...&limit=10.
+    
+    Phone numbers match with or without the 0 / +254 prefix and spacing.
+    """
+    try:
+        fields = parse_fields(request.args.get('fields'), CLIENT_FIELDS)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    limit = max(1, min(request.args.get('limit', SEARCH_LIMIT, type=int), MAX_SEARCH_LIMIT))
+    
+    rows = search_clients(request.args.get('q', ''), [getattr(Client, field) for field in fields], limit)
+    return jsonify({'clients': rows_to_dicts(rows, fields)})
+
+
 @clients_bp.route('/create', methods=['GET', 'POST'])
 def create_client():
     """Create a new client."""
@@ -118,6 +163,7 @@ def create_client():
         
         client = Client(name=name, phone=phone, email=email, address=address)
         db.session.add(client)
+        bump_version('clients')
         db.session.commit()
         flash(f'Client {name} created successfully', 'success')
         return redirect(url_for('clients.list_clients'))
@@ -129,24 +175,22 @@ def create_client():
 def view_client(client_id):
     """View client details and sales history."""
     client = Client.query.get_or_404(client_id)
-    sales = Sale.query.filter_by(client_id=client_id).order_by(Sale.created_at.desc()).all()
+    sales = with_sale_relationships(Sale.query.filter_by(client_id=client_id)).order_by(Sale.created_at.desc()).all()
     return render_template('clients/view.html', client=client, sales=sales)
 
 
 @suppliers_bp.route('/')
+@conditional_get('suppliers')
 def list_suppliers():
     """API endpoint for listing suppliers."""
     # Check if request wants JSON
     if request.accept_mimetypes.accept_json and not request.accept_mimetypes.accept_html:
-        suppliers = Supplier.query.all()
-        return jsonify({
-            'suppliers': [{
-                'id': s.id,
-                'name': s.name,
-                'color': s.color,
-                'created_at': s.created_at.isoformat() if s.created_at else None
-            } for s in suppliers]
-        })
+        try:
+            fields = parse_fields(request.args.get('fields'), SUPPLIER_FIELDS)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        rows = db.session.execute(select_fields(Supplier, fields).order_by(Supplier.id))
+        return jsonify({'suppliers': rows_to_dicts(rows, fields)})
     
     # Default HTML response
     suppliers = Supplier.query.all()
@@ -162,6 +206,7 @@ def create_supplier():
         
         supplier = Supplier(name=name, color=color)
         db.session.add(supplier)
+        bump_version('suppliers')
         db.session.commit()
         flash(f'Supplier {name} created successfully', 'success')
         return redirect(url_for('suppliers.list_suppliers'))
@@ -175,23 +220,16 @@ def create_supplier():
 def list_products():
     """API endpoint for listing products."""
     supplier_id = request.args.get('supplier_id', type=int)
+    try:
+        fields = parse_fields(request.args.get('fields'), PRODUCT_FIELDS)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
-    query = Product.query
+    stmt = select_fields(Product, fields).order_by(Product.id)
     if supplier_id:
-        query = query.filter_by(supplier_id=supplier_id)
+        stmt = stmt.where(Product.supplier_id == supplier_id)
     
-    products = query.all()
-    return jsonify({
-        'products': [{
-            'id': p.id,
-            'name': p.name,
-            'supplier_id': p.supplier_id,
-            'category': p.category,
-            'price': float(p.price),
-            'description': p.description,
-            'created_at': p.created_at.isoformat() if p.created_at else None
-        } for p in products]
-    })
+    return jsonify({'products': rows_to_dicts(db.session.execute(stmt), fields)})
 
 
 # ============= SALES ROUTES =============
@@ -204,37 +242,37 @@ def list_sales():
     
     # Check if request wants JSON
     if request.accept_mimetypes.accept_json and not request.accept_mimetypes.accept_html:
-        sales = Sale.query.paginate(page=page, per_page=limit, error_out=False)
+        try:
+            fields = parse_fields(request.args.get('fields'), SALE_LIST_FIELDS)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        stmt = select_sales(fields)
+        
+        # Cursor mode: ?after=<cursor> (empty for the first page) walks newest first
+        after = request.args.get('after')
+        if after is not None:
+            try:
+                result = keyset_page(stmt, (Sale.sale_date, Sale.id), limit, after, descending=True)
+            except ValueError:
+                return jsonify({'error': 'Invalid cursor'}), 400
+            payload = {
+                'sales': sale_rows_to_dicts(result.items, fields),
+                'next_cursor': result.next_cursor
+            }
+            if request.args.get('total', 0, type=int):
+                payload['total'] = db.session.query(func.count(Sale.id)).scalar()
+            return jsonify(payload)
+        
+        sales = offset_page(stmt.order_by(Sale.id), page, limit)
         return jsonify({
-            'sales': [{
-                'id': s.id,
-                'client_id': s.client_id,
-                'supplier_id': s.supplier_id,
-                'payment_method': s.payment_method,
-                'mpesa_code': s.mpesa_code,
-                'total_amount': float(s.total_amount),
-                'amount_paid': float(s.amount_paid),
-                'notes': s.notes,
-                'created_at': s.created_at.isoformat() if s.created_at else None,
-                'sale_date': s.sale_date.isoformat() if s.sale_date else None,
-                'client': {
-                    'id': s.client.id,
-                    'name': s.client.name,
-                    'phone': s.client.phone
-                } if s.client else None,
-                'supplier': {
-                    'id': s.supplier.id,
-                    'name': s.supplier.name,
-                    'color': s.supplier.color
-                } if s.supplier else None
-            } for s in sales.items],
+            'sales': sale_rows_to_dicts(sales.items, fields),
             'total': sales.total,
             'page': sales.page,
             'pages': sales.pages
         })
     
     # Default HTML response
-    sales = Sale.query.paginate(page=page, per_page=20)
+    sales = with_sale_relationships(Sale.query).paginate(page=page, per_page=20)
     return render_template('sales/list.html', sales=sales)
 
 
@@ -256,13 +294,30 @@ def create_sale():
         total_amount = 0.0
         sale_items = []
         
+        lines = []
         for product_id, qty in zip(items_data, items_qty):
-            if product_id and qty:
-                product = Product.query.get_or_404(product_id)
-                quantity = int(qty)
-                subtotal = product.price * quantity
-                total_amount += subtotal
-                sale_items.append({'product': product, 'quantity': quantity, 'subtotal': subtotal})
+            if not (product_id and qty):
+                continue
+            try:
+                product_id, quantity = int(product_id), int(qty)
+            except ValueError:
+                flash('Invalid item', 'error')
+                return redirect(url_for('sales.create_sale'))
+            # Empty or negative lines are left out, as blank form rows are
+            if quantity > 0:
+                lines.append((product_id, quantity))
+        
+        # Price every line from a single IN query, whatever the basket size
+        product_ids = {product_id for product_id, _ in lines}
+        products = {p.id: p for p in Product.query.filter(Product.id.in_(product_ids)).all()} if product_ids else {}
+        
+        for product_id, quantity in lines:
+            product = products.get(product_id)
+            if product is None:
+                abort(404)
+            subtotal = product.price * quantity
+            total_amount += subtotal
+            sale_items.append({'product': product, 'quantity': quantity, 'subtotal': subtotal})
         
         if not sale_items:
             flash('Sale must have at least one item', 'error')
@@ -285,15 +340,20 @@ def create_sale():
         db.session.add(sale)
         db.session.flush()
         
-        for item_data in sale_items:
-            sale_item = SaleItem(
-                sale_id=sale.id,
-                product_id=item_data['product'].id,
-                quantity=item_data['quantity'],
-                unit_price=item_data['product'].price,
-                subtotal=item_data['subtotal']
-            )
-            db.session.add(sale_item)
+        # One multi-row INSERT for the whole basket
+        db.session.execute(insert(SaleItem), [{
+            'sale_id': sale.id,
+            'product_id': item_data['product'].id,
+            'quantity': item_data['quantity'],
+            'unit_price': item_data['product'].price,
+            'subtotal': item_data['subtotal']
+        } for item_data in sale_items])
+        
+        bump_version('sales')
+        record_sale(sale, [
+            (item_data['product'].category, item_data['quantity'], item_data['subtotal'])
+            for item_data in sale_items
+        ])
         
         if payment_method == 'installment':
             num_installments = request.form.get('num_installments', 3, type=int)
@@ -311,11 +371,39 @@ def create_sale():
         flash(f'Sale created successfully for {client.name}', 'success')
         return redirect(url_for('sales.list_sales'))
     
-    clients = Client.query.all()
-    suppliers = Supplier.query.all()
-    products = Product.query.all()
+    catalog = get_catalog()
     
-    return render_template('sales/create.html', clients=clients, suppliers=suppliers, products=products)
+    return render_template('sales/create.html', clients=get_client_options(),
+                           suppliers=catalog.suppliers, products=catalog.products)
+
+
+@sales_bp.route('/bulk', methods=['POST'])
+def bulk_create_sales():
+    """Replay a batch of offline PWA sales in one round trip.
+    
+    Expects ``{"sales": [PendingSale, ...]}``. Each sale's client-generated id
+    is recorded, so resending the same batch after a dropped response is safe.
+    """
+    payload = request.get_json(silent=True)
+    pending = payload.get('sales') if isinstance(payload, dict) else None
+    if not isinstance(pending, list):
+        return jsonify({'error': 'Expected a JSON body with a list of sales'}), 400
+    if len(pending) > MAX_BULK_SALES:
+        return jsonify({'error': f'At most {MAX_BULK_SALES} sales per request'}), 413
+    
+    try:
+        results = ingest_pending_sales(pending)
+    except IntegrityError:
+        # Another request is syncing the same sales; a retry will see them as duplicates
+        db.session.rollback()
+        return jsonify({'error': 'Sync conflict, please retry'}), 409
+    
+    return jsonify({
+        'results': results,
+        'created': sum(1 for r in results if r['status'] == 'created'),
+        'duplicates': sum(1 for r in results if r['status'] == 'duplicate'),
+        'errors': sum(1 for r in results if r['status'] == 'error')
+    })
 
 
 @sales_bp.route('/<int:sale_id>')
@@ -331,39 +419,35 @@ def daily_report():
     date_str = request.args.get('date', datetime.utcnow().strftime('%Y-%m-%d'))
     report_date = datetime.strptime(date_str, '%Y-%m-%d')
     
-    sales = Sale.query.filter(
-        func.date(Sale.sale_date) == report_date.date()
+    sales = with_sale_relationships(Sale.query).filter(
+        *sale_filters(report_date.date(), report_date.date())
     ).all()
     
     return render_template('reports/daily.html', sales=sales, report_date=report_date)
 
 
 @reports_bp.route('/daily-data')
+@conditional_get('sales', 'suppliers', 'rollups')
 def daily_data():
     """API endpoint for daily sales data (for charts)."""
     date_str = request.args.get('date', datetime.utcnow().strftime('%Y-%m-%d'))
-    report_date = datetime.strptime(date_str, '%Y-%m-%d')
-    
-    sales = Sale.query.filter(
-        func.date(Sale.sale_date) == report_date.date()
-    ).all()
-    
-    supplier_sales = {}
-    for sale in sales:
-        supplier_name = sale.supplier.name if sale.supplier else 'Mixed Gas'
-        if supplier_name not in supplier_sales:
-            supplier_sales[supplier_name] = 0
-        supplier_sales[supplier_name] += sale.total_amount
-    
-    suppliers_all = Supplier.query.all()
-    color_map = {s.name: s.color for s in suppliers_all}
-    color_map['Mixed Gas'] = 'purple'
+    report_date = datetime.strptime(date_str, '%Y-%m-%d').date()
     
-    labels = list(supplier_sales.keys())
-    data = list(supplier_sales.values())
-    colors = [color_map.get(label, 'gray') for label in labels]
+    def build():
+        labels = []
+        data = []
+        colors = []
+        for name, color, total in supplier_breakdown(report_date, report_date):
+            if name is None:
+                labels.append('Mixed Gas')
+                colors.append('purple')
+            else:
+                labels.append(name)
+                colors.append(color or 'gray')
+            data.append(total)
+        return {'labels': labels, 'data': data, 'colors': colors}
     
-    return jsonify({'labels': labels, 'data': data, 'colors': colors})
+    return jsonify(report_cache.get_or_compute(('daily', report_date), [(report_date, report_date)], build))
 
 
 @reports_bp.route('/monthly')
@@ -386,32 +470,29 @@ def monthly_data():
         end_date = datetime(year + 1, 1, 1)
     else:
         end_date = datetime(year, month + 1, 1)
-    
-    sales = Sale.query.filter(Sale.sale_date >= start_date, Sale.sale_date < end_date).all()
-    
-    supplier_data = {}
-    labels = []
-    colors = []
-    
-    for sale in sales:
-        if sale.supplier:
-            supplier_name = sale.supplier.name
-            if supplier_name not in supplier_data:
-                supplier_data[supplier_name] = 0
-                labels.append(supplier_name)
-                colors.append(sale.supplier.color or '#6b7280')
-            supplier_data[supplier_name] += float(sale.total_amount)
-    
-    data = [supplier_data.get(label, 0) for label in labels]
-    
-    return jsonify({
-        'labels': labels,
-        'data': data,
-        'colors': colors
-    })
+    month_range = (start_date.date(), (end_date - timedelta(days=1)).date())
+    
+    def build():
+        labels = []
+        data = []
+        colors = []
+        for name, color, total in supplier_breakdown(*month_range):
+            if name is None:
+                continue
+            labels.append(name)
+            data.append(total)
+            colors.append(color or '#6b7280')
+        return {
+            'labels': labels,
+            'data': data,
+            'colors': colors
+        }
+    
+    return jsonify(report_cache.get_or_compute(('monthly', year, month), [month_range], build))
 
 
 @reports_bp.route('/sales')
+@conditional_get('sales', 'clients', 'suppliers', 'products', 'rollups')
 def sales_report():
     """Enhanced API endpoint for comprehensive sales reports."""
     date_from_str = request.args.get('date_from')
@@ -429,105 +510,100 @@ def sales_report():
     else:
         date_from = datetime.strptime(date_from_str, '%Y-%m-%d').date()
     
-    # Build query
-    query = Sale.query.filter(
-        Sale.sale_date >= date_from,
-        Sale.sale_date <= date_to
-    )
+    return jsonify(report_cache.get_or_compute(
+        ('sales', date_from, date_to, supplier_id),
+        sales_report_ranges(date_from, date_to),
+        lambda: build_sales_report(date_from, date_to, supplier_id)
+    ))
+
+
+@reports_bp.route('/compare')
+@conditional_get('sales', 'suppliers', 'products', 'rollups')
+def compare_report():
+    """Compare a date range with the previous period or the same period last year.
     
-    if supplier_id:
-        query = query.filter(Sale.supplier_id == supplier_id)
+    Query params: date_from, date_to (default: last 30 days), window (N: the
+    N days ending date_to, overriding date_from), against (previous|last_year),
+    supplier_id.
+    """
+    date_from_str = request.args.get('date_from')
+    date_to_str = request.args.get('date_to')
+    window = request.args.get('window', type=int)
+    against = request.args.get('against', 'previous')
+    supplier_id = request.args.get('supplier_id', type=int)
+    
+    try:
+        date_to = datetime.strptime(date_to_str, '%Y-%m-%d').date() if date_to_str else datetime.utcnow().date()
+        date_from = datetime.strptime(date_from_str, '%Y-%m-%d').date() if date_from_str else date_to - timedelta(days=30)
+    except ValueError:
+        return jsonify({'error': 'Dates must be YYYY-MM-DD'}), 400
+    if window is not None:
+        if window < 1:
+            return jsonify({'error': 'window must be a positive number of days'}), 400
+        date_from = date_to - timedelta(days=window - 1)
+    if date_from > date_to:
+        return jsonify({'error': 'date_from must not be after date_to'}), 400
+    
+    try:
+        comparison = comparison_range(date_from, date_to, against)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return jsonify(report_cache.get_or_compute(
+        ('compare', date_from, date_to, against, supplier_id),
+        [(date_from, date_to), comparison],
+        lambda: build_comparison_report(date_from, date_to, against, supplier_id)
+    ))
+
+
+@reports_bp.route('/accessories')
+@conditional_get('accessories')
+def accessories_data():
+    """Accessory totals per item with a per-day or per-week series over any date range."""
+    interval = request.args.get('interval', 'day')
+    if interval not in ACCESSORY_INTERVALS:
+        return jsonify({'error': f'interval must be one of {", ".join(ACCESSORY_INTERVALS)}'}), 400
     
-    sales = query.all()
+    date_from_str = request.args.get('date_from')
+    date_to_str = request.args.get('date_to')
+    try:
+        date_to = datetime.strptime(date_to_str, '%Y-%m-%d').date() if date_to_str else datetime.utcnow().date()
+        date_from = datetime.strptime(date_from_str, '%Y-%m-%d').date() if date_from_str else date_to - timedelta(days=30)
+    except ValueError:
+        return jsonify({'error': 'Dates must be YYYY-MM-DD'}), 400
+    if date_from > date_to:
+        return jsonify({'error': 'date_from must not be after date_to'}), 400
     
-    # Calculate metrics
-    total_sales = len(sales)
-    total_revenue = sum(float(sale.total_amount) for sale in sales)
-    average_sale = total_revenue / total_sales if total_sales > 0 else 0
+    return jsonify(accessory_sales_report(date_from, date_to, interval))
+
+
+@reports_bp.route('/jobs', methods=['POST'])
+def submit_report_job():
+    """Queue a report for the background worker.
     
-    # YoY Growth calculation
+    Body: {"kind": "sales" | "accessories" | "aging", "params": {...}, "priority": 0}.
+    Poll the returned URL until status is "done".
+    """
+    body = request.get_json(silent=True) or {}
     try:
-        last_year_from = date_from.replace(year=date_from.year - 1)
-        last_year_to = date_to.replace(year=date_to.year - 1)
-        last_year_sales = Sale.query.filter(
-            Sale.sale_date >= last_year_from,
-            Sale.sale_date <= last_year_to
-        ).all()
-        last_year_revenue = sum(float(sale.total_amount) for sale in last_year_sales)
-        yoy_growth = ((total_revenue - last_year_revenue) / last_year_revenue * 100) if last_year_revenue > 0 else 0
-    except:
-        yoy_growth = 0
-    
-    # Sales by supplier
-    sales_by_supplier = {}
-    for sale in sales:
-        if sale.supplier:
-            supplier_name = sale.supplier.name
-            sales_by_supplier[supplier_name] = sales_by_supplier.get(supplier_name, 0) + float(sale.total_amount)
-    
-    # Sales by payment method
-    sales_by_payment_method = {}
-    for sale in sales:
-        method = sale.payment_method
-        sales_by_payment_method[method] = sales_by_payment_method.get(method, 0) + float(sale.total_amount)
-    
-    # Sales by product type
-    sales_by_product_type = {
-        '6Kg New': 0, '6Kg Refill': 0, '12Kg New': 0, '12Kg Refill': 0, 'Accessories': 0
-    }
-    
-    for sale in sales:
-        for item in sale.items:
-            if item.product:
-                product_name = item.product.name.lower()
-                if '6kg' in product_name and 'new' in product_name:
-                    sales_by_product_type['6Kg New'] += float(item.subtotal)
-                elif '6kg' in product_name:
-                    sales_by_product_type['6Kg Refill'] += float(item.subtotal)
-                elif '12kg' in product_name and 'new' in product_name:
-                    sales_by_product_type['12Kg New'] += float(item.subtotal)
-                elif '12kg' in product_name:
-                    sales_by_product_type['12Kg Refill'] += float(item.subtotal)
-                else:
-                    sales_by_product_type['Accessories'] += float(item.subtotal)
-    
-    # Daily sales trend
-    daily_sales = {}
-    for sale in sales:
-        date_key = sale.sale_date.isoformat()
-        if date_key not in daily_sales:
-            daily_sales[date_key] = {'amount': 0, 'count': 0}
-        daily_sales[date_key]['amount'] += float(sale.total_amount)
-        daily_sales[date_key]['count'] += 1
-    
-    daily_sales_list = [
-        {'date': date, 'amount': data['amount'], 'count': data['count']}
-        for date, data in sorted(daily_sales.items())
-    ]
-    
-    # Top clients
-    client_totals = {}
-    for sale in sales:
-        if sale.client:
-            client_name = sale.client.name
-            client_totals[client_name] = client_totals.get(client_name, 0) + float(sale.total_amount)
-    
-    top_clients = [
-        {'name': name, 'total': total}
-        for name, total in sorted(client_totals.items(), key=lambda x: x[1], reverse=True)[:10]
-    ]
+        job = enqueue_job(body.get('kind'), body.get('params', {}), body.get('priority', 0))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    db.session.commit()
     
-    return jsonify({
-        'total_sales': total_sales,
-        'total_revenue': total_revenue,
-        'average_sale': average_sale,
-        'yoy_growth': yoy_growth,
-        'sales_by_supplier': sales_by_supplier,
-        'sales_by_payment_method': sales_by_payment_method,
-        'sales_by_product_type': sales_by_product_type,
-        'daily_sales': daily_sales_list,
-        'top_clients': top_clients,
-    })
+    url = url_for('reports.get_report_job', job_id=job.id)
+    return jsonify({'id': job.id, 'status': job.status, 'url': url}), 202, {'Location': url}
+
+
+@reports_bp.route('/jobs/<int:job_id>')
+def get_report_job(job_id):
+    """Status of a queued report, with the result once it is done."""
+    job = db.session.get(ReportJob, job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    if job.expires_at and job.expires_at < datetime.utcnow():
+        return jsonify({'error': 'Job result expired'}), 410
+    return jsonify(job_payload(job))
 
 
 @sales_bp.route('/<int:sale_id>/add-installment', methods=['POST'])
@@ -541,12 +617,140 @@ def add_installment(sale_id):
         return redirect(url_for('sales.view_sale', sale_id=sale_id))
     
     sale.amount_paid += amount
+    allocate_payment(sale, amount)
+    record_payment(sale, amount)
+    bump_version('sales')
     db.session.commit()
     flash('Installment recorded successfully', 'success')
     
     return redirect(url_for('sales.view_sale', sale_id=sale_id))
 
 
+# ============= RECEIVABLES ROUTES =============
+
+@receivables_bp.route('/aging')
+@conditional_get('sales')
+def aging_report():
+    """Outstanding installment balances in current / 30 / 60 / 90+ day buckets."""
+    return jsonify(receivables_aging())
+
+
+@receivables_bp.route('/due')
+def due_installments():
+    """Open installments due within ?within= days (default: already due), oldest first.
+    
+    Paged by cursor like the list endpoints: pass next_cursor back as ?after=.
+    """
+    within = request.args.get('within', 0, type=int)
+    limit = min(request.args.get('limit', 100, type=int), 500)
+    try:
+        items, next_cursor = due_installments_page(within_days=within, limit=limit,
+                                                   after=request.args.get('after'))
+    except ValueError:
+        return jsonify({'error': 'Invalid cursor'}), 400
+    return jsonify({'installments': items, 'next_cursor': next_cursor})
+
+
+# ============= EXPORT ROUTES =============
+
+@export_bp.route('/<kind>')
+def export_data(kind):
+    """Stream sales, items or installments as CSV or NDJSON.
+    
+    Query params: format (csv|ndjson), date_from, date_to, supplier_id.
+    """
+    if kind not in EXPORTS:
+        return jsonify({'error': f'Unknown export, expected one of: {", ".join(EXPORTS)}'}), 404
+    
+    export_format = request.args.get('format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({'error': 'format must be csv or ndjson'}), 400
+    
+    try:
+        date_from = datetime.strptime(request.args['date_from'], '%Y-%m-%d').date() if request.args.get('date_from') else None
+        date_to = datetime.strptime(request.args['date_to'], '%Y-%m-%d').date() if request.args.get('date_to') else None
+    except ValueError:
+        return jsonify({'error': 'Dates must be YYYY-MM-DD'}), 400
+    supplier_id = request.args.get('supplier_id', type=int)
+    
+    headers, batches = iter_export_rows(kind, date_from, date_to, supplier_id)
+    if export_format == 'csv':
+        body, mimetype = stream_csv(headers, batches), 'text/csv'
+    else:
+        body, mimetype = stream_ndjson(headers, batches), 'application/x-ndjson'
+    
+    return Response(stream_with_context(body), mimetype=mimetype, headers={
+        'Content-Disposition': f'attachment; filename={kind}-export.{export_format}'
+    })
+
+
+# ============= IMPORT ROUTES =============
+
+@import_bp.route('/<kind>', methods=['POST'])
+def import_file(kind):
+    """Queue a CSV file of clients, sales, items or installments for import.
+    
+    Upload the file as the multipart field ``file``; the report worker imports
+    it in chunks. Poll the returned job URL for the summary. Import the kinds
+    in order (clients, sales, items, installments) and wait for each to finish.
+    Files over MAX_CONTENT_LENGTH go through ``flask import-csv`` instead.
+    """
+    if kind not in IMPORT_KINDS:
+        return jsonify({'error': f'Unknown import, expected one of: {", ".join(IMPORT_KINDS)}'}), 404
+    upload = request.files.get('file')
+    if upload is None:
+        return jsonify({'error': 'Expected a CSV file in the "file" field'}), 400
+    
+    folder = current_app.config['UPLOAD_FOLDER']
+    os.makedirs(folder, exist_ok=True)
+    name = f'{kind}-{uuid.uuid4().hex}.csv'
+    upload.save(os.path.join(folder, name))
+    try:
+        job = enqueue_job('import', {'kind': kind, 'upload': name})
+    except ValueError as e:
+        os.remove(os.path.join(folder, name))
+        return jsonify({'error': str(e)}), 400
+    db.session.commit()
+    
+    url = url_for('reports.get_report_job', job_id=job.id)
+    return jsonify({'id': job.id, 'status': job.status, 'url': url}), 202, {'Location': url}
+
+
+# ============= METRICS ROUTES =============
+
+@metrics_bp.route('/_metrics')
+def metrics():
+    """Per-endpoint latency, query and response size metrics for Prometheus."""
+    registry = current_app.extensions.get('metrics')
+    if registry is None:
+        return jsonify({'error': 'Metrics are disabled'}), 404
+    return Response(registry.render(), mimetype='text/plain; version=0.0.4')
+
+
+@metrics_bp.route('/_slow_queries', methods=['GET', 'DELETE'])
+def slow_queries():
+    """Recent statements over SLOW_QUERY_THRESHOLD_MS with their query plans, newest first: ?limit=N.
+    
+    DELETE empties the log. Bind parameters can hold customer data, so both
+    need ``Authorization: Bearer <ADMIN_TOKEN>``; without ADMIN_TOKEN set the
+    endpoint does not exist.
+    """
+    token = current_app.config.get('ADMIN_TOKEN')
+    if not token:
+        abort(404)
+    if not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return jsonify({'error': 'Unauthorized'}), 401
+    log = current_app.extensions.get('slow_queries')
+    if log is None:
+        return jsonify({'error': 'Slow query logging is off; set SLOW_QUERY_THRESHOLD_MS'}), 404
+    
+    if request.method == 'DELETE':
+        log.clear()
+        return '', 204
+    limit = max(1, request.args.get('limit', current_app.config['SLOW_QUERY_LOG_SIZE'], type=int))
+    return jsonify({'threshold_ms': log.threshold_ms, 'queries': log.entries()[:limit]})
+
+
 # ============= ACCESSORIES ROUTES =============
 
 @accessories_bp.route('/')
@@ -554,19 +758,19 @@ def list_accessories():
     """List daily accessory sales."""
     page = request.args.get('page', 1, type=int)
     sales = AccessorySale.query.order_by(AccessorySale.sale_date.desc()).paginate(page=page, per_page=20)
-    return render_template('accessories/list.html', sales=sales)
+    page_total = sum(sale.get_daily_total() for sale in sales.items)
+    return render_template('accessories/list.html', sales=sales, page_total=page_total)
 
 
 @accessories_bp.route('/today')
 def today_accessories():
     """Show today's accessories entry."""
     today = datetime.utcnow().date()
-    today_start = datetime.combine(today, datetime.min.time())
-    today_end = datetime.combine(today, datetime.max.time())
+    today_start, tomorrow_start = day_bounds(today, today)
     
     sale = AccessorySale.query.filter(
         AccessorySale.sale_date >= today_start,
-        AccessorySale.sale_date <= today_end
+        AccessorySale.sale_date < tomorrow_start
     ).first()
     
     if sale:
@@ -580,13 +784,12 @@ def create_accessories():
     """Create new daily accessory sales entry."""
     if request.method == 'POST':
         today = datetime.utcnow().date()
-        today_start = datetime.combine(today, datetime.min.time())
-        today_end = datetime.combine(today, datetime.max.time())
+        today_start, tomorrow_start = day_bounds(today, today)
         
         # Check if entry exists
         existing = AccessorySale.query.filter(
             AccessorySale.sale_date >= today_start,
-            AccessorySale.sale_date <= today_end
+            AccessorySale.sale_date < tomorrow_start
         ).first()
         
         if existing:
@@ -623,6 +826,7 @@ def create_accessories():
         )
         
         db.session.add(sale)
+        bump_version('accessories')
         db.session.commit()
         flash('Accessory sales recorded successfully', 'success')
         return redirect(url_for('accessories.view_accessories', sale_id=sale.id))
@@ -670,6 +874,7 @@ def edit_accessories(sale_id):
         sale.notes = request.form.get('notes', '')
         sale.updated_at = datetime.utcnow()
         
+        bump_version('accessories')
         db.session.commit()
         flash('Accessory sales updated successfully', 'success')
         return redirect(url_for('accessories.view_accessories', sale_id=sale.id))
@@ -682,50 +887,10 @@ def accessories_report():
     """Generate accessory sales report."""
     period = request.args.get('period', 'week')
     
-    if period == 'week':
-        start_date = datetime.utcnow() - timedelta(days=7)
-    elif period == 'month':
-        start_date = datetime.utcnow() - timedelta(days=30)
-    else:
-        start_date = datetime.utcnow() - timedelta(days=1)
-    
-    sales = AccessorySale.query.filter(AccessorySale.sale_date >= start_date).all()
-    
-    # Aggregate data
-    totals = {
-        'grill': {'qty': 0, 'amount': 0},
-        'burner_300': {'qty': 0, 'amount': 0},
-        'burner_350': {'qty': 0, 'amount': 0},
-        'burner_450': {'qty': 0, 'amount': 0},
-        'burner_600': {'qty': 0, 'amount': 0},
-        'regulator_6kg': {'qty': 0, 'amount': 0},
-        'regulator_13kg': {'qty': 0, 'amount': 0},
-        'hose': {'qty': 0, 'amount': 0},
-    }
-    
-    for sale in sales:
-        totals['grill']['qty'] += sale.grill_quantity
-        totals['grill']['amount'] += sale.grill_total
-        
-        totals['burner_300']['qty'] += sale.burner_300_quantity
-        totals['burner_300']['amount'] += sale.burner_300_total
-        
-        totals['burner_350']['qty'] += sale.burner_350_quantity
-        totals['burner_350']['amount'] += sale.burner_350_total
-        
-        totals['burner_450']['qty'] += sale.burner_450_quantity
-        totals['burner_450']['amount'] += sale.burner_450_total
-        
-        totals['burner_600']['qty'] += sale.burner_600_quantity
-        totals['burner_600']['amount'] += sale.burner_600_total
-        
-        totals['regulator_6kg']['qty'] += sale.regulator_6kg_quantity
-        totals['regulator_6kg']['amount'] += sale.regulator_6kg_total
-        
-        totals['regulator_13kg']['qty'] += sale.regulator_13kg_quantity
-        totals['regulator_13kg']['amount'] += sale.regulator_13kg_total
-        
-        totals['hose']['qty'] += sale.hose_quantity
-        totals['hose']['amount'] += sale.hose_total
+    # Today plus the previous 6 / 29 days
+    days = {'week': 7, 'month': 30}.get(period, 1)
+    date_to = datetime.utcnow().date()
+    report = accessory_sales_report(date_to - timedelta(days=days - 1), date_to)
     
-    return render_template('accessories/report.html', totals=totals, period=period, sales=sales)
+    return render_template('accessories/report.html', totals=report['totals'], period=period,
+                           record_count=report['record_count'])
@@ -0,0 +1,134 @@
+"""
+Client typeahead search over an SQLite FTS5 trigram index.
+Author: Llakterian
+"""
+
+from app.models import db, Client
+from sqlalchemy import case, column, func, inspect, literal_column, or_, select, table, text
+import re
+
+
+SEARCH_LIMIT = 10
+MAX_SEARCH_LIMIT = 50
+
+# Trigram indexes cannot match terms shorter than this
+MIN_TERM_LENGTH = 3
+
+# Kept in sync with clients by the triggers of migration 0004_client_search
+client_search = table('client_search', column('rowid'), column('name'), column('phone'), column('address'))
+
+PHONE_TERM = re.compile(r'^\+?[\d\s()-]+$')
+
+
+def normalize_phone(raw):
+    """Digits after the 0 / +254 prefix, so 0712..., 254712... and +254 712... all give 712...."""
+    digits = re.sub(r'\D', '', raw)
+    if digits.startswith('254'):
+        return digits[3:]
+    if digits.startswith('0'):
+        return digits[1:]
+    return digits
+
+
+def phone_digits(column):
+    """normalize_phone() as an SQL expression over ``column``, for the unindexed fallback."""
+    digits = column
+    for character in (' ', '-', '+', '(', ')'):
+        digits = func.replace(digits, character, '')
+    return case((digits.startswith('254'), func.substr(digits, 4)),
+                (digits.startswith('0'), func.substr(digits, 2)), else_=digits)
+
+
+def phone_digits_sql(expression):
+    """SQL text equivalent of normalize_phone() for the triggers; SQLite has no regex replace."""
+    digits = expression
+    for character in (' ', '-', '+', '(', ')'):
+        digits = f"replace({digits}, '{character}', '')"
+    return (f"CASE WHEN {digits} LIKE '254%' THEN substr({digits}, 4) "
+            f"WHEN {digits} LIKE '0%' THEN substr({digits}, 2) ELSE {digits} END")
+
+
+def _terms(query):
+    """(is_phone, value) per search term; space separated digit groups count as one phone term."""
+    query = query.strip()
+    if PHONE_TERM.match(query) and sum(c.isdigit() for c in query) >= MIN_TERM_LENGTH:
+        return [(True, normalize_phone(query))]
+    terms = []
+    for term in query.split():
+        is_phone = PHONE_TERM.match(term) is not None
+        value = normalize_phone(term) if is_phone else term
+        if value:
+            terms.append((is_phone, value))
+    return terms
+
+
+def _match_query(terms):
+    """FTS5 MATCH string for the terms long enough for the trigram index; None if there are none."""
+    parts = []
+    for is_phone, value in terms:
+        if len(value) < MIN_TERM_LENGTH:
+            continue
+        quoted = '"' + value.replace('"', '""') + '"'
+        parts.append(f'phone : {quoted}' if is_phone else f'{{name address}} : {quoted}')
+    return ' AND '.join(parts) or None
+
+
+def _like_conditions(terms, phone):
+    """Substring conditions on clients for every term; ``phone`` is the normalized phone expression.
+
+    Phone terms too short for the index only match the start of the number;
+    as a substring "07" would match nearly every client.
+    """
+    conditions = []
+    for is_phone, value in terms:
+        if is_phone and len(value) < MIN_TERM_LENGTH:
+            conditions.append(phone.startswith(value, autoescape=True))
+        elif is_phone:
+            conditions.append(phone.contains(value, autoescape=True))
+        else:
+            conditions.append(or_(Client.name.contains(value, autoescape=True),
+                                  Client.address.contains(value, autoescape=True)))
+    return conditions
+
+
+_search_index = {}
+
+
+def has_search_index():
+    """True when the client_search table exists (SQLite with FTS5 trigram support); checked once per engine."""
+    engine = db.engine
+    if engine not in _search_index:
+        _search_index[engine] = inspect(engine).has_table('client_search')
+    return _search_index[engine]
+
+
+def search_clients(query, columns, limit=SEARCH_LIMIT):
+    """Clients matching every term of ``query`` by name, address or phone.
+
+    Phone terms ignore spacing and the 0 / +254 prefix. With the FTS5 index,
+    matches rank by relevance with name prefix matches first; short or
+    unindexed queries fall back to a LIKE scan ordered by name. Returns rows
+    of ``columns`` (Client attributes).
+    """
+    terms = _terms(query)
+    if not terms:
+        return []
+
+    match = _match_query(terms) if has_search_index() else None
+    stmt = select(*columns)
+    if match is None:
+        stmt = stmt.where(*_like_conditions(terms, phone_digits(Client.phone))).order_by(Client.name, Client.id)
+    else:
+        first_is_phone, first = terms[0]
+        prefix_column = client_search.c.phone if first_is_phone else client_search.c.name
+        stmt = stmt.select_from(client_search).join(Client, Client.id == client_search.c.rowid).where(
+            text('client_search MATCH :match').bindparams(match=match),
+            # Terms too short for the index still have to match
+            *_like_conditions([(is_phone, value) for is_phone, value in terms if len(value) < MIN_TERM_LENGTH],
+                              client_search.c.phone)
+        ).order_by(
+            case((prefix_column.startswith(first, autoescape=True), 0), else_=1),
+            func.bm25(literal_column('client_search')),
+            Client.name,
+        )
+    return db.session.execute(stmt.limit(limit)).all()
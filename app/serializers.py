@@ -0,0 +1,143 @@
+"""
+JSON serializers and eager-loading plans for API endpoints.
+Author: Llakterian
+"""
+
+from app.models import Client, Supplier, Product, Sale
+from sqlalchemy import select
+from sqlalchemy.orm import joinedload
+
+
+CLIENT_FIELDS = ('id', 'name', 'phone', 'email', 'address', 'created_at')
+SUPPLIER_FIELDS = ('id', 'name', 'color', 'created_at')
+SALE_FIELDS = ('id', 'client_id', 'supplier_id', 'payment_method', 'mpesa_code', 'total_amount',
+               'amount_paid', 'notes', 'created_at', 'sale_date')
+RECENT_SALE_FIELDS = ('id', 'client_id', 'supplier_id', 'payment_method', 'total_amount',
+                      'amount_paid', 'created_at', 'sale_date')
+PRODUCT_FIELDS = ('id', 'name', 'supplier_id', 'category', 'price', 'description', 'created_at')
+INSTALLMENT_FIELDS = ('id', 'sale_id', 'amount', 'amount_paid', 'due_date', 'paid_date', 'is_paid', 'created_at')
+SALE_ITEM_FIELDS = ('id', 'sale_id', 'product_id', 'quantity', 'unit_price', 'subtotal')
+
+# Embedded references for sale rows: field -> (model, columns)
+SALE_REFS = {
+    'client': (Client, ('id', 'name', 'phone')),
+    'supplier': (Supplier, ('id', 'name', 'color')),
+}
+SALE_LIST_FIELDS = SALE_FIELDS + tuple(SALE_REFS)
+
+
+def sale_relationships():
+    """Loader options for every relationship serialize_sale() touches.
+
+    Both are many-to-one, so a single JOIN fetches them with the page.
+    """
+    return (joinedload(Sale.client), joinedload(Sale.supplier))
+
+
+def with_sale_relationships(query):
+    """Apply the sale loader options to a query."""
+    return query.options(*sale_relationships())
+
+
+def _value(obj, field):
+    """Read an attribute, converting it into a JSON friendly value."""
+    value = getattr(obj, field)
+    if value is None:
+        return None
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    if field in ('total_amount', 'amount_paid', 'price'):
+        return float(value)
+    return value
+
+
+def serialize(obj, fields):
+    """Copy the given fields of a model instance into a dict."""
+    return {field: _value(obj, field) for field in fields}
+
+
+def serialize_client_ref(client):
+    """Compact client embedded in sale payloads."""
+    if not client:
+        return None
+    return {'id': client.id, 'name': client.name, 'phone': client.phone}
+
+
+def serialize_supplier_ref(supplier):
+    """Compact supplier embedded in sale payloads."""
+    if not supplier:
+        return None
+    return {'id': supplier.id, 'name': supplier.name, 'color': supplier.color}
+
+
+def serialize_sale(sale, fields=SALE_FIELDS):
+    """Sale with its client and supplier; load it via with_sale_relationships()."""
+    data = serialize(sale, fields)
+    data['client'] = serialize_client_ref(sale.client)
+    data['supplier'] = serialize_supplier_ref(sale.supplier)
+    return data
+
+
+def parse_fields(raw, allowed):
+    """Fields named in a ``?fields=a,b`` projection, in ``allowed`` order.
+
+    Returns every allowed field when ``raw`` is empty; raises ValueError
+    naming any field that is not allowed.
+    """
+    requested = {name.strip() for name in (raw or '').split(',') if name.strip()}
+    if not requested:
+        return allowed
+    unknown = requested.difference(allowed)
+    if unknown:
+        raise ValueError('Unknown fields: ' + ', '.join(sorted(unknown)))
+    return tuple(field for field in allowed if field in requested)
+
+
+def select_fields(model, fields):
+    """SELECT of just the given columns of a model, as plain row tuples."""
+    return select(*[getattr(model, field) for field in fields])
+
+
+def rows_to_dicts(rows, fields):
+    """Zip row tuples into dicts; extra trailing columns (cursor keys) are dropped.
+
+    Values are left as the driver returns them; the app's JSON provider
+    writes datetimes as ISO 8601.
+    """
+    return [dict(zip(fields, row)) for row in rows]
+
+
+def select_sales(fields):
+    """Column-only SELECT for sale rows, joining client/supplier only when requested.
+
+    ``fields`` may include the keys of SALE_REFS; read the rows back with
+    sale_rows_to_dicts() and the same fields.
+    """
+    columns = [getattr(Sale, field) for field in fields if field not in SALE_REFS]
+    stmt = select(*columns).select_from(Sale)
+    for field, (model, ref_fields) in SALE_REFS.items():
+        if field in fields:
+            stmt = stmt.add_columns(*[getattr(model, f) for f in ref_fields]).outerjoin(
+                model, getattr(Sale, field + '_id') == model.id
+            )
+    return stmt
+
+
+def sale_rows_to_dicts(rows, fields):
+    """Sale payloads from select_sales() rows, shaped like serialize_sale()."""
+    scalars = [field for field in fields if field not in SALE_REFS]
+    refs = [(field, SALE_REFS[field][1]) for field in SALE_REFS if field in fields]
+    if not refs:
+        return rows_to_dicts(rows, scalars)
+
+    data = []
+    for row in rows:
+        item = dict(zip(scalars, row))
+        position = len(scalars)
+        for field, ref_fields in refs:
+            values = row[position:position + len(ref_fields)]
+            item[field] = dict(zip(ref_fields, values)) if values[0] is not None else None
+            position += len(ref_fields)
+        data.append(item)
+    return data
+
@@ -0,0 +1,125 @@
+"""
+Opt-in log of slow SQL statements with their SQLite query plans.
+Author: Llakterian
+"""
+
+from app.models import db
+from collections import deque
+from datetime import datetime
+from flask import current_app, has_request_context, request
+from sqlalchemy import event
+from threading import Lock
+import os
+import sqlite3
+import time
+
+
+SLOW_QUERY_LOG_SIZE = 100
+MAX_PARAMETER_LENGTH = 200
+MAX_LOGGED_PARAMETERS = 50
+
+
+def _parameters(parameters, executemany):
+    """Bind parameters as short strings; executemany batches are only counted."""
+    if executemany:
+        return f'{len(parameters)} parameter sets'
+    if isinstance(parameters, dict):
+        items = list(parameters.items())[:MAX_LOGGED_PARAMETERS]
+        return {name: repr(value)[:MAX_PARAMETER_LENGTH] for name, value in items}
+    return [repr(value)[:MAX_PARAMETER_LENGTH] for value in list(parameters or ())[:MAX_LOGGED_PARAMETERS]]
+
+
+def _query_plan(cursor, statement, parameters):
+    """EXPLAIN QUERY PLAN lines, indented like the sqlite3 shell; None when SQLite cannot explain it."""
+    try:
+        plan_cursor = cursor.connection.cursor(sqlite3.Cursor)
+        try:
+            rows = plan_cursor.execute('EXPLAIN QUERY PLAN ' + statement, parameters or ()).fetchall()
+        finally:
+            plan_cursor.close()
+    except sqlite3.Error:
+        return None
+
+    depth = {0: -1}
+    lines = []
+    for node_id, parent, _, detail in rows:
+        depth[node_id] = depth.get(parent, -1) + 1
+        lines.append('  ' * depth[node_id] + detail)
+    return lines
+
+
+class SlowQueryLog:
+    """Ring buffer of the last ``size`` statements slower than ``threshold_ms``."""
+
+    def __init__(self, threshold_ms, size=SLOW_QUERY_LOG_SIZE):
+        self.threshold_ms = threshold_ms
+        self._entries = deque(maxlen=size)
+        self._lock = Lock()
+
+    def record(self, entry):
+        with self._lock:
+            self._entries.append(entry)
+
+    def entries(self):
+        """Logged statements, newest first."""
+        with self._lock:
+            return list(reversed(self._entries))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def listen(self, engine):
+        """Time every statement on ``engine`` and log the slow ones."""
+        threshold = self.threshold_ms / 1000
+        explain = engine.dialect.name == 'sqlite'
+        logger = current_app.logger
+
+        @event.listens_for(engine, 'before_cursor_execute')
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            conn.info.setdefault('slow_query_started', []).append(time.perf_counter())
+
+        @event.listens_for(engine, 'after_cursor_execute')
+        def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            elapsed = time.perf_counter() - conn.info['slow_query_started'].pop()
+            if elapsed < threshold:
+                return
+
+            route = None
+            if has_request_context():
+                route = {'endpoint': request.endpoint, 'method': request.method, 'path': request.full_path}
+            self.record({
+                'at': datetime.utcnow(),
+                'duration_ms': round(elapsed * 1000, 3),
+                'sql': statement,
+                'parameters': _parameters(parameters, executemany),
+                'route': route,
+                'plan': _query_plan(cursor, statement, parameters) if explain and not executemany else None,
+            })
+            logger.warning('Slow query (%.1f ms) in %s: %s', elapsed * 1000,
+                           route['endpoint'] if route else 'background task', ' '.join(statement.split()))
+
+        @event.listens_for(engine, 'handle_error')
+        def handle_error(exception_context):
+            # A failed statement never reaches after_cursor_execute
+            conn = exception_context.connection
+            started = conn.info.get('slow_query_started') if conn is not None else None
+            if started:
+                started.pop()
+
+
+def slow_query_threshold_from_env():
+    """SLOW_QUERY_THRESHOLD_MS from the environment; None (logging off) when unset."""
+    value = os.environ.get('SLOW_QUERY_THRESHOLD_MS')
+    return float(value) if value else None
+
+
+def init_slow_query_log(app):
+    """Start logging statements slower than SLOW_QUERY_THRESHOLD_MS.
+
+    Call inside an app context, after db.init_app().
+    """
+    log = SlowQueryLog(app.config['SLOW_QUERY_THRESHOLD_MS'], app.config['SLOW_QUERY_LOG_SIZE'])
+    log.listen(db.engine)
+    app.extensions['slow_queries'] = log
+    return log
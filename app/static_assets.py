@@ -0,0 +1,159 @@
+"""
+Manifest of the React build with compressed variants and cache headers.
+Author: Llakterian
+"""
+
+from collections import namedtuple
+from datetime import datetime, timezone
+from flask import Response, request, send_file
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+
+try:
+    import brotli
+except ImportError:
+    try:
+        import brotlicffi as brotli
+    except ImportError:
+        brotli = None
+
+
+# Vite emits assets/<name>-<8 char hash>.<ext>; those never change content
+HASHED_ASSET = re.compile(r'^assets/.+-[A-Za-z0-9_-]{8}\.[A-Za-z0-9]+$')
+IMMUTABLE_CACHE = 'public, max-age=31536000, immutable'
+REVALIDATE_CACHE = 'no-cache'
+
+COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'application/json',
+                      'application/manifest+json', 'image/svg+xml', 'application/xml')
+MIN_COMPRESS_SIZE = 1024
+
+# Runtime compression happens on a request thread, so it trades ratio for speed;
+# precompress-assets writes the maximum-quality .br/.gz siblings at build time
+RUNTIME_BROTLI_QUALITY = 5
+RUNTIME_GZIP_LEVEL = 6
+BUILD_BROTLI_QUALITY = 11
+BUILD_GZIP_LEVEL = 9
+
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+Asset = namedtuple('Asset', ['full_path', 'mimetype', 'etag', 'last_modified', 'cache_control',
+                             'compressible', 'variants'])
+
+
+def _compressible(mimetype, size):
+    return size >= MIN_COMPRESS_SIZE and mimetype.startswith(COMPRESSIBLE_TYPES)
+
+
+def _compress(encoding, data, build=False):
+    """Compress ``data``; None when the encoding is unavailable (brotli not installed)."""
+    if encoding == 'br':
+        if brotli is None:
+            return None
+        return brotli.compress(data, quality=BUILD_BROTLI_QUALITY if build else RUNTIME_BROTLI_QUALITY)
+    return gzip.compress(data, BUILD_GZIP_LEVEL if build else RUNTIME_GZIP_LEVEL, mtime=0)
+
+
+def _variant(asset, encoding, suffix):
+    """Compressed body of ``asset``, made on first use; None when it would not be smaller.
+
+    A file precompressed at build time is preferred. Results are kept on the
+    asset; two threads racing on the first request just compress it twice.
+    """
+    if encoding not in asset.variants:
+        if os.path.exists(asset.full_path + suffix):
+            with open(asset.full_path + suffix, 'rb') as f:
+                body = f.read()
+        else:
+            with open(asset.full_path, 'rb') as f:
+                body = _compress(encoding, f.read())
+        size = os.path.getsize(asset.full_path)
+        asset.variants[encoding] = body if body is not None and len(body) < size else None
+    return asset.variants[encoding]
+
+
+def build_manifest(root):
+    """Scan the build directory once and describe every servable file.
+
+    Returns a dict of URL path -> Asset; empty when the frontend is not built.
+    Compressed variants are made on first request, see _variant().
+    """
+    manifest = {}
+    if not root or not os.path.isdir(root):
+        return manifest
+
+    for directory, _, files in os.walk(root):
+        for filename in files:
+            full_path = os.path.join(directory, filename)
+            path = os.path.relpath(full_path, root).replace(os.sep, '/')
+            # Precompressed siblings are served as variants of the original
+            if path.endswith(('.gz', '.br')) and os.path.exists(full_path[:-3]):
+                continue
+
+            with open(full_path, 'rb') as f:
+                data = f.read()
+            mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+            stat = os.stat(full_path)
+            manifest[path] = Asset(
+                full_path=full_path,
+                mimetype=mimetype,
+                etag=hashlib.sha1(data).hexdigest(),
+                last_modified=datetime.fromtimestamp(int(stat.st_mtime), timezone.utc),
+                cache_control=IMMUTABLE_CACHE if HASHED_ASSET.match(path) else REVALIDATE_CACHE,
+                compressible=_compressible(mimetype, len(data)),
+                variants={},
+            )
+    return manifest
+
+
+def precompress_assets(root):
+    """Write maximum-quality .br/.gz siblings for the compressible files under ``root``.
+
+    Meant for the build step; serve_asset() picks the siblings up. Returns the
+    number of files written.
+    """
+    written = 0
+    for path, asset in build_manifest(root).items():
+        if not asset.compressible:
+            continue
+        with open(asset.full_path, 'rb') as f:
+            data = f.read()
+        for encoding, suffix in ENCODINGS:
+            body = _compress(encoding, data, build=True)
+            if body is not None and len(body) < len(data):
+                with open(asset.full_path + suffix, 'wb') as f:
+                    f.write(body)
+                written += 1
+    return written
+
+
+def _preferred_encoding(asset):
+    """(encoding, body) of the best variant the client accepts, or (None, None)."""
+    if asset.compressible:
+        for encoding, suffix in ENCODINGS:
+            if request.accept_encodings[encoding]:
+                body = _variant(asset, encoding, suffix)
+                if body is not None:
+                    return encoding, body
+    return None, None
+
+
+def serve_asset(asset):
+    """Send an asset, compressed when the client accepts it, with its cache headers."""
+    encoding, body = _preferred_encoding(asset)
+    if encoding:
+        response = Response(body, mimetype=asset.mimetype)
+        response.headers['Content-Encoding'] = encoding
+        response.set_etag(f'{asset.etag}-{encoding}')
+        response.last_modified = asset.last_modified
+        response.make_conditional(request)
+    else:
+        response = send_file(asset.full_path, mimetype=asset.mimetype, etag=asset.etag,
+                             last_modified=asset.last_modified, conditional=True)
+
+    if asset.compressible:
+        response.vary.add('Accept-Encoding')
+    response.headers['Cache-Control'] = asset.cache_control
+    return response
@@ -0,0 +1,85 @@
+"""
+Delta sync for the offline PWA, driven by the change log.
+Author: Llakterian
+"""
+
+from app.models import db, Client, Supplier, Product, Sale, SaleItem, Installment, ChangeLog
+from app.pagination import encode_cursor, decode_cursor
+from app.serializers import select_fields, rows_to_dicts, CLIENT_FIELDS, SUPPLIER_FIELDS, PRODUCT_FIELDS, SALE_FIELDS, \
+    SALE_ITEM_FIELDS, INSTALLMENT_FIELDS
+from sqlalchemy import delete, func, select
+
+
+SYNC_PAGE_SIZE = 1000
+MAX_SYNC_PAGE_SIZE = 5000
+
+# Tables whose writes the change log records: name -> (model, fields sent to the PWA)
+SYNC_TABLES = {
+    'suppliers': (Supplier, SUPPLIER_FIELDS),
+    'products': (Product, PRODUCT_FIELDS),
+    'clients': (Client, CLIENT_FIELDS),
+    'sales': (Sale, SALE_FIELDS),
+    'sale_items': (SaleItem, SALE_ITEM_FIELDS),
+    'installments': (Installment, INSTALLMENT_FIELDS),
+}
+
+
+def changes_since(cursor=None, limit=SYNC_PAGE_SIZE):
+    """Rows written after ``cursor`` (None or '' for everything), up to ``limit`` log entries.
+
+    Each table gets ``upserts`` (current rows) and ``deletes`` (ids). A row
+    changed several times in the page is sent once, as it is now. Pass
+    ``next_cursor`` back while ``has_more`` is true. Raises ValueError for an
+    invalid cursor.
+    """
+    since = decode_cursor(cursor, (ChangeLog.id,))[0] if cursor else 0
+    entries = db.session.execute(
+        select(ChangeLog.id, ChangeLog.table_name, ChangeLog.row_id, ChangeLog.op).where(
+            ChangeLog.id > since
+        ).order_by(ChangeLog.id).limit(limit + 1)
+    ).all()
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+
+    # Last operation per row in this page
+    latest = {}
+    for _, table_name, row_id, op in entries:
+        latest[(table_name, row_id)] = op
+
+    changes = {name: {'upserts': [], 'deletes': []} for name in SYNC_TABLES}
+    wanted = {}
+    for (table_name, row_id), op in latest.items():
+        if op == 'delete':
+            changes[table_name]['deletes'].append(row_id)
+        else:
+            wanted.setdefault(table_name, []).append(row_id)
+
+    # One query per table for the rows to send
+    for table_name, ids in wanted.items():
+        model, fields = SYNC_TABLES[table_name]
+        rows = rows_to_dicts(db.session.execute(
+            select_fields(model, fields).where(model.id.in_(ids)).order_by(model.id)
+        ).all(), fields)
+        changes[table_name]['upserts'] = rows
+        # Deleted after this page's entry; its own delete entry follows in a later page
+        changes[table_name]['deletes'] += sorted(set(ids) - {row['id'] for row in rows})
+
+    return {
+        'changes': changes,
+        'next_cursor': encode_cursor([entries[-1].id]) if entries else (cursor or encode_cursor([0])),
+        'has_more': has_more,
+    }
+
+
+def compact_change_log():
+    """Drop entries superseded by a later entry for the same row; returns how many were removed.
+
+    Every cursor still receives the latest state of each row it has not
+    seen, so compaction never breaks a sync in progress.
+    """
+    latest = select(func.max(ChangeLog.id)).group_by(ChangeLog.table_name, ChangeLog.row_id)
+    removed = db.session.execute(
+        delete(ChangeLog).where(ChangeLog.id.not_in(latest)).execution_options(synchronize_session=False)
+    ).rowcount
+    db.session.commit()
+    return removed
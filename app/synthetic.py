@@ -0,0 +1,216 @@
+"""
+Synthetic production-scale data for load and benchmark runs.
+Author: Llakterian
+"""
+
+from app.models import db, Supplier, Product, Client, Sale, SaleItem, Installment, AccessorySale
+from app.cache import bump_version
+from app.rollups import rebuild_rollups
+from collections import namedtuple
+from datetime import datetime, time, timedelta
+from sqlalchemy import func, insert, select
+import random
+import string
+
+
+GENERATOR_BATCH_SIZE = 5000
+
+# Named presets used by bench.py; any size can be passed to generate_dataset()
+DatasetSize = namedtuple('DatasetSize', ['clients', 'days', 'sales_per_day'])
+DATASET_SIZES = {
+    'small': DatasetSize(clients=500, days=90, sales_per_day=20),
+    'medium': DatasetSize(clients=5000, days=365, sales_per_day=60),
+    'large': DatasetSize(clients=20000, days=3 * 365, sales_per_day=150),
+}
+
+SUPPLIERS = [('Top Gas', 'red'), ('K-Gas', 'black'), ('Total Gas', 'orange'), ('Rubis Gas', 'green'),
+             ('OiLibya Gas', 'brown'), ('Men Gas', 'maroon'), ('Hashi Gas', 'yellow'), ('Hass Gas', 'blue')]
+
+# (name, category, price) per supplier, and the shared accessories
+CYLINDERS = [('6Kg - New', 'cylinder_6kg', 3200), ('13Kg - New', 'cylinder_13kg', 5500),
+             ('6Kg - Refill', 'cylinder_6kg_refill', 1200), ('13Kg - Refill', 'cylinder_13kg_refill', 2600)]
+ACCESSORIES = [('Grill', 'accessory_grill', 350), ('Burner (Ksh 300)', 'accessory_burner', 300),
+               ('Burner (Ksh 350)', 'accessory_burner', 350), ('Burner (Ksh 450)', 'accessory_burner', 450),
+               ('Burner (Ksh 600)', 'accessory_burner', 600), ('Regulator 6Kg', 'accessory_regulator', 500),
+               ('Regulator 13Kg', 'accessory_regulator', 700), ('Hose Pipe 1.5M', 'accessory_pipe', 300)]
+
+# AccessorySale column prefix -> unit price
+ACCESSORY_DAY_PRICES = {'grill': 350, 'burner_300': 300, 'burner_350': 350, 'burner_450': 450,
+                        'burner_600': 600, 'regulator_6kg': 500, 'regulator_13kg': 700, 'hose': 300}
+
+FIRST_NAMES = ['John', 'Mary', 'Peter', 'Alice', 'Joseph', 'Grace', 'David', 'Faith', 'James', 'Esther',
+               'Daniel', 'Mercy', 'Samuel', 'Lucy', 'Brian', 'Ann', 'Kevin', 'Janet', 'Dennis', 'Ruth']
+LAST_NAMES = ['Kariuki', 'Ochieng', 'Kamau', 'Wanjiru', 'Kipchoge', 'Otieno', 'Mwangi', 'Njeri', 'Mutua',
+              'Akinyi', 'Kiprono', 'Wambui', 'Omondi', 'Chebet', 'Mohamed', 'Achieng', 'Kimani', 'Nyambura']
+TOWNS = ['Nairobi, Westlands', 'Mombasa, Tudor', 'Kisumu, Nyalenda', 'Nakuru, Menengai', 'Eldoret, Kapsabet',
+         'Thika, Makongeni', 'Machakos, Mjini', 'Nyeri, Ruring\'u', 'Kitale, Milimani', 'Garissa, Bulla Iftin']
+
+
+def _insert(model, rows):
+    """Bulk insert rows in GENERATOR_BATCH_SIZE chunks."""
+    for start in range(0, len(rows), GENERATOR_BATCH_SIZE):
+        db.session.execute(insert(model), rows[start:start + GENERATOR_BATCH_SIZE])
+
+
+def _catalog():
+    """Suppliers and products, created when missing; returns (supplier_ids, cylinders, accessories)."""
+    existing = set(db.session.execute(select(Supplier.name)).scalars())
+    _insert(Supplier, [{'name': name, 'color': color} for name, color in SUPPLIERS if name not in existing])
+    supplier_ids = list(db.session.execute(select(Supplier.id).order_by(Supplier.id)).scalars())
+
+    if not db.session.query(func.count(Product.id)).scalar():
+        rows = [{'name': f'Gas Cylinder {name}', 'supplier_id': supplier_id, 'category': category, 'price': price,
+                 'description': f'{name} gas cylinder'}
+                for supplier_id in supplier_ids for name, category, price in CYLINDERS]
+        rows += [{'name': name, 'supplier_id': None, 'category': category, 'price': price, 'description': name}
+                 for name, category, price in ACCESSORIES]
+        _insert(Product, rows)
+
+    cylinders = {}
+    accessories = []
+    for product_id, supplier_id, category, price in db.session.execute(
+        select(Product.id, Product.supplier_id, Product.category, Product.price)
+    ):
+        if category.startswith('cylinder') and supplier_id:
+            cylinders.setdefault(supplier_id, []).append((product_id, category, price))
+        else:
+            accessories.append((product_id, category, price))
+    return [s for s in supplier_ids if s in cylinders], cylinders, accessories
+
+
+def _clients(rng, count, start):
+    """Client rows with unique phone numbers; ``start`` offsets the numbering for reruns."""
+    taken = set(db.session.execute(select(Client.phone)).scalars())
+    rows = []
+    number = start
+    while len(rows) < count:
+        number += 1
+        # 7919 is coprime with 10**8, so numbers stay unique while looking random
+        phone = f'07{number * 7919 % 10 ** 8:08d}'
+        if phone in taken:
+            continue
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        rows.append({
+            'name': f'{first} {last}',
+            'phone': phone,
+            'email': f'{first}.{last}{number}@example.com'.lower() if rng.random() < 0.4 else None,
+            'address': rng.choice(TOWNS),
+        })
+    return rows
+
+
+def _mpesa_code(rng):
+    return ''.join(rng.choices(string.ascii_uppercase + string.digits, k=10))
+
+
+def generate_dataset(clients=500, days=90, sales_per_day=20, seed=1, end=None):
+    """Insert a realistic synthetic history ending today (or ``end``).
+
+    Sales follow a weekly cycle and slow growth, favour repeat customers and
+    mix cylinders, refills and accessories; about 10% are installment plans
+    with payments up to ``end``. One accessory entry is added per day without
+    one. Everything goes in through bulk INSERTs, then the rollups are rebuilt.
+    Returns a dict of row counts.
+    """
+    rng = random.Random(seed)
+    end = end or datetime.utcnow()
+    first_day = end.date() - timedelta(days=days - 1)
+
+    supplier_ids, cylinders, accessories = _catalog()
+    client_start = db.session.query(func.coalesce(func.max(Client.id), 0)).scalar()
+    _insert(Client, _clients(rng, clients, client_start))
+    client_ids = list(db.session.execute(select(Client.id)).scalars())
+    # A fifth of the clients make most of the purchases
+    regulars = client_ids[:max(1, len(client_ids) // 5)]
+
+    next_sale_id = db.session.query(func.coalesce(func.max(Sale.id), 0)).scalar() + 1
+    counts = {'clients': clients, 'sales': 0, 'items': 0, 'installments': 0, 'accessory_days': 0}
+
+    sale_rows, item_rows, installment_rows = [], [], []
+
+    def flush():
+        _insert(Sale, sale_rows)
+        _insert(SaleItem, item_rows)
+        _insert(Installment, installment_rows)
+        counts['sales'] += len(sale_rows)
+        counts['items'] += len(item_rows)
+        counts['installments'] += len(installment_rows)
+        sale_rows.clear()
+        item_rows.clear()
+        installment_rows.clear()
+        db.session.commit()
+
+    for offset in range(days):
+        day = first_day + timedelta(days=offset)
+        weekly = 1.3 if day.weekday() >= 5 else 1.0
+        growth = 0.7 + 0.6 * offset / max(days - 1, 1)
+        for _ in range(max(0, int(rng.gauss(sales_per_day * weekly * growth, sales_per_day * 0.15)))):
+            sale_date = datetime.combine(day, time(7)) + timedelta(seconds=rng.randrange(13 * 3600))
+            if sale_date > end:
+                continue
+            supplier_id = rng.choice(supplier_ids) if rng.random() < 0.95 else None
+            lines = [rng.choice(cylinders[supplier_id or rng.choice(supplier_ids)])]
+            if rng.random() < 0.25:
+                lines.append(rng.choice(accessories))
+
+            sale_id = next_sale_id
+            next_sale_id += 1
+            total = 0.0
+            for product_id, _, price in lines:
+                quantity = 1 if rng.random() < 0.85 else rng.randint(2, 4)
+                item_rows.append({'sale_id': sale_id, 'product_id': product_id, 'quantity': quantity,
+                                  'unit_price': price, 'subtotal': price * quantity})
+                total += price * quantity
+
+            roll = rng.random()
+            payment_method = 'installment' if roll < 0.1 else 'mpesa' if roll < 0.55 else 'cash'
+            amount_paid = total
+            if payment_method == 'installment':
+                amount_paid = 0.0
+                parts = rng.choice((2, 3, 4))
+                for i in range(parts):
+                    due_date = sale_date + timedelta(days=30 * (i + 1))
+                    paid = due_date <= end and rng.random() < 0.85
+                    amount_paid += total / parts if paid else 0
+                    installment_rows.append({'sale_id': sale_id, 'amount': total / parts,
+                                             'amount_paid': total / parts if paid else 0.0,
+                                             'due_date': due_date, 'is_paid': paid,
+                                             'paid_date': due_date - timedelta(days=rng.randint(0, 5)) if paid else None})
+
+            sale_rows.append({
+                'id': sale_id,
+                'client_id': rng.choice(regulars) if rng.random() < 0.6 else rng.choice(client_ids),
+                'supplier_id': supplier_id,
+                'payment_method': payment_method,
+                'mpesa_code': _mpesa_code(rng) if payment_method == 'mpesa' else None,
+                'total_amount': total,
+                'amount_paid': amount_paid,
+                'notes': None,
+                'created_at': sale_date,
+                'sale_date': sale_date,
+            })
+        if len(sale_rows) >= GENERATOR_BATCH_SIZE:
+            flush()
+    flush()
+
+    taken_days = {d.date() for d in db.session.execute(
+        select(AccessorySale.sale_date).where(AccessorySale.sale_date >= datetime.combine(first_day, time.min))
+    ).scalars()}
+    accessory_rows = []
+    for offset in range(days):
+        day = first_day + timedelta(days=offset)
+        if day in taken_days:
+            continue
+        row = {'sale_date': datetime.combine(day, time(18)), 'notes': None}
+        for item, price in ACCESSORY_DAY_PRICES.items():
+            quantity = max(0, int(rng.gauss(2, 1.5)))
+            row[f'{item}_quantity'] = quantity
+            row[f'{item}_total'] = float(quantity * price)
+        accessory_rows.append(row)
+    _insert(AccessorySale, accessory_rows)
+    counts['accessory_days'] = len(accessory_rows)
+
+    bump_version('suppliers', 'products', 'clients', 'sales', 'accessories')
+    db.session.commit()
+    rebuild_rollups()
+    return counts
@@ -0,0 +1,208 @@
+"""
+Endpoint benchmark suite: times every GET route and counts its queries at
+several synthetic data sizes, comparing against stored baselines.
+Author: Llakterian
+
+Usage:
+    python bench.py                         # small dataset, compare with bench_baselines.json
+    python bench.py --sizes small medium    # several sizes
+    python bench.py --update-baseline       # record the current numbers as the baseline
+    python bench.py --update-baseline --queries-only   # record only statuses and query counts
+    python bench.py --check                 # CI: a missing baseline is a failure too
+
+Timings depend on the machine, so re-record the baseline when switching
+hosts; query counts do not, and any increase is reported as a regression.
+The committed bench_baselines.json holds query counts only, so on any
+machine it checks the counts and the timings are skipped.
+"""
+
+from app import create_app
+from app.cache import catalog_cache, dashboard_cache, report_cache
+from app.models import db, Client, Sale, AccessorySale, ReportJob
+from tests.helpers import count_queries
+from app.synthetic import generate_dataset, DATASET_SIZES
+from datetime import datetime, timedelta
+from flask import url_for
+from sqlalchemy import func
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bench_baselines.json')
+
+# Route blueprints from app/routes.py; the React catch-all and static routes are not benchmarked
+BENCHMARKED_BLUEPRINTS = ('main', 'clients', 'suppliers', 'sales', 'reports', 'products', 'accessories',
+                          'export', 'receivables')
+
+# Extra query strings for endpoints whose cost depends on them
+EXTRA_CASES = {
+    'sales.list_sales': ['limit=100', 'after=&limit=100', 'limit=100&fields=id,total_amount,sale_date'],
+    'clients.list_clients': ['limit=100', 'after=&limit=100'],
+    'reports.sales_report': ['date_from={year_ago}', 'date_from={year_ago}&supplier_id=1'],
+    'reports.compare_report': ['window=90', 'against=last_year'],
+    'reports.accessories_data': ['date_from={year_ago}&interval=week'],
+    'export.export_data': ['format=ndjson&date_from={month_ago}'],
+    'receivables.due_installments': ['within=30&limit=500'],
+}
+
+TIME_TOLERANCE = 0.25  # fraction slower than the baseline before a timing counts as a regression
+TIME_SLACK_MS = 2.0  # ignore differences below this, they are noise
+
+
+def _path_values(app):
+    """Values for URL variables, taken from the generated data."""
+    with app.app_context():
+        job = ReportJob(kind='aging', params='{}', status='queued')
+        db.session.add(job)
+        db.session.commit()
+        return {
+            'sale_id': db.session.query(func.max(Sale.id)).scalar(),
+            'client_id': db.session.query(func.max(Client.id)).scalar(),
+            'job_id': job.id,
+            'kind': 'sales',
+            # AccessorySale ids are its daily entries
+            'accessory_id': db.session.query(func.max(AccessorySale.id)).scalar(),
+        }
+
+
+def _cases(app):
+    """(name, url, headers) for every benchmarked GET route and its extra query strings."""
+    values = _path_values(app)
+    today = datetime.utcnow().date()
+    dates = {'year_ago': (today - timedelta(days=365)).isoformat(), 'month_ago': (today - timedelta(days=30)).isoformat()}
+    cases = []
+    for rule in sorted(app.url_map.iter_rules(), key=lambda r: r.rule):
+        blueprint = rule.endpoint.split('.')[0]
+        if blueprint not in BENCHMARKED_BLUEPRINTS or 'GET' not in rule.methods:
+            continue
+        args = {}
+        for name in rule.arguments:
+            key = 'accessory_id' if blueprint == 'accessories' and name == 'sale_id' else name
+            args[name] = values[key]
+        with app.test_request_context():
+            url = url_for(rule.endpoint, **args)
+        headers = {'Accept': 'application/json'} if url.startswith('/api/') else {}
+        cases.append((rule.endpoint, url, headers))
+        for query in EXTRA_CASES.get(rule.endpoint, []):
+            cases.append((f'{rule.endpoint}?{query.split("=")[0]}', f'{url}?{query.format(**dates)}', headers))
+    return cases
+
+
+def _clear_caches():
+    for cache in (catalog_cache, dashboard_cache, report_cache):
+        cache.clear()
+
+
+def _measure(app, client, url, headers, repeat):
+    """Return (cold ms, warm median ms, queries of the cold request, status)."""
+    _clear_caches()
+    with app.app_context(), count_queries() as statements:
+        started = time.perf_counter()
+        response = client.get(url, headers=headers)
+        response.get_data()
+        cold = (time.perf_counter() - started) * 1000
+
+    warm = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        client.get(url, headers=headers).get_data()
+        warm.append((time.perf_counter() - started) * 1000)
+    return cold, statistics.median(warm), len(statements), response.status_code
+
+
+def run_size(size, repeat):
+    """Generate a dataset of the given preset size in a scratch database and benchmark it."""
+    preset = DATASET_SIZES[size]
+    directory = tempfile.mkdtemp(prefix='bontez-bench-')
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{directory}/bench.db',
+                      'SECRET_KEY': 'bench'})
+    with app.app_context():
+        started = time.perf_counter()
+        counts = generate_dataset(clients=preset.clients, days=preset.days, sales_per_day=preset.sales_per_day)
+        print(f'[{size}] generated {counts} in {time.perf_counter() - started:.1f}s')
+
+    client = app.test_client()
+    results = {}
+    for name, url, headers in _cases(app):
+        cold, warm, queries, status = _measure(app, client, url, headers, repeat)
+        results[name] = {'url': url, 'status': status, 'cold_ms': round(cold, 2),
+                         'warm_ms': round(warm, 2), 'queries': queries}
+        print(f'[{size}] {status} {cold:9.2f} ms cold {warm:9.2f} ms warm {queries:4d} queries  {url}')
+    return results
+
+
+def compare(size, results, baseline, check=False):
+    """Regression messages for one size against its baseline.
+
+    Timings missing from the baseline are not compared; with ``check``, an
+    endpoint missing from it is a problem.
+    """
+    problems = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            if check:
+                problems.append(f'{name}: no baseline stored')
+            continue
+        if current['status'] != previous['status']:
+            problems.append(f'{name}: status {previous["status"]} -> {current["status"]}')
+        if current['queries'] > previous['queries']:
+            problems.append(f'{name}: queries {previous["queries"]} -> {current["queries"]}')
+        for metric in ('cold_ms', 'warm_ms'):
+            if metric not in previous:
+                continue
+            limit = previous[metric] * (1 + TIME_TOLERANCE) + TIME_SLACK_MS
+            if current[metric] > limit:
+                problems.append(f'{name}: {metric} {previous[metric]:.2f} -> {current[metric]:.2f}')
+    return [f'[{size}] {problem}' for problem in problems]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--sizes', nargs='+', choices=list(DATASET_SIZES), default=['small'])
+    parser.add_argument('--repeat', type=int, default=5, help='Warm requests per endpoint (median reported).')
+    parser.add_argument('--update-baseline', action='store_true', help='Store these results as the baseline.')
+    parser.add_argument('--queries-only', action='store_true',
+                        help='With --update-baseline, store statuses and query counts but not timings.')
+    parser.add_argument('--check', action='store_true', help='Fail when a size or endpoint has no baseline.')
+    parser.add_argument('--baseline', default=BASELINE_FILE)
+    options = parser.parse_args()
+
+    baselines = {}
+    if os.path.exists(options.baseline):
+        with open(options.baseline) as f:
+            baselines = json.load(f)
+
+    problems = []
+    for size in options.sizes:
+        results = run_size(size, options.repeat)
+        if options.update_baseline:
+            if options.queries_only:
+                results = {name: {key: result[key] for key in ('url', 'status', 'queries')}
+                           for name, result in results.items()}
+            baselines[size] = results
+        elif size in baselines:
+            problems += compare(size, results, baselines[size], options.check)
+        elif options.check:
+            problems.append(f'[{size}] no baseline stored')
+        else:
+            print(f'[{size}] no baseline stored; run with --update-baseline to record one')
+
+    if options.update_baseline:
+        with open(options.baseline, 'w') as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f'Baseline written to {options.baseline}')
+        return 0
+
+    for problem in problems:
+        print('REGRESSION', problem)
+    return 1 if problems else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -11,6 +11,9 @@ npm install
 
 echo "Building React app..."
 npm run build
+cd ..
+
+echo "Precompressing static assets..."
+flask --app run:app precompress-assets
 
 echo "Build complete! React app will be served by Flask."
-cd ..
@@ -23,8 +23,13 @@ const api = axios.create({
   headers: {
     'Content-Type': 'application/json',
   },
+  // 304 Not Modified is answered from etagCache below
+  validateStatus: (status) => (status >= 200 && status < 300) || status === 304,
 });
 
+// Last ETag and body per GET url, so unchanged data costs an empty 304
+const etagCache = new Map<string, { etag: string; data: unknown }>();
+
 // Request interceptor for auth if needed
 api.interceptors.request.use((config) => {
   // Add auth token if available
@@ -32,12 +37,40 @@ api.interceptors.request.use((config) => {
   if (token) {
     config.headers.Authorization = `Bearer ${token}`;
   }
+
+  // Send back the validator from the previous response to this url
+  if ((config.method ?? 'get') === 'get' && config.url) {
+    const cached = etagCache.get(config.url);
+    if (cached) {
+      config.headers['If-None-Match'] = cached.etag;
+    }
+  }
   return config;
 });
 
 // Response interceptor for error handling
 api.interceptors.response.use(
-  (response) => response,
+  (response) => {
+    const url = response.config.url;
+    if ((response.config.method ?? 'get') !== 'get' || !url) {
+      return response;
+    }
+
+    if (response.status === 304) {
+      const cached = etagCache.get(url);
+      if (cached) {
+        return { ...response, status: 200, data: cached.data };
+      }
+      // Validator without a body (e.g. cache cleared): refetch unconditionally
+      return api.get(url, { headers: { 'If-None-Match': '' } });
+    }
+
+    const etag = response.headers['etag'];
+    if (etag) {
+      etagCache.set(url, { etag, data: response.data });
+    }
+    return response;
+  },
   (error) => {
     if (error.response?.status === 401) {
       // Handle unauthorized access
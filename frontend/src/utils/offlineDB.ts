@@ -1,6 +1,7 @@
 import { openDB } from 'idb';
 import type { DBSchema, IDBPDatabase } from 'idb';
 import { useState, useEffect } from 'react';
+import api from '../services/api';
 
 export interface PendingSale {
   id: string;
@@ -86,6 +87,43 @@ export async function markSaleAsSynced(id: string): Promise<void> {
   }
 }
 
+// Matches MAX_BULK_SALES on the backend
+const SYNC_BATCH_SIZE = 500;
+
+interface BulkSyncResult {
+  id: string;
+  status: 'created' | 'duplicate' | 'error';
+  sale_id?: number;
+  error?: string;
+}
+
+// Replay unsynced sales through POST /api/sales/bulk. The backend dedupes on
+// PendingSale.id, so retrying after a dropped response never double-books.
+export async function syncPendingSales(): Promise<number> {
+  const pending = await getUnsyncedSales();
+  let synced = 0;
+
+  for (let start = 0; start < pending.length; start += SYNC_BATCH_SIZE) {
+    const batch = pending.slice(start, start + SYNC_BATCH_SIZE);
+    const res = await api.post<{ results: BulkSyncResult[] }>('/sales/bulk', { sales: batch });
+
+    const db = await getDB();
+    const tx = db.transaction('pendingSales', 'readwrite');
+    for (const result of res.data.results) {
+      if (result.status === 'error') continue;
+      const sale = await tx.store.get(result.id);
+      if (sale) {
+        sale.synced = true;
+        await tx.store.put(sale);
+        synced += 1;
+      }
+    }
+    await tx.done;
+  }
+
+  return synced;
+}
+
 export async function deleteSyncedSales(): Promise<void> {
   const db = await getDB();
   const allSales = await db.getAll('pendingSales');
@@ -5,6 +5,8 @@ Author: Llakterian
 
 from app import create_app
 from app.models import db, Supplier, Product, Client, Sale, SaleItem, Installment
+from app.rollups import rebuild_rollups
+from app.cache import bump_version
 from datetime import datetime, timedelta
 
 def seed_database():
@@ -153,14 +155,16 @@ def seed_database():
         db.session.flush()
         
         installments = [
-            Installment(sale_id=sales[2].id, amount=2925, due_date=today + timedelta(days=30), is_paid=True, paid_date=today - timedelta(days=2)),
+            Installment(sale_id=sales[2].id, amount=2925, amount_paid=2925, due_date=today + timedelta(days=30), is_paid=True, paid_date=today - timedelta(days=2)),
             Installment(sale_id=sales[2].id, amount=2925, due_date=today + timedelta(days=60), is_paid=False),
         ]
         
         for installment in installments:
             db.session.add(installment)
         
+        bump_version('suppliers', 'products', 'clients', 'sales')
         db.session.commit()
+        rebuild_rollups()
         
         print("Database seeded successfully!")
         print(f"Created {len(suppliers)} suppliers")
@@ -0,0 +1,40 @@
+"""
+Shared pytest fixtures: an app on a scratch SQLite database with synthetic data.
+Author: Llakterian
+"""
+
+from app import create_app
+from app.cache import catalog_cache, dashboard_cache, report_cache
+from app.synthetic import generate_dataset
+import pytest
+
+
+def make_app(path, **dataset):
+    """App on a fresh database at ``path`` filled by generate_dataset(**dataset)."""
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}', 'SECRET_KEY': 'test'})
+    with app.app_context():
+        generate_dataset(**dataset)
+    return app
+
+
+@pytest.fixture(scope='session')
+def app(tmp_path_factory):
+    return make_app(tmp_path_factory.mktemp('db') / 'small.db', clients=30, days=10, sales_per_day=6)
+
+
+@pytest.fixture(scope='session')
+def larger_app(tmp_path_factory):
+    return make_app(tmp_path_factory.mktemp('db') / 'larger.db', clients=120, days=30, sales_per_day=15)
+
+
+@pytest.fixture
+def fresh_app(tmp_path):
+    """A small dataset of its own, for tests that write."""
+    return make_app(tmp_path / 'fresh.db', clients=20, days=5, sales_per_day=4)
+
+
+@pytest.fixture(autouse=True)
+def clear_caches():
+    for cache in (catalog_cache, dashboard_cache, report_cache):
+        cache.clear()
+    yield
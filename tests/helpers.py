@@ -0,0 +1,41 @@
+"""
+Test helpers shared by the tests and bench.py.
+Author: Llakterian
+"""
+
+from app.models import db
+from contextlib import contextmanager
+from sqlalchemy import event
+
+
+@contextmanager
+def count_queries():
+    """Count SQL statements executed inside the block.
+
+    Yields a list that receives every statement, so ``len()`` gives the count.
+    """
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    engine = db.engine
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+
+
+@contextmanager
+def assert_query_count(expected):
+    """Fail when the block runs a different number of SQL statements than expected.
+
+    Used by tests to pin an endpoint's query count independent of page size.
+    """
+    with count_queries() as statements:
+        yield statements
+    if len(statements) != expected:
+        raise AssertionError(
+            f'Expected {expected} queries, got {len(statements)}:\n' + '\n'.join(statements)
+        )
@@ -0,0 +1,116 @@
+"""
+GET /api/reports/compare: rejected ranges, aligned daily series and supplier narrowing.
+Author: Llakterian
+"""
+
+from app.models import Supplier
+from datetime import datetime, timedelta
+import pytest
+
+TODAY = datetime.utcnow().date()
+
+
+def _compare(client, **params):
+    return client.get('/api/reports/compare', query_string=params)
+
+
+def _sales_report(client, date_from, date_to, **params):
+    response = client.get('/api/reports/sales', query_string={
+        'date_from': date_from, 'date_to': date_to, **params
+    })
+    assert response.status_code == 200
+    return response.get_json()
+
+
+@pytest.mark.parametrize('params, error', [
+    ({'date_from': '2024-02-29', 'date_to': '2024-03-10', 'against': 'last_year'},
+     '29 February has no counterpart in the previous year'),
+    ({'date_from': '2028-02-01', 'date_to': '2028-02-29', 'against': 'last_year'},
+     '29 February has no counterpart in the previous year'),
+    ({'date_from': '2023-01-01', 'date_to': '2024-01-01', 'against': 'last_year'},
+     'Ranges longer than a year overlap the same period last year'),
+    ({'date_to': '2024-06-01', 'window': 0}, 'window must be a positive number of days'),
+    ({'date_to': '2024-06-01', 'window': -7}, 'window must be a positive number of days'),
+    ({'date_from': '2024-06-02', 'date_to': '2024-06-01'}, 'date_from must not be after date_to'),
+    ({'date_from': '2024-06-01', 'against': 'next_year'}, 'against must be one of'),
+    ({'date_from': '01/06/2024'}, 'Dates must be YYYY-MM-DD'),
+])
+def test_rejected_ranges(app, params, error):
+    response = _compare(app.test_client(), **params)
+    assert response.status_code == 400
+    assert response.get_json()['error'].startswith(error)
+
+
+def test_last_day_of_a_year_long_range_is_accepted(app):
+    response = _compare(app.test_client(), date_from='2023-01-02', date_to='2024-01-01', against='last_year')
+    assert response.status_code == 200
+    assert response.get_json()['comparison'] == pytest.approx({
+        'date_from': '2022-01-02', 'date_to': '2023-01-01',
+        'total_sales': 0, 'total_revenue': 0.0, 'average_sale': 0
+    })
+
+
+def test_previous_period_series_is_aligned_by_day_offset(app):
+    client = app.test_client()
+    response = _compare(client, date_to=TODAY.isoformat(), window=4)
+    assert response.status_code == 200
+    report = response.get_json()
+
+    date_from = TODAY - timedelta(days=3)
+    comparison_from = date_from - timedelta(days=4)
+    assert report['current']['date_from'] == date_from.isoformat()
+    assert report['comparison']['date_from'] == comparison_from.isoformat()
+    assert report['comparison']['date_to'] == (date_from - timedelta(days=1)).isoformat()
+
+    daily = {row['date']: row['amount']
+             for row in _sales_report(client, comparison_from.isoformat(), TODAY.isoformat())['daily_sales']}
+    assert [row['offset'] for row in report['daily_sales']] == [0, 1, 2, 3]
+    for row in report['daily_sales']:
+        assert row['current_date'] == (date_from + timedelta(days=row['offset'])).isoformat()
+        assert row['comparison_date'] == (comparison_from + timedelta(days=row['offset'])).isoformat()
+        assert row['current'] == pytest.approx(daily.get(row['current_date'], 0.0))
+        assert row['comparison'] == pytest.approx(daily.get(row['comparison_date'], 0.0))
+
+    assert sum(row['current'] for row in report['daily_sales']) == pytest.approx(report['current']['total_revenue'])
+    assert sum(row['comparison'] for row in report['daily_sales']) == pytest.approx(
+        report['comparison']['total_revenue'])
+
+
+def test_last_year_series_pairs_the_same_calendar_days(app):
+    date_from = TODAY - timedelta(days=2)
+    report = _compare(app.test_client(), date_from=date_from.isoformat(), date_to=TODAY.isoformat(),
+                      against='last_year').get_json()
+
+    assert len(report['daily_sales']) == 3
+    for row in report['daily_sales']:
+        current = datetime.strptime(row['current_date'], '%Y-%m-%d').date()
+        assert row['comparison_date'] == current.replace(year=current.year - 1).isoformat()
+        # The synthetic history only covers the last few days
+        assert row['comparison'] == 0.0
+    assert report['revenue_change'] is None
+
+
+def test_supplier_id_narrows_totals_like_the_sales_report(app):
+    client = app.test_client()
+    date_from, date_to = TODAY - timedelta(days=4), TODAY
+    comparison_from, comparison_to = date_from - timedelta(days=5), date_from - timedelta(days=1)
+    with app.app_context():
+        supplier = Supplier.query.order_by(Supplier.id).first()
+
+    everything = _compare(client, date_from=date_from.isoformat(), date_to=date_to.isoformat()).get_json()
+    report = _compare(client, date_from=date_from.isoformat(), date_to=date_to.isoformat(),
+                      supplier_id=supplier.id).get_json()
+    current = _sales_report(client, date_from.isoformat(), date_to.isoformat(), supplier_id=supplier.id)
+    comparison = _sales_report(client, comparison_from.isoformat(), comparison_to.isoformat(),
+                               supplier_id=supplier.id)
+
+    assert 0 < report['current']['total_revenue'] < everything['current']['total_revenue']
+    assert report['current']['total_sales'] == current['total_sales']
+    assert report['current']['total_revenue'] == pytest.approx(current['total_revenue'])
+    assert report['comparison']['total_sales'] == comparison['total_sales']
+    assert report['comparison']['total_revenue'] == pytest.approx(comparison['total_revenue'])
+    assert set(report['sales_by_supplier']) == {supplier.name}
+    assert {method: entry['current'] for method, entry in report['sales_by_payment_method'].items()
+            if entry['current']} == pytest.approx(current['sales_by_payment_method'])
+    assert {name: entry['current'] for name, entry in report['sales_by_product_type'].items()} == pytest.approx(
+        current['sales_by_product_type'])
@@ -0,0 +1,31 @@
+"""
+ETag handling of the conditional_get decorator.
+Author: Llakterian
+"""
+
+from app.rollups import rebuild_rollups
+
+JSON = {'Accept': 'application/json'}
+
+
+def test_error_responses_get_no_etag(app):
+    response = app.test_client().get('/api/reports/accessories?interval=fortnight', headers=JSON)
+    assert response.status_code == 400
+    assert 'ETag' not in response.headers
+
+
+def test_matching_etag_answers_304(app):
+    client = app.test_client()
+    etag = client.get('/api/dashboard', headers=JSON).headers['ETag']
+    response = client.get('/api/dashboard', headers={**JSON, 'If-None-Match': etag})
+    assert response.status_code == 304
+
+
+def test_rollup_rebuild_changes_report_etags(app):
+    client = app.test_client()
+    urls = ['/api/dashboard', '/api/reports/sales', '/api/reports/compare', '/api/reports/daily-data']
+    before = [client.get(url, headers=JSON).headers['ETag'] for url in urls]
+    with app.app_context():
+        rebuild_rollups()
+    after = [client.get(url, headers=JSON).headers['ETag'] for url in urls]
+    assert all(old != new for old, new in zip(before, after))
@@ -0,0 +1,41 @@
+"""
+Form validation of the sale creation view.
+Author: Llakterian
+"""
+
+from app.models import db, Client, Product, Sale
+import pytest
+
+
+@pytest.fixture
+def form(app):
+    with app.app_context():
+        client_id = db.session.query(Client.id).order_by(Client.id).first()[0]
+        product = Product.query.order_by(Product.id).first()
+        return {'client_id': client_id, 'supplier_id': product.supplier_id, 'payment_method': 'cash',
+                'item_product_id': [str(product.id)], 'item_quantity': ['2']}
+
+
+def _sale_count(app):
+    with app.app_context():
+        return Sale.query.count()
+
+
+@pytest.mark.parametrize('field, value', [('item_product_id', 'abc'), ('item_quantity', 'two')])
+def test_invalid_item_redirects_back_to_form(app, form, field, value):
+    before = _sale_count(app)
+    client = app.test_client()
+    response = client.post('/api/sales/create', data={**form, field: [value]})
+    assert response.status_code == 302
+    assert response.headers['Location'].endswith('/api/sales/create')
+    assert _sale_count(app) == before
+    with client.session_transaction() as session:
+        assert ('error', 'Invalid item') in session['_flashes']
+
+
+@pytest.mark.parametrize('quantity', ['0', '-3'])
+def test_non_positive_quantity_creates_no_sale(app, form, quantity):
+    before = _sale_count(app)
+    response = app.test_client().post('/api/sales/create', data={**form, 'item_quantity': [quantity]})
+    assert response.headers['Location'].endswith('/api/sales/create')
+    assert _sale_count(app) == before
@@ -0,0 +1,132 @@
+"""
+Bulk replay of offline PWA sales through POST /api/sales/bulk.
+Author: Llakterian
+"""
+
+from app.cache import ranges_version
+from app.models import db, Client, Product, Sale, SaleItem, Installment, SaleSyncKey, DailySalesRollup, \
+    DailyProductRollup
+from datetime import date, datetime, timezone
+from sqlalchemy import func
+import pytest
+
+# Outside the synthetic history, so the rollups of this day hold only the batch
+DAY = date(2020, 1, 15)
+TIMESTAMP = int(datetime(2020, 1, 15, 12, tzinfo=timezone.utc).timestamp() * 1000)
+
+
+@pytest.fixture
+def catalog(fresh_app):
+    with fresh_app.app_context():
+        clients = [row[0] for row in db.session.query(Client.id).order_by(Client.id).limit(5)]
+        products = Product.query.order_by(Product.id).limit(3).all()
+        return clients, [(p.id, p.price, p.supplier_id) for p in products]
+
+
+def _sale(key, client_id, lines, method='cash', **extra):
+    return {'id': key, 'clientId': client_id, 'paymentMethod': method, 'timestamp': TIMESTAMP,
+            'items': [{'productId': product_id, 'quantity': quantity} for product_id, quantity in lines], **extra}
+
+
+def _batch(catalog):
+    clients, products = catalog
+    (p1, _, supplier), (p2, _, _), (p3, _, _) = products
+    return [
+        _sale('pwa-1', clients[0], [(p1, 2), (p2, 1)], supplierId=supplier),
+        _sale('pwa-2', clients[1], [(p3, 4)], method='installment', numInstallments=2),
+        _sale('pwa-1', clients[0], [(p1, 2), (p2, 1)], supplierId=supplier),
+        _sale('pwa-3', 999999, [(p1, 1)]),
+        _sale('pwa-4', clients[2], [(999999, 1)]),
+        _sale('pwa-5', clients[3], [(p2, 3)], method='mpesa', mpesaCode='QX1'),
+        _sale(None, clients[4], [(p1, 1)]),
+    ]
+
+
+def _expected_totals(catalog, batch):
+    prices = {product_id: price for product_id, price, _ in catalog[1]}
+    return {entry['id']: sum(prices[item['productId']] * item['quantity'] for item in entry['items'])
+            for entry in batch if entry['id'] in ('pwa-1', 'pwa-2', 'pwa-5')}
+
+
+def _post(app, batch):
+    return app.test_client().post('/api/sales/bulk', json={'sales': batch})
+
+
+def test_mixed_batch(fresh_app, catalog):
+    batch = _batch(catalog)
+    with fresh_app.app_context():
+        version_before = ranges_version([(DAY, DAY)])
+
+    body = _post(fresh_app, batch).get_json()
+    results = body['results']
+    assert [r['status'] for r in results] == ['created', 'created', 'duplicate', 'error', 'error', 'created', 'error']
+    assert (body['created'], body['duplicates'], body['errors']) == (3, 1, 3)
+    assert [r.get('error') for r in results[3:5]] + [results[6]['error']] == \
+        ['Unknown client', 'Unknown product', 'Missing or invalid id']
+    assert results[2]['sale_id'] == results[0]['sale_id']
+
+    totals = _expected_totals(catalog, batch)
+    with fresh_app.app_context():
+        # Each returned id points at the row built from its own entry
+        for index in (0, 1, 5):
+            entry, sale = batch[index], db.session.get(Sale, results[index]['sale_id'])
+            assert (sale.client_id, sale.payment_method, sale.total_amount) == \
+                (entry['clientId'], entry['paymentMethod'], totals[entry['id']])
+            assert sale.sale_date.date() == DAY
+            items = sorted((i.product_id, i.quantity) for i in SaleItem.query.filter_by(sale_id=sale.id))
+            assert items == sorted((i['productId'], i['quantity']) for i in entry['items'])
+            assert db.session.get(SaleSyncKey, entry['id']).sale_id == sale.id
+
+        installment_sale = results[1]['sale_id']
+        assert Installment.query.filter_by(sale_id=installment_sale).count() == 2
+        assert db.session.get(Sale, installment_sale).amount_paid == 0
+
+        count, total, paid = db.session.query(func.sum(DailySalesRollup.sale_count),
+                                              func.sum(DailySalesRollup.total_amount),
+                                              func.sum(DailySalesRollup.amount_paid)).filter_by(day=DAY).one()
+        assert (count, total, paid) == (3, sum(totals.values()), totals['pwa-1'] + totals['pwa-5'])
+        assert db.session.query(func.sum(DailyProductRollup.total_amount)).filter_by(day=DAY).scalar() == \
+            sum(totals.values())
+        assert ranges_version([(DAY, DAY)]) > version_before
+
+
+def test_replayed_batch_returns_original_sale_ids(fresh_app, catalog):
+    batch = _batch(catalog)
+    first = _post(fresh_app, batch).get_json()['results']
+    with fresh_app.app_context():
+        sales_before = Sale.query.count()
+        rollup_before = db.session.query(func.sum(DailySalesRollup.total_amount)).filter_by(day=DAY).scalar()
+
+    replay = _post(fresh_app, batch).get_json()
+    assert replay['created'] == 0
+    for before, after in zip(first, replay['results']):
+        if before['status'] == 'error':
+            assert after == before
+        else:
+            assert (after['status'], after['sale_id']) == ('duplicate', before['sale_id'])
+
+    with fresh_app.app_context():
+        assert Sale.query.count() == sales_before
+        assert db.session.query(func.sum(DailySalesRollup.total_amount)).filter_by(day=DAY).scalar() == rollup_before
+
+
+def test_concurrent_sync_conflict_answers_409(fresh_app, catalog, monkeypatch):
+    from app import ingest
+    parse = ingest._parse_pending_sale
+
+    def parse_while_another_request_syncs(entry, *args):
+        # The same key committed by a parallel request after this one looked it up
+        db.session.add(SaleSyncKey(key=entry['id'], sale_id=1))
+        db.session.flush()
+        return parse(entry, *args)
+
+    monkeypatch.setattr(ingest, '_parse_pending_sale', parse_while_another_request_syncs)
+    clients, products = catalog
+    with fresh_app.app_context():
+        sales_before = Sale.query.count()
+
+    response = _post(fresh_app, [_sale('pwa-race', clients[0], [(products[0][0], 1)])])
+    assert response.status_code == 409
+    with fresh_app.app_context():
+        assert Sale.query.count() == sales_before
+        assert db.session.get(SaleSyncKey, 'pwa-race') is None
@@ -0,0 +1,63 @@
+"""
+Report job heartbeats and the stale job requeue.
+Author: Llakterian
+"""
+
+from app.jobs import claim_next_job, enqueue_job, requeue_stale_jobs, run_job, JOB_TIMEOUT
+from app.models import db, ReportJob
+from datetime import datetime, timedelta
+import pytest
+
+
+@pytest.fixture
+def ctx(app):
+    with app.app_context():
+        yield
+        ReportJob.query.delete()
+        db.session.commit()
+
+
+def _running_job(started, heartbeat):
+    job = ReportJob(kind='aging', params='{}', status='running', attempts=1,
+                    started_at=started, heartbeat_at=heartbeat)
+    db.session.add(job)
+    db.session.commit()
+    return job.id
+
+
+def test_recent_heartbeat_keeps_long_running_job(ctx):
+    now = datetime.utcnow()
+    job_id = _running_job(now - 4 * JOB_TIMEOUT, now - timedelta(seconds=5))
+    assert requeue_stale_jobs() == 0
+    assert db.session.get(ReportJob, job_id).status == 'running'
+
+
+def test_stale_heartbeat_requeues_job(ctx):
+    now = datetime.utcnow()
+    job_id = _running_job(now - 4 * JOB_TIMEOUT, now - 2 * JOB_TIMEOUT)
+    assert requeue_stale_jobs() == 1
+    job = db.session.get(ReportJob, job_id)
+    assert (job.status, job.started_at, job.heartbeat_at) == ('queued', None, None)
+
+
+def test_jobs_without_heartbeat_fall_back_to_start_time(ctx):
+    job_id = _running_job(datetime.utcnow() - 2 * JOB_TIMEOUT, None)
+    assert requeue_stale_jobs() == 1
+    assert db.session.get(ReportJob, job_id).status == 'queued'
+
+
+def test_import_job_heartbeats_per_chunk(ctx, app, tmp_path, monkeypatch):
+    monkeypatch.setitem(app.config, 'UPLOAD_FOLDER', str(tmp_path))
+    (tmp_path / 'clients.csv').write_text('name,phone\n' + ''.join(f'Heartbeat {i},07000{i:05d}\n' for i in range(5)))
+    enqueue_job('import', {'kind': 'clients', 'upload': 'clients.csv'})
+    db.session.commit()
+
+    job = claim_next_job()
+    assert job.heartbeat_at is not None
+    claimed_long_ago = datetime.utcnow() - 2 * JOB_TIMEOUT
+    job.heartbeat_at = claimed_long_ago
+    db.session.commit()
+
+    assert run_job(job).status == 'done'
+    db.session.refresh(job)
+    assert job.heartbeat_at > claimed_long_ago
@@ -0,0 +1,40 @@
+"""
+Both JSON backends of FastJSONProvider write the same payloads.
+Author: Llakterian
+"""
+
+from app import json_provider
+import json
+import pytest
+
+JSON = {'Accept': 'application/json'}
+URLS = ['/api/sales/?limit=5', '/api/sales/?after=&limit=5', '/api/clients/?limit=5', '/api/dashboard']
+
+
+def _pairs(body):
+    """Decoded body with every object as its list of (key, value) pairs, so key order is compared."""
+    return json.loads(body, object_pairs_hook=list)
+
+
+@pytest.mark.skipif(json_provider.orjson is None, reason='orjson is not installed')
+@pytest.mark.parametrize('url', URLS)
+def test_orjson_and_stdlib_payloads_match(app, monkeypatch, url):
+    client = app.test_client()
+    fast = client.get(url, headers=JSON).get_data(as_text=True)
+    monkeypatch.setattr(json_provider, 'orjson', None)
+    plain = client.get(url, headers=JSON).get_data(as_text=True)
+    assert _pairs(fast) == _pairs(plain)
+
+
+@pytest.mark.parametrize('url', URLS)
+def test_keys_are_sorted(app, url):
+    def check(pairs):
+        if isinstance(pairs, list) and pairs and all(isinstance(p, tuple) for p in pairs):
+            keys = [key for key, _ in pairs]
+            assert keys == sorted(keys)
+            for _, value in pairs:
+                check(value)
+        elif isinstance(pairs, list):
+            for value in pairs:
+                check(value)
+    check(_pairs(app.test_client().get(url, headers=JSON).get_data(as_text=True)))
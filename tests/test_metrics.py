@@ -0,0 +1,52 @@
+"""
+Per-request metrics for failing requests and failing statements.
+Author: Llakterian
+"""
+
+from app import create_app
+from app.metrics import RequestStats
+from app.models import db
+from flask import g
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+import pytest
+
+
+@pytest.fixture
+def fresh_app(tmp_path):
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path}/metrics.db'})
+
+    @app.route('/boom')
+    def boom():
+        raise RuntimeError('boom')
+    return app
+
+
+def _requests_total(app, endpoint):
+    return [line for line in app.extensions['metrics'].render().splitlines()
+            if line.startswith('bontez_http_requests_total') and f'endpoint="{endpoint}"' in line]
+
+
+@pytest.mark.parametrize('propagate', [False, True])
+def test_unhandled_exception_recorded_once_as_500(fresh_app, propagate):
+    fresh_app.config['PROPAGATE_EXCEPTIONS'] = propagate
+    client = fresh_app.test_client()
+    if propagate:
+        with pytest.raises(RuntimeError):
+            client.get('/boom')
+    else:
+        assert client.get('/boom').status_code == 500
+    assert _requests_total(fresh_app, 'boom') == [
+        'bontez_http_requests_total{endpoint="boom",method="GET",status="500"} 1'
+    ]
+
+
+def test_failed_statement_leaves_no_start_time_behind(fresh_app):
+    with fresh_app.test_request_context():
+        g.request_stats = RequestStats()
+        with db.engine.connect() as connection:
+            with pytest.raises(OperationalError):
+                connection.execute(text('SELECT * FROM no_such_table'))
+            assert connection.info.get('metrics_started') == []
+            connection.execute(text('SELECT 1'))
+        assert g.request_stats.queries == 2
@@ -0,0 +1,86 @@
+"""
+Endpoints that render related rows must run a fixed number of queries,
+whatever the page size or amount of data.
+Author: Llakterian
+"""
+
+from app.cache import dashboard_cache
+from app.models import db, Client, Sale
+from tests.helpers import assert_query_count, count_queries
+from flask import url_for
+from sqlalchemy import func
+
+JSON = {'Accept': 'application/json'}
+
+# Offset pages: COUNT + one SELECT with client and supplier joined
+LIST_SALES_QUERIES = 2
+# Cursor pages skip the COUNT
+CURSOR_SALES_QUERIES = 1
+# Client + its sales with client and supplier joined
+VIEW_CLIENT_QUERIES = 2
+# ETag version check, cache version check, then totals, client count and recent sales
+DASHBOARD_QUERIES = 5
+# The homepage has no ETag and renders recent sales from the dashboard cache
+INDEX_QUERIES = 4
+
+
+def _queries(app, url, headers=None):
+    """Statements run by one GET of ``url``, after a warm-up request."""
+    client = app.test_client()
+    assert client.get(url, headers=headers).status_code == 200
+    dashboard_cache.clear()
+    with app.app_context(), count_queries() as statements:
+        response = client.get(url, headers=headers)
+    assert response.status_code == 200
+    return len(statements)
+
+
+def _client_ids_by_sales(app):
+    """Ids of the clients with the fewest and the most sales."""
+    with app.app_context():
+        counts = db.session.query(Client.id, func.count(Sale.id)).join(Sale).group_by(Client.id) \
+            .order_by(func.count(Sale.id), Client.id).all()
+    return counts[0][0], counts[-1][0]
+
+
+def test_list_sales_json_query_count_independent_of_limit(app):
+    assert _queries(app, '/api/sales/?limit=5', JSON) == LIST_SALES_QUERIES
+    with app.app_context(), assert_query_count(LIST_SALES_QUERIES):
+        assert app.test_client().get('/api/sales/?limit=50', headers=JSON).status_code == 200
+
+
+def test_list_sales_cursor_query_count_independent_of_limit(app):
+    assert _queries(app, '/api/sales/?after=&limit=5', JSON) == CURSOR_SALES_QUERIES
+    with app.app_context(), assert_query_count(CURSOR_SALES_QUERIES):
+        assert app.test_client().get('/api/sales/?after=&limit=50', headers=JSON).status_code == 200
+
+
+def test_list_sales_html_query_count_independent_of_data(app, larger_app):
+    assert _queries(app, '/api/sales/') == _queries(larger_app, '/api/sales/') == LIST_SALES_QUERIES
+
+
+def test_view_client_query_count_independent_of_sales(app):
+    quietest, busiest = _client_ids_by_sales(app)
+    assert _queries(app, f'/api/clients/{quietest}') == _queries(app, f'/api/clients/{busiest}') == \
+        VIEW_CLIENT_QUERIES
+
+
+def test_dashboard_query_count_independent_of_data(app, larger_app):
+    assert _queries(app, '/api/dashboard', JSON) == _queries(larger_app, '/api/dashboard', JSON) == \
+        DASHBOARD_QUERIES
+
+
+def test_index_renders_recent_sales_from_the_dashboard_cache(app, larger_app):
+    assert _queries(app, '/') == _queries(larger_app, '/') == INDEX_QUERIES
+    dashboard_cache.clear()
+    client = app.test_client()
+    assert client.get('/').status_code == 200
+    # Warm cache: only its version check
+    with app.app_context(), assert_query_count(1):
+        response = client.get('/')
+    with app.test_request_context():
+        newest = Sale.query.order_by(Sale.created_at.desc()).first()
+        link = url_for('sales.view_sale', sale_id=newest.id)
+    assert response.status_code == 200
+    assert f'href="{link}"'.encode() in response.data
+    assert newest.sale_date.strftime('%b %d, %Y %H:%M').encode() in response.data
@@ -0,0 +1,104 @@
+"""
+Installment payment allocation, the 0003 backfill and the aging buckets.
+Author: Llakterian
+"""
+
+from app.migrations import installment_allocation
+from app.models import db, Client, Installment, Sale
+from app.receivables import allocate_payment, receivables_aging
+from datetime import datetime, timedelta
+from sqlalchemy import text
+import pytest
+
+AS_OF = datetime(2030, 6, 1, 12)
+# 90+, 30 and current buckets as of AS_OF
+DUE_DATES = [AS_OF - timedelta(days=100), AS_OF - timedelta(days=45), AS_OF + timedelta(days=10)]
+
+
+@pytest.fixture
+def ctx(fresh_app):
+    with fresh_app.app_context():
+        yield
+
+
+def _installment_sale(amounts=(1000.0, 1000.0, 1000.0)):
+    client = Client.query.first()
+    sale = Sale(client_id=client.id, payment_method='installment', total_amount=sum(amounts), amount_paid=0.0)
+    db.session.add(sale)
+    db.session.flush()
+    db.session.add_all(Installment(sale_id=sale.id, amount=amount, amount_paid=0.0, due_date=due)
+                       for amount, due in zip(amounts, DUE_DATES))
+    db.session.commit()
+    return sale.id
+
+
+def _installments(sale_id):
+    db.session.expire_all()
+    return [(i.amount_paid, i.is_paid, i.paid_date is not None)
+            for i in Installment.query.filter_by(sale_id=sale_id).order_by(Installment.due_date)]
+
+
+def _pay(app, sale_id, amount):
+    return app.test_client().post(f'/api/sales/{sale_id}/add-installment', data={'amount': str(amount)})
+
+
+def test_partial_payment_fills_earliest_installments_first(fresh_app, ctx):
+    sale_id = _installment_sale()
+    _pay(fresh_app, sale_id, 1500)
+    assert _installments(sale_id) == [(1000.0, True, True), (500.0, False, False), (0.0, False, False)]
+    assert db.session.get(Sale, sale_id).amount_paid == 1500
+
+
+def test_exact_payment_settles_every_installment(fresh_app, ctx):
+    sale_id = _installment_sale()
+    _pay(fresh_app, sale_id, 3000)
+    assert _installments(sale_id) == [(1000.0, True, True)] * 3
+    assert db.session.get(Sale, sale_id).remaining_balance() == 0
+
+
+def test_overpayment_is_rejected(fresh_app, ctx):
+    sale_id = _installment_sale()
+    _pay(fresh_app, sale_id, 3000.01)
+    assert _installments(sale_id) == [(0.0, False, False)] * 3
+    assert db.session.get(Sale, sale_id).amount_paid == 0
+
+
+def test_fraction_of_a_cent_left_counts_as_paid(ctx):
+    third = 1000 / 3
+    sale_id = _installment_sale((third, third, third))
+    sale = db.session.get(Sale, sale_id)
+    # Rounded to cents by the device: 333.33 leaves 0.0033 owed on the first installment
+    assert len(allocate_payment(sale, 333.33)) == 1
+    assert len(allocate_payment(sale, 333.32)) == 0
+    db.session.commit()
+    assert [row[1] for row in _installments(sale_id)] == [True, False, False]
+
+
+def test_aging_buckets(fresh_app, ctx):
+    before = receivables_aging(AS_OF)['buckets']
+    sale_id = _installment_sale()
+    _pay(fresh_app, sale_id, 1500)
+    after = receivables_aging(AS_OF)['buckets']
+
+    added = {label: (after[label]['count'] - before[label]['count'],
+                     round(after[label]['amount'] - before[label]['amount'], 2)) for label in after}
+    assert added == {'current': (1, 1000.0), '30': (1, 500.0), '60': (0, 0.0), '90+': (0, 0.0)}
+
+
+def test_backfill_spreads_sale_payments_over_installments(ctx):
+    sale_id = _installment_sale()
+    db.session.execute(text('UPDATE sales SET amount_paid = 1999.997 WHERE id = :id'), {'id': sale_id})
+    db.session.execute(text('UPDATE installments SET amount_paid = NULL WHERE sale_id = :id'), {'id': sale_id})
+    db.session.commit()
+    # The migration only backfills when the column is missing
+    db.session.execute(text('DROP INDEX IF EXISTS ix_installments_open_due'))
+    db.session.execute(text('ALTER TABLE installments DROP COLUMN amount_paid'))
+    db.session.commit()
+
+    with db.engine.begin() as connection:
+        installment_allocation(connection)
+
+    rows = _installments(sale_id)
+    assert [round(paid, 3) for paid, _, _ in rows] == [1000.0, 999.997, 0.0]
+    # Half a cent short of the second installment still settles it
+    assert [(paid_flag, dated) for _, paid_flag, dated in rows] == [(True, True), (True, True), (False, False)]
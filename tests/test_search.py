@@ -0,0 +1,69 @@
+"""
+Client search phone matching, with and without the FTS5 index.
+Author: Llakterian
+"""
+
+from app import create_app
+from app.models import db, Client
+from app.search import has_search_index, search_clients
+from sqlalchemy import text
+import pytest
+
+CLIENTS = [('Alice Wanjiru', '0712 345 678'), ('Bob Otieno', '020 2345 677'), ('Carol Achieng', '+254 733 111 222')]
+
+
+@pytest.fixture(scope='module')
+def search_app(tmp_path_factory):
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path_factory.mktemp("search")}/search.db'})
+    with app.app_context():
+        db.session.add_all(Client(name=name, phone=phone) for name, phone in CLIENTS)
+        db.session.commit()
+    return app
+
+
+@pytest.fixture(params=['fts', 'like'])
+def search(search_app, request, monkeypatch):
+    if request.param == 'like':
+        monkeypatch.setattr('app.search.has_search_index', lambda: False)
+    with search_app.app_context():
+        if request.param == 'fts' and not has_search_index():
+            pytest.skip('SQLite without FTS5 trigram support')
+        yield lambda query: sorted(name for name, in search_clients(query, [Client.name]))
+
+
+def test_short_phone_term_matches_number_prefix(search):
+    assert search('07') == ['Alice Wanjiru', 'Carol Achieng']
+    assert search('02') == ['Bob Otieno']
+
+
+def test_short_phone_term_with_name(search):
+    assert search('Alice 07') == ['Alice Wanjiru']
+    assert search('Bob 07') == []
+
+
+def test_full_number_in_any_format(search):
+    assert search('0712345678') == ['Alice Wanjiru']
+    assert search('+254712 345678') == ['Alice Wanjiru']
+    assert search('733 111') == ['Carol Achieng']
+
+
+def test_search_index_built_once_sqlite_supports_it(tmp_path, monkeypatch):
+    uri = f'sqlite:///{tmp_path}/upgrade.db'
+    monkeypatch.setattr('app.migrations._trigram_fts_available', lambda connection: False)
+    old_sqlite = create_app({'SQLALCHEMY_DATABASE_URI': uri})
+    with old_sqlite.app_context():
+        db.session.add_all(Client(name=name, phone=phone) for name, phone in CLIENTS)
+        db.session.commit()
+        assert not has_search_index()
+        assert db.session.execute(text("SELECT 1 FROM schema_migrations WHERE id = '0004_client_search'")).first() \
+            is None
+    # LIKE fallback on the unindexed database
+    response = old_sqlite.test_client().get('/api/clients/search?q=07')
+    assert sorted(row['name'] for row in response.get_json()['clients']) == ['Alice Wanjiru', 'Carol Achieng']
+
+    monkeypatch.undo()
+    upgraded = create_app({'SQLALCHEMY_DATABASE_URI': uri})
+    with upgraded.app_context():
+        if not has_search_index():
+            pytest.skip('SQLite without FTS5 trigram support')
+        assert sorted(name for name, in search_clients('Wanjiru', [Client.name])) == ['Alice Wanjiru']
@@ -0,0 +1,50 @@
+"""
+Access control and paging of the slow query log endpoint.
+Author: Llakterian
+"""
+
+from app import create_app
+from app.models import db
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+import pytest
+
+ADMIN = {'Authorization': 'Bearer secret'}
+
+
+def _app(tmp_path, token):
+    # A negative threshold logs every statement
+    return create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path}/slow.db',
+                       'SLOW_QUERY_THRESHOLD_MS': -1, 'ADMIN_TOKEN': token})
+
+
+def test_endpoint_hidden_without_admin_token(tmp_path):
+    client = _app(tmp_path, None).test_client()
+    assert client.get('/api/_slow_queries').status_code == 404
+    assert client.delete('/api/_slow_queries').status_code == 404
+
+
+def test_token_required_for_reading_and_clearing(tmp_path):
+    client = _app(tmp_path, 'secret').test_client()
+    assert client.get('/api/_slow_queries').status_code == 401
+    assert client.delete('/api/_slow_queries', headers={'Authorization': 'Bearer wrong'}).status_code == 401
+    assert client.get('/api/_slow_queries', headers=ADMIN).status_code == 200
+    assert client.delete('/api/_slow_queries', headers=ADMIN).status_code == 204
+
+
+def test_limit_is_clamped(tmp_path):
+    app = _app(tmp_path, 'secret')
+    client = app.test_client()
+    client.get('/api/dashboard')
+    newest = client.get('/api/_slow_queries?limit=1', headers=ADMIN).get_json()['queries']
+    assert len(newest) == 1
+    assert client.get('/api/_slow_queries?limit=-1', headers=ADMIN).get_json()['queries'] == newest
+    assert client.get('/api/_slow_queries?limit=0', headers=ADMIN).get_json()['queries'] == newest
+
+
+def test_failed_statement_leaves_no_start_time_behind(tmp_path):
+    app = _app(tmp_path, 'secret')
+    with app.app_context(), db.engine.connect() as connection:
+        with pytest.raises(OperationalError):
+            connection.execute(text('SELECT * FROM no_such_table'))
+        assert connection.info.get('slow_query_started') == []
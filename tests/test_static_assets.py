@@ -0,0 +1,58 @@
+"""
+Lazy compression of the React build manifest.
+Author: Llakterian
+"""
+
+from app import create_app
+from app.static_assets import brotli, build_manifest, precompress_assets, serve_asset
+import gzip
+import pytest
+
+SCRIPT = b'console.log("bontez");\n' * 200
+
+
+@pytest.fixture
+def build_dir(tmp_path):
+    (tmp_path / 'assets').mkdir()
+    (tmp_path / 'assets' / 'index-AbCd1234.js').write_bytes(SCRIPT)
+    (tmp_path / 'favicon.ico').write_bytes(b'\0' * 2048)
+    return tmp_path
+
+
+def _get(app, asset, encoding):
+    with app.test_request_context(headers={'Accept-Encoding': encoding}):
+        response = serve_asset(asset)
+        response.direct_passthrough = False
+        return response, response.get_data()
+
+
+def test_manifest_build_does_not_compress(build_dir):
+    manifest = build_manifest(str(build_dir))
+    assert manifest['assets/index-AbCd1234.js'].compressible
+    assert manifest['assets/index-AbCd1234.js'].variants == {}
+    assert not manifest['favicon.ico'].compressible
+
+
+def test_variant_made_on_first_request(app, build_dir):
+    asset = build_manifest(str(build_dir))['assets/index-AbCd1234.js']
+    response, body = _get(app, asset, 'gzip')
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(body) == SCRIPT
+    assert set(asset.variants) == {'gzip'}
+    assert 'Accept-Encoding' in response.vary
+
+
+def test_precompressed_siblings_are_served(app, build_dir):
+    assert precompress_assets(str(build_dir)) == (2 if brotli else 1)
+    sibling = (build_dir / 'assets' / 'index-AbCd1234.js.gz').read_bytes()
+    manifest = build_manifest(str(build_dir))
+    assert 'assets/index-AbCd1234.js.gz' not in manifest
+    _, body = _get(app, manifest['assets/index-AbCd1234.js'], 'gzip')
+    assert body == sibling
+
+
+def test_build_scanned_on_first_request_only(tmp_path):
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path}/empty.db'})
+    assert 'asset_manifest' not in app.extensions
+    app.test_client().get('/clients/new')
+    assert 'asset_manifest' in app.extensions
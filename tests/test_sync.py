@@ -0,0 +1,104 @@
+"""
+Delta sync from the change log: triggers, tombstones, paging and compaction.
+Author: Llakterian
+"""
+
+from app.models import db, Client, Product, Sale, SaleItem
+from app.sync import changes_since, compact_change_log, SYNC_TABLES
+import pytest
+
+
+@pytest.fixture
+def ctx(fresh_app):
+    with fresh_app.app_context():
+        yield
+
+
+def _drain(cursor, limit=1000):
+    """Every page after ``cursor``; returns (pages, last next_cursor)."""
+    pages = []
+    while True:
+        page = changes_since(cursor, limit)
+        pages.append(page)
+        cursor = page['next_cursor']
+        if not page['has_more']:
+            return pages, cursor
+
+
+def _end_cursor():
+    return _drain(None)[1]
+
+
+def test_full_sync_returns_every_row(ctx):
+    pages, _ = _drain(None, limit=500)
+    for table_name, (model, _) in SYNC_TABLES.items():
+        ids = {row['id'] for page in pages for row in page['changes'][table_name]['upserts']}
+        assert ids == set(db.session.execute(db.select(model.id)).scalars()), table_name
+
+
+def test_delta_after_insert_update_and_delete(ctx):
+    cursor = _end_cursor()
+    kept = Client(name='Sync Kept', phone='0700000001')
+    gone = Client(name='Sync Gone', phone='0700000002')
+    db.session.add_all([kept, gone])
+    db.session.commit()
+    kept.name = 'Sync Renamed'
+    db.session.delete(gone)
+    product = Product.query.first()
+    sale = Sale(client_id=kept.id, payment_method='cash', total_amount=product.price, amount_paid=product.price)
+    db.session.add(sale)
+    db.session.flush()
+    db.session.add(SaleItem(sale_id=sale.id, product_id=product.id, quantity=1, unit_price=product.price,
+                            subtotal=product.price))
+    db.session.commit()
+
+    page = changes_since(cursor)
+    clients = page['changes']['clients']
+    assert [(row['id'], row['name']) for row in clients['upserts']] == [(kept.id, 'Sync Renamed')]
+    assert clients['deletes'] == [gone.id]
+    assert [row['id'] for row in page['changes']['sales']['upserts']] == [sale.id]
+    assert [(row['sale_id'], row['product_id']) for row in page['changes']['sale_items']['upserts']] == \
+        [(sale.id, product.id)]
+    assert page['has_more'] is False
+
+    # Nothing new: same cursor back, empty changes
+    again = changes_since(page['next_cursor'])
+    assert again['next_cursor'] == page['next_cursor']
+    assert not any(c['upserts'] or c['deletes'] for c in again['changes'].values())
+
+
+def test_paging_with_has_more(ctx):
+    cursor = _end_cursor()
+    clients = [Client(name=f'Paged {i}', phone=f'07100000{i:02d}') for i in range(5)]
+    db.session.add_all(clients)
+    db.session.commit()
+
+    pages, _ = _drain(cursor, limit=2)
+    assert [page['has_more'] for page in pages] == [True, True, False]
+    assert [row['id'] for page in pages for row in page['changes']['clients']['upserts']] == \
+        [client.id for client in clients]
+
+
+def test_compaction_keeps_in_flight_cursor_valid(ctx):
+    cursor = _end_cursor()
+    clients = [Client(name=f'Compact {i}', phone=f'07200000{i:02d}') for i in range(4)]
+    db.session.add_all(clients)
+    db.session.commit()
+    first_page = changes_since(cursor, limit=2)
+
+    # Written while the device is between pages, then compacted away
+    for client in clients:
+        client.name += ' updated'
+    db.session.delete(clients[3])
+    db.session.commit()
+    assert compact_change_log() > 0
+
+    pages, _ = _drain(first_page['next_cursor'], limit=2)
+    upserts = {row['id']: row['name'] for page in pages for row in page['changes']['clients']['upserts']}
+    deletes = [row_id for page in pages for row_id in page['changes']['clients']['deletes']]
+    assert upserts == {client.id: client.name for client in clients[:3]}
+    assert deletes == [clients[3].id]
+
+
+def test_invalid_cursor_is_400(fresh_app):
+    assert fresh_app.test_client().get('/api/sync?since=!!').status_code == 400